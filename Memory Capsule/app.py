@@ -1,35 +1,390 @@
-from flask import Flask, request, jsonify, render_template, send_from_directory
+from flask import Flask, Response, g, request, jsonify, render_template, send_file, send_from_directory
 import os
+import re
 import json
 import time
-import base64
-import requests
-import zipfile
+import hashlib
+import logging
+import mimetypes
 import shutil
+import functools
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
 from tencentcloud.common import credential
 from tencentcloud.common.profile.client_profile import ClientProfile
 from tencentcloud.common.profile.http_profile import HttpProfile
 from tencentcloud.common.exception.tencent_cloud_sdk_exception import TencentCloudSDKException
 from tencentcloud.common.common_client import CommonClient
-from werkzeug.utils import secure_filename
+from werkzeug.utils import secure_filename, safe_join
+from jobs import (JobStore, JobJournal, JobManager, public_view, progress_event, find_model_files,
+                  repair_model_folders, TERMINAL_STATES, STAGING_PREFIX)
+from mesh import convert_obj_to_glb, GLB_NAME
+from catalog import ModelCatalog, update_metadata_file, read_metadata
+from lod import process_model
+from textures import optimize_textures, link_glb_textures
+from assets import AssetStore, folder_version, precompress, COMPRESSIBLE_EXTENSIONS
+from diary import DiaryStore, valid_date
+from events import JobEvents
+import fetch
+import imagegen
+from imagegen import ImageGenError
+from imagecache import ImageCache
+import uploads
+import metrics
+import archive
 
 app = Flask(__name__)
+
+# 日志级别: LOG_LEVEL=DEBUG 时记录 Vector Engine 响应摘要和 span 耗时; 每行 "事件 key=value"
+logging.basicConfig(level=os.environ.get('LOG_LEVEL', 'INFO').upper(),
+                    format='%(asctime)s %(levelname)s %(name)s %(message)s')
+logger = logging.getLogger('memory_capsule')
+# Pillow 的 DEBUG 日志逐个记录 PNG 数据块, 不跟随 LOG_LEVEL=DEBUG
+logging.getLogger('PIL').setLevel(max(logging.getLogger().level, logging.INFO))
+
+# 追踪: TRACER=log 写 DEBUG 日志, TRACER=otel 交给 opentelemetry-api; 不设置时 span 只记录指标
+if os.environ.get('TRACER') == 'log':
+    metrics.set_tracer(metrics.LogTracer())
+elif os.environ.get('TRACER') == 'otel':
+    metrics.set_tracer(metrics.OpenTelemetryTracer())
+
 app.config['UPLOAD_FOLDER'] = 'static/uploads'
 app.config['MODEL_FOLDER'] = 'static/models'
+app.config['JOB_FOLDER'] = 'data/jobs'
+# 任务状态变化的追加日志 (每条 fsync), 重启后据此恢复; 启动时发现的残缺模型目录移到 QUARANTINE_FOLDER
+app.config['JOB_JOURNAL'] = 'data/jobs/journal.jsonl'
+app.config['QUARANTINE_FOLDER'] = 'data/quarantine'
+app.config['JOB_WORKERS'] = int(os.environ.get('JOB_WORKERS', '4'))
+# 进度 SSE 连接没有新事件时发送心跳注释的间隔 (秒)
+app.config['SSE_HEARTBEAT'] = 15
+app.config['CATALOG_DB'] = 'data/catalog.db'
+app.config['LOD_WORKERS'] = int(os.environ.get('LOD_WORKERS', '2'))
+# 设置后按 sha256 去重保留下载的 model.zip, 默认解压后删除
+app.config['ARCHIVE_FOLDER'] = os.environ.get('ARCHIVE_FOLDER') or None
+# 以 INFO 级别记录 Vector Engine 响应 (长字段截断) 用于调试
+app.config['DEBUG_PAYLOADS'] = bool(os.environ.get('DEBUG_PAYLOADS'))
+# 内容寻址存储: 模型文件按 sha256 去重, 重复上传的图片直接复用已有模型
+app.config['ASSET_FOLDER'] = 'data/cas'
+app.config['ASSET_DB'] = 'data/assets.db'
+# 设置后 /assets/ 只返回 X-Accel-Redirect: <前缀>/<blob 相对路径>, 由 nginx 以 sendfile 发送文件, 例如
+#   location /_cas/ { internal; alias /path/to/data/cas/; }
+app.config['ASSET_ACCEL_REDIRECT'] = os.environ.get('ASSET_ACCEL_REDIRECT') or None
+app.config['DIARY_DB'] = 'data/diary.db'
+app.config['DIARY_FOLDER'] = 'static/diaries'  # 旧版按天保存的 JSON, 首次启动时导入
+# /generate_images 同时发往 Vector Engine 的请求数, 以及一批最多的 prompt 数
+app.config['GENERATE_CONCURRENCY'] = int(os.environ.get('GENERATE_CONCURRENCY', '4'))
+app.config['GENERATE_MAX_BATCH'] = 16
+# 每次调用 Vector Engine 等待响应的秒数, 超时的一项返回错误, 不拖住整批
+app.config['GENERATE_TIMEOUT'] = float(os.environ.get('GENERATE_TIMEOUT', '120'))
+# 相同 prompt 的生成结果缓存: 总大小上限和有效期 (距最后一次使用的秒数)
+app.config['IMAGE_CACHE_DB'] = 'data/imagecache.db'
+app.config['IMAGE_CACHE_MAX_BYTES'] = int(os.environ.get('IMAGE_CACHE_MAX_BYTES', str(500 * 1024 * 1024)))
+app.config['IMAGE_CACHE_TTL'] = int(os.environ.get('IMAGE_CACHE_TTL', str(7 * 24 * 3600)))
+# 上传的原图 (可能带 GPS 等 EXIF) 不放在 static 下, 预处理后删除
+app.config['INCOMING_FOLDER'] = 'data/incoming'
+app.config['UPLOAD_MAX_BYTES'] = int(os.environ.get('UPLOAD_MAX_BYTES', str(uploads.MAX_UPLOAD_BYTES)))
+# 请求体上限留出表单字段的余量; 超过时 werkzeug 直接返回 413, 不读取请求体
+app.config['MAX_CONTENT_LENGTH'] = app.config['UPLOAD_MAX_BYTES'] + 1024 * 1024
+app.config['PREPARE_MAX_EDGE'] = int(os.environ.get('PREPARE_MAX_EDGE', str(uploads.MAX_EDGE)))
+# /import 请求体 (整个备份包) 的上限, 与上传图片的上限分开; 导入时收尾处理的线程数
+app.config['IMPORT_MAX_BYTES'] = int(os.environ.get('IMPORT_MAX_BYTES', str(50 * 1024 * 1024 * 1024)))
+app.config['IMPORT_WORKERS'] = int(os.environ.get('IMPORT_WORKERS', str(archive.IMPORT_WORKERS)))
 os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
 os.makedirs(app.config['MODEL_FOLDER'], exist_ok=True)
 
-import http.client
-
 # 配置您的密钥
 SECRET_ID = os.environ.get("TENCENTCLOUD_SECRET_ID", "")
 SECRET_KEY = os.environ.get("TENCENTCLOUD_SECRET_KEY", "")
 VECTOR_ENGINE_API_KEY = os.environ.get("VECTOR_ENGINE_API_KEY", "") # 稍后请手动填入或设置环境变量
+VECTOR_ENGINE_BASE_URL = os.environ.get("VECTOR_ENGINE_BASE_URL", imagegen.DEFAULT_BASE_URL)
+
+_hunyuan_client = None
+_hunyuan_client_lock = threading.Lock()
+
+def get_hunyuan_client():
+    # 懒加载单例: 凭证、profile 和 SDK 内部的连接只创建一次
+    global _hunyuan_client
+    with _hunyuan_client_lock:
+        if _hunyuan_client is None:
+            if os.environ.get("HUNYUAN_STUB"):
+                from stubs import StubHunyuanClient
+                _hunyuan_client = StubHunyuanClient.from_env()
+            else:
+                cred = credential.Credential(SECRET_ID, SECRET_KEY)
+                httpProfile = HttpProfile()
+                httpProfile.endpoint = "hunyuan.tencentcloudapi.com"
+                httpProfile.keepAlive = True
+                httpProfile.reqTimeout = 30
+                clientProfile = ClientProfile()
+                clientProfile.httpProfile = httpProfile
+                _hunyuan_client = CommonClient("hunyuan", "2023-09-01", cred, "ap-guangzhou", clientProfile)
+    return _hunyuan_client
+
+_catalog = None
+_catalog_lock = threading.Lock()
+
+def get_catalog():
+    global _catalog
+    with _catalog_lock:
+        if _catalog is None:
+            _catalog = ModelCatalog(app.config['CATALOG_DB'], app.config['MODEL_FOLDER'])
+    return _catalog
+
+_assets = None
+_assets_lock = threading.Lock()
+
+def get_assets():
+    global _assets
+    with _assets_lock:
+        if _assets is None:
+            _assets = AssetStore(app.config['ASSET_FOLDER'], app.config['ASSET_DB'])
+    return _assets
+
+_diary = None
+_diary_lock = threading.Lock()
+
+def get_diary():
+    global _diary
+    with _diary_lock:
+        if _diary is None:
+            _diary = DiaryStore(app.config['DIARY_DB'], app.config['DIARY_FOLDER'])
+    return _diary
+
+_image_cache = None
+_image_cache_lock = threading.Lock()
+
+def get_image_cache():
+    global _image_cache
+    with _image_cache_lock:
+        if _image_cache is None:
+            _image_cache = ImageCache(app.config['IMAGE_CACHE_DB'], app.config['UPLOAD_FOLDER'],
+                                      max_bytes=app.config['IMAGE_CACHE_MAX_BYTES'],
+                                      ttl=app.config['IMAGE_CACHE_TTL'],
+                                      in_use=pending_upload_files)
+    return _image_cache
 
-def get_image_base64(file_path):
-    with open(file_path, "rb") as image_file:
-        encoded_string = base64.b64encode(image_file.read()).decode('utf-8')
-    return encoded_string
+def pending_upload_files():
+    # 排队和处理中的任务引用的 static/uploads 文件名 (生成的图片), 缓存不能删除
+    return {os.path.basename(path) for path in get_job_manager().pending_files()}
+
+def convert_model(job, job_folder):
+    # OBJ 转为量化 GLB, 转换失败时前端继续使用 OBJ; 复用的模型已经有 GLB
+    obj_file, mtl_file = find_model_files(job_folder)
+    if not obj_file or os.path.exists(os.path.join(job_folder, GLB_NAME)):
+        return
+    try:
+        convert_obj_to_glb(os.path.join('static', obj_file),
+                           os.path.join(job_folder, GLB_NAME),
+                           os.path.join('static', mtl_file) if mtl_file else None)
+    except Exception:
+        logger.exception('GLB conversion failed folder=%s', job_folder)
+
+_publish_lock = threading.Lock()
+
+def publish_assets(job_folder):
+    # 文件入库 (去重) 后写入目录版本号, 之后 index_model 生成 /assets/<id>/<version>/ URL;
+    # LOD 和纹理优化完成时都会调用, 加锁避免较早的版本号覆盖较新的
+    with _publish_lock:
+        hashes = get_assets().ingest_folder(job_folder)
+        update_metadata_file(job_folder, asset_version=folder_version(hashes))
+    return hashes
+
+def dedupe_assets(job, job_folder):
+    publish_assets(job_folder)
+
+def index_model(job, job_folder):
+    get_catalog().refresh(os.path.basename(job_folder))
+
+_lod_pool = None
+_lod_pool_lock = threading.Lock()
+
+def get_lod_pool():
+    # LOD/缩略图是纯 CPU 计算, 放在独立进程池里, 不占用请求线程和 GIL
+    global _lod_pool
+    with _lod_pool_lock:
+        if _lod_pool is None:
+            _lod_pool = ProcessPoolExecutor(max_workers=app.config['LOD_WORKERS'],
+                                            mp_context=multiprocessing.get_context('spawn'))
+    return _lod_pool
+
+def submit_offline(fn, *args):
+    # 一个子进程崩溃 (OOM、网格代码段错误) 后整个进程池不可用, 之后的 submit 都会抛 BrokenProcessPool;
+    # 丢弃坏掉的进程池, 重建后再提交一次
+    global _lod_pool
+    pool = get_lod_pool()
+    try:
+        return pool.submit(fn, *args)
+    except BrokenProcessPool:
+        logger.warning('LOD process pool broken, recreating it')
+        with _lod_pool_lock:
+            if _lod_pool is pool:
+                _lod_pool = None
+        pool.shutdown(wait=False, cancel_futures=True)
+        return get_lod_pool().submit(fn, *args)
+
+def optional_hook(hook):
+    # LOD、纹理优化和预压缩只是优化, 失败时记录日志, 任务照常完成 (模型目录已经发布)
+    @functools.wraps(hook)
+    def wrapper(job, job_folder):
+        try:
+            hook(job, job_folder)
+        except Exception:
+            logger.exception('%s failed folder=%s', hook.__name__, job_folder)
+    return wrapper
+
+@optional_hook
+def build_lods(job, job_folder):
+    # 异步生成 LOD, 完成后写入 metadata.json 并刷新目录索引; 任务本身不等待
+    model_id = os.path.basename(job_folder)
+    if read_metadata(job_folder).get('lods'):
+        return
+
+    def on_done(future):
+        # 关闭进程池时取消的任务不算失败
+        if future.cancelled():
+            return
+        try:
+            result = future.result()
+        except Exception:
+            logger.exception('LOD generation failed model=%s', model_id)
+            return
+        if result:
+            # 纹理优化先完成、但 LOD 写入时还没有 WebP 的情况, 在这里补上
+            link_glb_textures(job_folder)
+            update_metadata_file(job_folder, lods=result['lods'],
+                                 thumbnail=result['thumbnail'], textures=result['textures'])
+            publish_assets(job_folder)
+            get_catalog().refresh(model_id)
+
+    submit_offline(process_model, job_folder).add_done_callback(on_done)
+
+@optional_hook
+def reencode_textures(job, job_folder):
+    # 贴图无损优化 + WebP 变体 + material.webp.mtl, 在 LOD 进程池中异步执行; 完成后刷新版本号和目录索引
+    model_id = os.path.basename(job_folder)
+    if read_metadata(job_folder).get('texture_variants'):
+        return
+
+    def on_done(future):
+        # 关闭进程池时取消的任务不算失败
+        if future.cancelled():
+            return
+        try:
+            result = future.result()
+        except Exception:
+            logger.exception('texture re-encoding failed model=%s', model_id)
+            return
+        if result:
+            update_metadata_file(job_folder, texture_variants={
+                'webp_mtl': result['webp_mtl'],
+                'webp': {name: t['webp'] for name, t in result['textures'].items()},
+            })
+            publish_assets(job_folder)
+            get_catalog().refresh(model_id)
+
+    submit_offline(optimize_textures, job_folder).add_done_callback(on_done)
+
+@optional_hook
+def precompress_assets(job, job_folder):
+    # OBJ/MTL 的 br/gzip 预压缩 (brotli 最高压缩级别, 4MB 的 OBJ 要十几秒) 排在 LOD 之后进入进程池,
+    # 任务不等待; 完成前 /assets/ 返回未压缩的文件
+    assets = get_assets()
+    hashes = assets.ingest_folder(job_folder)
+    for blob in assets.pending_compression(hashes):
+        submit_offline(precompress, blob)
+
+def prepare_upload(file_path):
+    # 在任务 worker 线程中运行: 转正方向、缩小、重新编码并去掉 EXIF; 上传的原图处理后删除
+    result = uploads.prepare(file_path, app.config['UPLOAD_FOLDER'], max_edge=app.config['PREPARE_MAX_EDGE'])
+    if result:
+        incoming = os.path.abspath(app.config['INCOMING_FOLDER'])
+        result['remove_source'] = os.path.dirname(os.path.abspath(file_path)) == incoming
+    return result
+
+_job_events = JobEvents()
+
+_job_manager = None
+_job_manager_lock = threading.Lock()
+
+def repair_models(keep):
+    # 重启恢复: 清理崩溃留下的临时目录, 残缺的模型目录移出 static/models
+    repair_model_folders(app.config['MODEL_FOLDER'], get_catalog(), app.config['QUARANTINE_FOLDER'], keep=keep,
+                         staging_prefixes=(STAGING_PREFIX, archive.STAGING_PREFIX))
+
+def get_job_manager():
+    # 懒加载: 第一次请求时启动后台 worker, 按任务日志恢复未完成的任务并修复模型目录
+    global _job_manager
+    with _job_manager_lock:
+        if _job_manager is None:
+            _job_manager = JobManager(
+                JobStore(app.config['JOB_FOLDER']),
+                get_hunyuan_client,
+                app.config['MODEL_FOLDER'],
+                max_workers=app.config['JOB_WORKERS'],
+                hooks=[convert_model, dedupe_assets, index_model, build_lods, reencode_textures,
+                       precompress_assets],
+                archive_dir=app.config['ARCHIVE_FOLDER'],
+                assets=get_assets(),
+                events=_job_events,
+                prepare=prepare_upload,
+                journal=JobJournal(app.config['JOB_JOURNAL']),
+            )
+            _job_manager.resume(repair=repair_models)
+    return _job_manager
+
+def shutdown_workers():
+    # 停止任务线程和 LOD 进程池 (等正在处理的模型完成), 进程退出时不留下孤儿 worker; ASGI lifespan 关闭时调用
+    with _job_manager_lock:
+        if _job_manager is not None:
+            _job_manager.shutdown(wait=False)
+    with _lod_pool_lock:
+        if _lod_pool is not None:
+            _lod_pool.shutdown(wait=True, cancel_futures=True)
+
+@app.before_request
+def start_job_workers():
+    get_job_manager()
+
+HTTP_SECONDS = metrics.histogram('http_request_seconds', 'Time to produce a response (streamed bodies '
+                                 'such as SSE are not included)', ('endpoint', 'method', 'status'))
+
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+
+@app.after_request
+def record_request_time(response):
+    # 按路由模板而不是实际路径分组, 避免每个模型 ID 一个序列
+    start = g.get('request_start')
+    if start is not None:
+        endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+        HTTP_SECONDS.labels(endpoint, request.method, str(response.status_code)).observe(
+            time.perf_counter() - start)
+    return response
+
+def collect_runtime_metrics():
+    # 导出时读取已有的统计对象; 只读取已经创建的单例, 不为导出去创建图片缓存等
+    families = []
+    if _job_manager is not None:
+        stats = _job_manager.poller.stats()
+        families.append(('jobs_polling', 'gauge', 'Hunyuan jobs waiting for a result', [({}, stats['pending'])]))
+        families.append(('poll_rate_limited_total', 'counter', 'QueryHunyuanTo3DJob calls that were rate limited',
+                         [({}, stats['rate_limited'])]))
+    if _image_cache is not None:
+        stats = _image_cache.stats()
+        families.append(('image_cache_entries', 'gauge', 'Cached prompt results', [({}, stats['entries'])]))
+        families.append(('image_cache_bytes', 'gauge', 'Bytes of cached images', [({}, stats['bytes'])]))
+        families.append(('image_cache_lookups_total', 'counter', 'Image cache lookups',
+                         [({'result': 'hit'}, stats['hits']), ({'result': 'miss'}, stats['misses'])]))
+    return families
+
+metrics.REGISTRY.add_collector(collect_runtime_metrics)
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    return Response(metrics.REGISTRY.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
 
 @app.route('/')
 def index():
@@ -47,167 +402,139 @@ def generate_image():
         return jsonify({'error': 'No API Key provided'})
 
     try:
-        conn = http.client.HTTPSConnection("api.vectorengine.ai")
-        payload = json.dumps({
-            "size": "1024x1024", # 调整为正方形以适应通常的 3D 输入需求
-            "prompt": prompt,
-            "model": "gpt-image-1",
-            "n": 1,
-            "response_format": "b64_json" # 显式请求 b64_json 格式
-        })
-        headers = {
-            'Accept': 'application/json',
-            'Authorization': f'Bearer {api_key}',
-            'Content-Type': 'application/json'
-        }
-        conn.request("POST", "/v1/images/generations", payload, headers)
-        res = conn.getresponse()
-        data = res.read()
-        response_data = json.loads(data.decode("utf-8"))
-        
-        # Check for explicit error from API
-        if 'error' in response_data:
-            error_msg = response_data['error']
-            if isinstance(error_msg, dict) and 'message' in error_msg:
-                return jsonify({'error': f"API Error: {error_msg['message']}", 'details': response_data})
-            return jsonify({'error': f"API Error: {str(error_msg)}", 'details': response_data})
-
-        # 打印 API 响应以调试 (省略过长的 Base64)
-        debug_data = response_data.copy()
-        if 'data' in debug_data and isinstance(debug_data['data'], list):
-            for item in debug_data['data']:
-                if 'b64_json' in item:
-                    item['b64_json'] = item['b64_json'][:50] + "..." # 截断显示
-        print("Vector Engine API Response:", json.dumps(debug_data, indent=2))
-        
-        # 尝试解析 URL
-        image_url = None
-        
-        # 深度调试
-        if 'data' in response_data:
-            print(f"Data field found. Type: {type(response_data['data'])}")
-            if isinstance(response_data['data'], list) and len(response_data['data']) > 0:
-                item = response_data['data'][0]
-                print(f"First item keys: {item.keys()}")
-                if 'url' in item:
-                    image_url = item['url']
-                    print("Found URL in data[0]['url']")
-                elif 'image_url' in item:
-                    image_url = item['image_url']
-                    print("Found URL in data[0]['image_url']")
-                elif 'b64_json' in item:
-                    # 处理 b64_json 字段
-                    b64_data = item['b64_json']
-                    # 补充前缀以适配后续逻辑
-                    if not b64_data.startswith("data:image"):
-                         # 关键修复：这里直接保存纯 base64 字符串，不加前缀，因为下面解码时会自己拆分
-                         # 或者如果我们要加前缀，下面的 split 就要对应
-                         # 为了稳妥，我们在这里模拟成一个 data URI
-                         image_url = f"data:image/png;base64,{b64_data}"
-                    else:
-                         image_url = b64_data
-                    print("Found URL in data[0]['b64_json']")
-            else:
-                print("Data field is empty or not a list")
-        
-        # 如果上面没找到，尝试在根目录找
-        if not image_url:
-            if 'url' in response_data:
-                image_url = response_data['url']
-                print("Found URL in root['url']")
-            elif 'image_url' in response_data:
-                image_url = response_data['image_url']
-                print("Found URL in root['image_url']")
-            
-        if image_url:
-            print(f"Final Image URL (prefix): {image_url[:50]}...")
-            filename = f"gen_{int(time.time())}.png"
-            file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-
-            # 处理 Base64 Data URI
-            if image_url.startswith("data:image"):
-                # 格式通常是 data:image/png;base64,xxxxxx...
-                try:
-                    header, encoded = image_url.split(",", 1)
-                    # Fix padding and clean string
-                    encoded = encoded.strip().replace("\n", "").replace("\r", "").replace(" ", "")
-                    
-                    # Add padding if needed
-                    missing_padding = len(encoded) % 4
-                    if missing_padding:
-                        encoded += '=' * (4 - missing_padding)
-                    
-                    img_data = base64.b64decode(encoded)
-                    with open(file_path, 'wb') as f:
-                        f.write(img_data)
-                except Exception as e:
-                    return jsonify({'error': f'Failed to decode base64 image: {str(e)}'})
-            else:
-                # 处理普通 HTTP 链接
-                img_response = requests.get(image_url)
-                with open(file_path, 'wb') as f:
-                    f.write(img_response.content)
-                
-            return jsonify({
-                'status': 'success',
-                'image_url': image_url[:100] + "..." if len(image_url) > 100 else image_url, # 避免返回过长的 Base64
-                'local_image_url': f'/static/uploads/{filename}', # 本地链接
-                'filename': filename
-            })
-        else:
-            return jsonify({'error': 'Failed to parse image URL from response', 'details': response_data})
-
+        # no_cache: 同一个 prompt 想要新的候选图时跳过缓存
+        images = imagegen.generate(prompt, api_key, app.config['UPLOAD_FOLDER'],
+                                   base_url=VECTOR_ENGINE_BASE_URL, debug=app.config['DEBUG_PAYLOADS'],
+                                   cache=None if data.get('no_cache') else get_image_cache(),
+                                   timeout=app.config['GENERATE_TIMEOUT'])
+        return jsonify(dict(images[0], status='success'))
+    except ImageGenError as e:
+        result = {'error': str(e)}
+        if e.details is not None:
+            result['details'] = e.details
+        return jsonify(result)
     except Exception as e:
-        import traceback
-        traceback.print_exc()
+        logger.exception('image generation failed')
         return jsonify({'error': str(e)})
 
+_generate_pool = None
+_generate_pool_lock = threading.Lock()
+
+def get_generate_pool():
+    # 所有批量请求共用, 限制同时发往 Vector Engine 的请求数
+    global _generate_pool
+    with _generate_pool_lock:
+        if _generate_pool is None:
+            _generate_pool = ThreadPoolExecutor(max_workers=app.config['GENERATE_CONCURRENCY'],
+                                                thread_name_prefix='generate')
+    return _generate_pool
+
+def generate_batch_item(index, prompt, n, api_key, upload_folder, base_url, debug, cache, timeout=None):
+    # 在线程池中运行: 请求 + 解码保存, 错误作为结果返回而不是抛出
+    start = time.perf_counter()
+    result = {'index': index, 'prompt': prompt}
+    try:
+        result['images'] = imagegen.generate(prompt, api_key, upload_folder, n=n,
+                                             base_url=base_url, debug=debug, cache=cache, timeout=timeout)
+        result['status'] = 'success'
+    except Exception as e:
+        result.update(status='error', error=str(e))
+    result['seconds'] = round(time.perf_counter() - start, 3)
+    return result
+
+def parse_batch(data):
+    # 校验批量请求, 返回 ([(prompt, n)], None) 或 (None, 错误信息); 同步和异步 (asgi.py) 模式共用
+    prompts = data.get('prompts')
+    if not isinstance(prompts, list) or not prompts:
+        return None, 'No prompts provided'
+    if len(prompts) > app.config['GENERATE_MAX_BATCH']:
+        return None, f"At most {app.config['GENERATE_MAX_BATCH']} prompts per batch"
+    items = []
+    for item in prompts:
+        prompt, n = (item.get('prompt'), item.get('n', data.get('n', 1))) if isinstance(item, dict) \
+            else (item, data.get('n', 1))
+        if not isinstance(prompt, str) or not prompt.strip():
+            return None, 'Every prompt must be a non-empty string'
+        if not isinstance(n, int) or not 1 <= n <= imagegen.MAX_IMAGES_PER_PROMPT:
+            return None, f'n must be between 1 and {imagegen.MAX_IMAGES_PER_PROMPT}'
+        items.append((prompt, n))
+    return items, None
+
+@app.route('/generate_images', methods=['POST'])
+def generate_images():
+    # 批量生成: {"prompts": ["...", {"prompt": "...", "n": 2}], "n": 1, "api_key": "..."}
+    # 每完成一项就推送一行结果 (NDJSON); ?format=sse 或 Accept: text/event-stream 时使用 SSE
+    data = request.json or {}
+    api_key = data.get('api_key') or VECTOR_ENGINE_API_KEY
+    if not api_key:
+        return jsonify({'error': 'No API Key provided'}), 400
+    items, error = parse_batch(data)
+    if error:
+        return jsonify({'error': error}), 400
+
+    sse = request.args.get('format') == 'sse' or 'text/event-stream' in request.headers.get('Accept', '')
+    pool = get_generate_pool()
+    cache = None if data.get('no_cache') else get_image_cache()
+    futures = [pool.submit(generate_batch_item, i, prompt, n, api_key, app.config['UPLOAD_FOLDER'],
+                           VECTOR_ENGINE_BASE_URL, app.config['DEBUG_PAYLOADS'], cache,
+                           app.config['GENERATE_TIMEOUT'])
+               for i, (prompt, n) in enumerate(items)]
+
+    def encode(event, payload):
+        if sse:
+            return f"event: {event}\ndata: {json.dumps(payload, ensure_ascii=False)}\n\n"
+        return json.dumps(payload, ensure_ascii=False) + "\n"
+
+    def stream():
+        start = time.perf_counter()
+        succeeded = 0
+        try:
+            for future in as_completed(futures):
+                result = future.result()
+                succeeded += result['status'] == 'success'
+                yield encode('result', result)
+            yield encode('done', {'done': True, 'total': len(futures), 'succeeded': succeeded,
+                                  'failed': len(futures) - succeeded,
+                                  'seconds': round(time.perf_counter() - start, 3)})
+        finally:
+            # 客户端断开时取消还没开始的请求
+            for future in futures:
+                future.cancel()
+
+    headers = {'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    return Response(stream(), mimetype='text/event-stream' if sse else 'application/x-ndjson', headers=headers)
+
 @app.route('/list_models', methods=['GET'])
 def list_models():
-    models = []
-    models_dir = app.config['MODEL_FOLDER']
-    if os.path.exists(models_dir):
-        # Iterate over job ID folders
-        for job_id in os.listdir(models_dir):
-            job_path = os.path.join(models_dir, job_id)
-            if os.path.isdir(job_path):
-                # Look for obj and mtl inside
-                obj_file = None
-                mtl_file = None
-                metadata = {}
-                
-                # Try load metadata
-                meta_path = os.path.join(job_path, "metadata.json")
-                if os.path.exists(meta_path):
-                    try:
-                        with open(meta_path, 'r', encoding='utf-8') as f:
-                            metadata = json.load(f)
-                    except:
-                        pass
-
-                for root, dirs, files in os.walk(job_path):
-                    for f in files:
-                        if f.lower().endswith('.obj'):
-                            rel_path = os.path.relpath(os.path.join(root, f), 'static')
-                            obj_file = rel_path.replace('\\', '/')
-                        elif f.lower().endswith('.mtl'):
-                            rel_path = os.path.relpath(os.path.join(root, f), 'static')
-                            mtl_file = rel_path.replace('\\', '/')
-                
-                if obj_file:
-                    models.append({
-                        'id': job_id,
-                        'name': metadata.get('title', f"Memory {job_id[:4]}"), # Use title from metadata
-                        'date': metadata.get('date', time.strftime('%Y-%m-%d', time.localtime(os.path.getctime(job_path)))), # User date or file date
-                        'obj_url': f'/static/{obj_file}',
-                        'mtl_url': f'/static/{mtl_file}' if mtl_file else None,
-                        'created_at': os.path.getctime(job_path) 
-                    })
-    
-    # Sort by user assigned date (newest first)
-    models.sort(key=lambda x: x['date'], reverse=True)
-    
-    return jsonify({'models': models})
+    catalog = get_catalog()
+
+    # ETag = 目录版本号 + 查询参数, 列表没有变化时返回 304
+    etag = f"{catalog.version()}-{hashlib.sha1(request.query_string).hexdigest()[:12]}"
+    if request.if_none_match.contains(etag):
+        response = app.response_class(status=304)
+    else:
+        args = request.args
+        if not any(k in args for k in ('limit', 'cursor', 'from', 'to', 'q', 'sort')):
+            # 没有参数时返回完整列表, 已按用户设置的日期排序 (newest first)
+            response = jsonify({'models': catalog.list()})
+        else:
+            try:
+                limit = min(max(int(args.get('limit', 50)), 1), 500)
+                models, next_cursor = catalog.query(
+                    limit=limit,
+                    cursor=args.get('cursor'),
+                    date_from=args.get('from'),
+                    date_to=args.get('to'),
+                    title_prefix=args.get('q'),
+                    sort=args.get('sort', 'date'),
+                )
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
+            response = jsonify({'models': models, 'next_cursor': next_cursor})
+    response.set_etag(etag)
+    # 浏览器每次都带 If-None-Match 重新验证
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
 
 @app.route('/update_model', methods=['POST'])
 def update_model():
@@ -223,34 +550,21 @@ def update_model():
     if not os.path.exists(job_folder):
         return jsonify({'error': 'Model not found'})
         
-    meta_path = os.path.join(job_folder, "metadata.json")
-    metadata = {}
-    
-    # Read existing
-    if os.path.exists(meta_path):
-        try:
-            with open(meta_path, 'r', encoding='utf-8') as f:
-                metadata = json.load(f)
-        except:
-            pass
-            
     # Update
+    fields = {}
     if new_title:
-        metadata['title'] = new_title
+        fields['title'] = new_title
     if new_date:
-        metadata['date'] = new_date
-        
-    # Save
-    with open(meta_path, 'w', encoding='utf-8') as f:
-        json.dump(metadata, f)
+        fields['date'] = new_date
+    update_metadata_file(job_folder, **fields)
+    get_catalog().update_metadata(model_id, new_title, new_date)
         
     return jsonify({'status': 'success'})
 
 @app.route('/diary', methods=['GET', 'POST'])
 def handle_diary():
-    diary_folder = os.path.join('static', 'diaries')
-    os.makedirs(diary_folder, exist_ok=True)
-    
+    diary = get_diary()
+
     if request.method == 'POST':
         data = request.json
         date = data.get('date')
@@ -258,28 +572,40 @@ def handle_diary():
         
         if not date:
             return jsonify({'error': 'Date required'})
-            
-        file_path = os.path.join(diary_folder, f"{date}.json")
-        with open(file_path, 'w', encoding='utf-8') as f:
-            json.dump({'date': date, 'content': content, 'updated_at': time.time()}, f)
-            
+        if not valid_date(date):
+            return jsonify({'error': 'Invalid date'}), 400
+
+        diary.put(date, content)
         return jsonify({'status': 'success'})
         
     else: # GET
+        # ?date= 单日; ?from=&to= 日期范围 (日历一个月只需一次请求); ?q= 全文搜索
         date = request.args.get('date')
+        date_from = request.args.get('from')
+        date_to = request.args.get('to')
+        query = request.args.get('q')
+        for value in (date, date_from, date_to):
+            if value and not valid_date(value):
+                return jsonify({'error': 'Invalid date'}), 400
+
+        if query:
+            limit = min(max(request.args.get('limit', 50, type=int), 1), 200)
+            return jsonify({'entries': diary.search(query, date_from, date_to, limit)})
+        if date_from or date_to:
+            return jsonify({'entries': diary.range(date_from, date_to)})
         if not date:
             return jsonify({'error': 'Date required'})
-            
-        file_path = os.path.join(diary_folder, f"{date}.json")
-        if os.path.exists(file_path):
-            with open(file_path, 'r', encoding='utf-8') as f:
-                return jsonify(json.load(f))
+
+        entry = diary.get(date)
+        if entry:
+            return jsonify(entry)
         else:
             return jsonify({'date': date, 'content': ''})
 
 @app.route('/upload', methods=['POST'])
 def upload_file():
     file_path = None
+    upload = None
     
     # Get Metadata
     memory_date = request.form.get('date', time.strftime('%Y-%m-%d'))
@@ -288,129 +614,233 @@ def upload_file():
     # 检查是上传文件还是使用已生成的文件
     if 'filename' in request.form:
         # 使用刚刚生成的图片
-        filename = request.form['filename']
+        filename = secure_filename(request.form['filename'])
         file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
         if not os.path.exists(file_path):
             return jsonify({'error': 'File not found'})
+        get_image_cache().touch(filename)
     elif 'file' in request.files:
-        # 上传新图片
+        # 上传新图片: 分块写入磁盘并计算哈希, 超过大小上限时中止
         file = request.files['file']
         if file.filename == '':
             return jsonify({'error': 'No selected file'})
-        if file:
-            filename = secure_filename(file.filename)
-            file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-            file.save(file_path)
+        extension = os.path.splitext(secure_filename(file.filename))[1]
+        try:
+            upload = uploads.receive(file.stream, app.config['INCOMING_FOLDER'], extension,
+                                     max_bytes=app.config['UPLOAD_MAX_BYTES'])
+        except uploads.UploadTooLarge as e:
+            return jsonify({'error': str(e)}), 413
+        error = uploads.probe(upload['path'])
+        if error:
+            os.remove(upload['path'])
+            return jsonify({'error': error}), 400
+        file_path = upload['path']
     else:
          return jsonify({'error': 'No file part or filename provided'})
 
     if file_path:
-        try:
-            # 1. 提交任务
-            cred = credential.Credential(SECRET_ID, SECRET_KEY)
-            httpProfile = HttpProfile()
-            httpProfile.endpoint = "hunyuan.tencentcloudapi.com"
-            clientProfile = ClientProfile()
-            clientProfile.httpProfile = httpProfile
-            client = CommonClient("hunyuan", "2023-09-01", cred, "ap-guangzhou", clientProfile)
-
-            img_base64 = get_image_base64(file_path)
-            params = {
-                "ImageBase64": img_base64,
-            }
-            
-            # 使用正确的 Action
-            response_submit = client.call_json("SubmitHunyuanTo3DJob", params)
-            
-            if "Response" not in response_submit or "JobId" not in response_submit["Response"]:
-                return jsonify({'error': 'Failed to submit job', 'details': response_submit})
-            
-            job_id = response_submit["Response"]["JobId"]
-            
-            # 2. 轮询结果
-            # 为了简单起见，这里是阻塞的，实际生产中应该用异步任务 (Celery/Redis)
-            # 但为了快速展示 MVP，我们在后端循环等待
-            status = "RUNNING"
-            result_data = None
-            
-            # 最多等待 5 分钟
-            for _ in range(60):
-                response_query = client.call_json("QueryHunyuanTo3DJob", {"JobId": job_id})
-                data = response_query.get("Response", {})
-                status = data.get("Status")
-                
-                if status == "SUCCESS" or status == "DONE":
-                    result_data = data
-                    break
-                elif status == "FAILED":
-                    return jsonify({'error': 'Job failed', 'details': data})
-                
-                time.sleep(5)
-            
-            if not result_data:
-                return jsonify({'error': 'Timeout waiting for job'})
-            
-            # 3. 处理结果
-            model_url = None
-            result_files = result_data.get("ResultFile3Ds", [])
-            for item in result_files:
-                file_3d_list = item.get("File3D", [])
-                for file_info in file_3d_list:
-                    if file_info.get("Type") in ["OBJ", "GLB"]:
-                        model_url = file_info.get("Url")
-                        break
-                if model_url:
+        # 提交到后台任务队列, 立即返回本地任务 ID, 前端通过 /jobs/<id> 查询进度
+        job = get_job_manager().enqueue(file_path, memory_title, memory_date, upload=upload)
+        logger.info('upload job=%s source=%s bytes=%s', job['id'], 'generated' if upload is None else 'file',
+                    upload['bytes'] if upload else os.path.getsize(file_path))
+        return jsonify({
+            'status': 'queued',
+            'job_id': job['id'],
+            'status_url': f"/jobs/{job['id']}"
+        })
+
+ASSET_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+ASSET_MIMETYPES = {'.obj': 'text/plain', '.mtl': 'text/plain', '.glb': 'model/gltf-binary'}
+CONTENT_HASHED_UPLOAD = re.compile(r'^/static/uploads/(gen_[0-9a-f]{16}\.png|upload_[0-9a-f]{16}\.(jpg|png))$')
+
+@app.route('/assets/<model_id>/<version>/<path:filename>', methods=['GET'])
+def serve_asset(model_id, version, filename):
+    # 模型文件: URL 中的版本号与当前一致时永久缓存 (内容变化后列表给出新 URL);
+    # 浏览器接受时返回预压缩的 br/gzip; 支持 Range 和 If-None-Match (send_file conditional)
+    job_folder = safe_join(app.config['MODEL_FOLDER'], model_id)
+    path = safe_join(job_folder, filename) if job_folder else None
+    if not path or not os.path.isfile(path) or os.path.basename(path) == 'metadata.json':
+        return jsonify({'error': 'Not found'}), 404
+
+    assets = get_assets()
+    sha256 = assets.sha256_for(path)
+    source, encoding = path, None
+    if sha256 and not request.range:
+        # Range 请求 (断点续传) 总是针对未压缩的文件
+        for candidate in ('br', 'gzip'):
+            if request.accept_encodings[candidate]:
+                encoded = assets.encoded_path(sha256, candidate)
+                if encoded:
+                    source, encoding = encoded, candidate
                     break
-            
-            if not model_url:
-                return jsonify({'error': 'No 3D model found in result'})
-            
-            # 4. 下载并解压
-            job_folder = os.path.join(app.config['MODEL_FOLDER'], job_id)
-            os.makedirs(job_folder, exist_ok=True)
-            
-            # 保存元数据
-            meta_path = os.path.join(job_folder, "metadata.json")
-            with open(meta_path, 'w', encoding='utf-8') as f:
-                json.dump({
-                    "title": memory_title,
-                    "date": memory_date,
-                    "created_at": time.time()
-                }, f)
-            
-            zip_path = os.path.join(job_folder, "model.zip")
-            
-            # 下载 Zip
-            r = requests.get(model_url)
-            with open(zip_path, 'wb') as f:
-                f.write(r.content)
-            
-            # 解压
-            with zipfile.ZipFile(zip_path, 'r') as zip_ref:
-                zip_ref.extractall(job_folder)
-            
-            # 查找 obj 文件和 mtl 文件
-            obj_file = None
-            mtl_file = None
-            for root, dirs, files in os.walk(job_folder):
-                for f in files:
-                    if f.lower().endswith('.obj'):
-                        # 返回相对于 static 的路径
-                        rel_path = os.path.relpath(os.path.join(root, f), 'static')
-                        # 统一使用 forward slash for web
-                        obj_file = rel_path.replace('\\', '/')
-                    elif f.lower().endswith('.mtl'):
-                        rel_path = os.path.relpath(os.path.join(root, f), 'static')
-                        mtl_file = rel_path.replace('\\', '/')
-
-            return jsonify({
-                'status': 'success',
-                'obj_url': f'/static/{obj_file}',
-                'mtl_url': f'/static/{mtl_file}' if mtl_file else None
-            })
+    mimetype = ASSET_MIMETYPES.get(os.path.splitext(path)[1].lower()) \
+        or mimetypes.guess_type(path)[0] or 'application/octet-stream'
+    etag = f"{sha256}-{encoding}" if sha256 and encoding else sha256
+
+    if app.config['ASSET_ACCEL_REDIRECT'] and sha256:
+        blob = assets.blob_path(sha256) if source == path else source
+        response = app.response_class(mimetype=mimetype)
+        response.headers['X-Accel-Redirect'] = app.config['ASSET_ACCEL_REDIRECT'].rstrip('/') + '/' + \
+            os.path.relpath(blob, assets.blob_root).replace('\\', '/')
+    else:
+        # 在 gunicorn 等提供 wsgi.file_wrapper 的服务器下由 os.sendfile 零拷贝发送
+        response = send_file(os.path.abspath(source), mimetype=mimetype, etag=etag or True,
+                             conditional=True, max_age=None)
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    if path.lower().endswith(COMPRESSIBLE_EXTENSIONS):
+        response.vary.add('Accept-Encoding')
+    current = read_metadata(job_folder).get('asset_version') == version
+    response.headers['Cache-Control'] = ASSET_CACHE_CONTROL if current and sha256 else 'no-cache'
+    return response
+
+@app.after_request
+def cache_content_hashed_uploads(response):
+    # 生成的图片和预处理后的上传图片, 文件名就是内容哈希 (gen_/upload_<sha256 前 16 位>), 可以永久缓存
+    if response.status_code == 200 and CONTENT_HASHED_UPLOAD.match(request.path):
+        response.headers['Cache-Control'] = ASSET_CACHE_CONTROL
+    return response
+
+@app.route('/poller/stats', methods=['GET'])
+def poller_stats():
+    return jsonify(get_job_manager().poller.stats())
+
+@app.route('/fetch/stats', methods=['GET'])
+def fetch_stats():
+    return jsonify(fetch.STATS.snapshot())
+
+@app.route('/assets/stats', methods=['GET'])
+def asset_stats():
+    return jsonify(get_assets().stats())
+
+@app.route('/uploads/stats', methods=['GET'])
+def upload_stats():
+    return jsonify(uploads.STATS.snapshot())
+
+@app.errorhandler(413)
+def upload_too_large(e):
+    limit = app.config['IMPORT_MAX_BYTES'] if request.path == '/import' else app.config['UPLOAD_MAX_BYTES']
+    return jsonify({'error': f"Upload exceeds {limit} bytes"}), 413
+
+def flag(name, default):
+    value = request.args.get(name)
+    return default if value is None else value.lower() not in ('0', 'false', 'no')
+
+@app.route('/export', methods=['GET'])
+def export_archive():
+    # 备份 / 迁移: 边读边输出 tar (?gzip=1 时为 tar.gz), 不在磁盘上暂存
+    # ?ids=a,b 指定胶囊; ?since=<时间戳|ISO 时间> 增量导出; ?from=&to= 按胶囊/日记日期; ?models=0 / ?diary=0
+    for value in (request.args.get('from'), request.args.get('to')):
+        if value and not valid_date(value):
+            return jsonify({'error': 'Invalid date'}), 400
+    try:
+        since = archive.parse_since(request.args.get('since'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    ids = request.args.get('ids')
+    compress = flag('gzip', False)
+    plan = archive.plan_export(get_catalog(), get_diary(), app.config['MODEL_FOLDER'],
+                               ids=[i for i in ids.split(',') if i] if ids else None, since=since,
+                               date_from=request.args.get('from'), date_to=request.args.get('to'),
+                               include_models=flag('models', True), include_diary=flag('diary', True),
+                               assets=get_assets())
+    until = plan['manifest']['until']
+    filename = time.strftime('memory-capsules-%Y%m%d-%H%M%S', time.localtime(until)) + \
+        ('.tar.gz' if compress else '.tar')
+    headers = {
+        'Content-Disposition': f'attachment; filename="{filename}"',
+        # 下一次增量导出的 since
+        'X-Archive-Until': repr(until),
+        'X-Archive-Capsules': str(len(plan['manifest']['capsules'])),
+        'Cache-Control': 'no-store',
+        'X-Accel-Buffering': 'no',
+    }
+    return Response(archive.stream_export(plan, compress=compress),
+                    mimetype='application/gzip' if compress else 'application/x-tar', headers=headers)
+
+def finish_imported_capsule(job_folder):
+    # 导入的胶囊缺少 GLB / LOD / WebP 贴图 / 预压缩文件时补上 (已有的直接跳过), 与上传流水线相同的 hook
+    for hook in (convert_model, build_lods, reencode_textures, precompress_assets):
+        hook(None, job_folder)
+
+@app.route('/import', methods=['POST'])
+def import_archive():
+    # 请求体是 /export 生成的 tar / tar.gz; ?replace=1 覆盖已有的胶囊, 默认跳过
+    request.max_content_length = app.config['IMPORT_MAX_BYTES']
+    workers = min(max(request.args.get('workers', app.config['IMPORT_WORKERS'], type=int), 0), 16)
+    try:
+        result = archive.import_archive(request.stream, app.config['MODEL_FOLDER'], catalog=get_catalog(),
+                                        diary=get_diary(), assets=get_assets(),
+                                        on_capsule=finish_imported_capsule, replace=flag('replace', False),
+                                        workers=workers)
+    except archive.ArchiveError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify(dict(result, status='success'))
+
+@app.route('/image_cache/stats', methods=['GET'])
+def image_cache_stats():
+    return jsonify(get_image_cache().stats())
+
+def format_sse(event, data, event_id=None):
+    lines = [f"event: {event}"]
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append("data: " + json.dumps(data, ensure_ascii=False))
+    return "\n".join(lines) + "\n\n"
+
+def sse_resume_point(job, last_id):
+    # 返回 (从哪个编号之后补发, 是否先发一次当前状态)
+    # 进程重启或任务的频道被淘汰后内存里没有历史, 大于已知事件数的 Last-Event-ID 视为过期;
+    # 没有历史、或历史已经发完而任务已经结束时, 发送快照 (结束的任务发完即关闭)
+    history = _job_events.since(job['id'])
+    if last_id > len(history):
+        last_id = 0
+    snapshot = not history or (last_id == len(history) and job['status'] in TERMINAL_STATES)
+    return last_id, snapshot
+
+@app.route('/jobs/<job_id>/events', methods=['GET'])
+def job_events(job_id):
+    # SSE 进度流: 推送每次状态变化 (含各阶段耗时), 任务结束后关闭连接
+    # 等待基于 threading.Condition, 在 gevent worker 下每个连接只占一个 greenlet
+    job = get_job_manager().get(job_id)
+    if not job:
+        return jsonify({'error': 'Job not found'}), 404
+    last_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id') or '0'
+    last_id = int(last_id) if last_id.isdigit() else 0
+    heartbeat = app.config['SSE_HEARTBEAT']
+
+    def stream():
+        sent, snapshot = sse_resume_point(job, last_id)
+        yield "retry: 3000\n\n"
+        if snapshot:
+            yield format_sse('progress', progress_event(job))
+            if job['status'] in TERMINAL_STATES:
+                return
+        while True:
+            events = _job_events.wait(job_id, sent, timeout=heartbeat)
+            if not events:
+                # 等待期间频道可能被淘汰, 新事件不会再到这里; 以保存的状态为准
+                current = get_job_manager().get(job_id)
+                if current and current['status'] in TERMINAL_STATES:
+                    yield format_sse('progress', progress_event(current))
+                    return
+                yield ": keep-alive\n\n"
+                continue
+            for event in events:
+                sent = event['id']
+                yield format_sse('progress', event, event['id'])
+                if event['status'] in TERMINAL_STATES:
+                    return
+
+    headers = {'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    return Response(stream(), mimetype='text/event-stream', headers=headers)
 
-        except Exception as e:
-            return jsonify({'error': str(e)})
+@app.route('/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    job = get_job_manager().get(job_id)
+    if not job:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(public_view(job))
 
 if __name__ == '__main__':
     app.run(debug=True, port=5000)
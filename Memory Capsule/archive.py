@@ -0,0 +1,545 @@
+import os
+import re
+import sys
+import json
+import time
+import uuid
+import zlib
+import shutil
+import hashlib
+import logging
+import tarfile
+import argparse
+import datetime
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import metrics
+from catalog import ModelCatalog, scan_model, update_metadata_file
+from assets import AssetStore, folder_version
+from diary import DiaryStore, valid_date
+
+# 胶囊和日记的整体备份 / 迁移: 一个 tar (可选 gzip) 流
+#   manifest.json   格式版本、导出时间、since/until、每个胶囊的文件列表 (大小, 已入库文件的 sha256)
+#   diary.jsonl     每行一条日记 {date, content, updated_at}
+#   models/<id>/... 胶囊目录里的文件 (metadata.json、OBJ/MTL/贴图/GLB/LOD 等)
+# - 导出边读文件边生成 tar 头和数据块, 不在磁盘上暂存整个包; 模型文件在内存中最多一个 CHUNK_SIZE 的缓冲
+# - 增量导出: since 之后有变化的胶囊 (目录索引的 updated_at) 和日记 (updated_at);
+#   manifest 里的 until 是导出开始的时间, 下一次用它作为 since (导出期间的修改会在下一次再导出一遍)
+# - 导入按顺序读取流, 每个胶囊先写到 <models>/.import-<随机>/<id>, 收齐 manifest 列出的文件
+#   (并校验 sha256) 后整体改名到位; 入库去重、扫描目录等收尾工作按批在线程池中并行, 目录索引最后一次写入
+# - 删除不会被增量导出带走 (应用没有删除胶囊的接口; 日记清空后不会出现在增量包里)
+
+FORMAT = 'memory-capsule-archive'
+FORMAT_VERSION = 1
+CHUNK_SIZE = 256 * 1024
+# OBJ 文本在 1 级就能压到 ~64% (6 级 ~60%), 速度快近 3 倍; PNG/GLB 本来就压缩过
+GZIP_LEVEL = 1
+# 读取流的线程占一个核, 收尾线程用其余的核; 0 表示在读取线程中直接收尾
+# (单核机器上多一个线程只会增加 GIL 切换, 实测比直接收尾慢一半)
+IMPORT_WORKERS = min(4, (os.cpu_count() or 1) - 1)
+# 导入时每批收尾的胶囊数: 一批只提交一次入库事务
+IMPORT_BATCH = 50
+MANIFEST_NAME = 'manifest.json'
+DIARY_NAME = 'diary.jsonl'
+MODELS_PREFIX = 'models/'
+STAGING_PREFIX = '.import-'
+
+# 不导出的文件: 原始结果压缩包 (已经解压) 和写入中的临时文件
+EXCLUDED_NAMES = ('model.zip',)
+EXCLUDED_SUFFIXES = ('.tmp', '.part', '.cas')
+
+MODEL_ID_RE = re.compile(r'^[0-9A-Za-z][0-9A-Za-z_-]*$')
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_SECONDS = metrics.histogram('archive_seconds', 'Archive export and import time', ('operation',),
+                                    buckets=(0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800, 3600))
+ARCHIVE_BYTES = metrics.counter('archive_bytes_total', 'Archive bytes written by export or read by import',
+                                ('operation',))
+ARCHIVE_CAPSULES = metrics.counter('archive_capsules_total', 'Capsules exported or imported, by result',
+                                   ('operation', 'result'))
+
+
+class ArchiveError(Exception):
+    pass
+
+
+def parse_since(value):
+    # 时间戳 (秒) 或 ISO 8601 时间 (没有时区时按本地时间)
+    if value is None or value == '':
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        pass
+    try:
+        return datetime.datetime.fromisoformat(value).timestamp()
+    except (TypeError, ValueError):
+        raise ValueError(f'Invalid since: {value}')
+
+
+def _skip_file(name):
+    return name in EXCLUDED_NAMES or name.endswith(EXCLUDED_SUFFIXES)
+
+
+def _capsule_files(job_path, assets=None):
+    # [(相对路径, 绝对路径, 大小, sha256 或 None)]; 只有入库后没被替换的文件有 sha256, 不重新哈希
+    files = []
+    for root, dirs, names in os.walk(job_path):
+        dirs.sort()
+        for name in sorted(names):
+            if _skip_file(name):
+                continue
+            path = os.path.join(root, name)
+            try:
+                size = os.path.getsize(path)
+            except OSError:
+                continue
+            rel_path = os.path.relpath(path, job_path).replace('\\', '/')
+            files.append((rel_path, path, size, assets.sha256_for(path) if assets else None))
+    return files
+
+
+# --- 导出 ---
+
+def plan_export(catalog, diary, model_folder, ids=None, since=None, date_from=None, date_to=None,
+                include_models=True, include_diary=True, assets=None):
+    # 先确定要导出的内容并生成 manifest (此时还没有输出任何字节, 参数错误可以直接返回 400)
+    until = time.time()
+    capsules = []
+    files = []
+    if include_models:
+        for model in catalog.select(ids=ids, since=since, date_from=date_from, date_to=date_to):
+            job_path = os.path.join(model_folder, model['id'])
+            if not os.path.isdir(job_path):
+                continue
+            capsule_files = _capsule_files(job_path, assets)
+            capsules.append({
+                'id': model['id'],
+                'name': model['name'],
+                'date': model['date'],
+                'updated_at': model['updated_at'],
+                'files': {rel: {'size': size, 'sha256': sha256} for rel, _, size, sha256 in capsule_files},
+            })
+            files.extend((f"{MODELS_PREFIX}{model['id']}/{rel}", path) for rel, path, _, _ in capsule_files)
+    entries = diary.range(date_from, date_to, since=since) if include_diary and diary else []
+    manifest = {
+        'format': FORMAT,
+        'version': FORMAT_VERSION,
+        'created_at': until,
+        'since': since,
+        'until': until,
+        'filters': {'ids': ids, 'from': date_from, 'to': date_to},
+        'capsules': capsules,
+        'diary': {'entries': len(entries)},
+        'bytes': sum(f['size'] for c in capsules for f in c['files'].values()),
+    }
+    return {'manifest': manifest, 'files': files, 'diary': entries}
+
+
+def _tar_header(name, size, mtime):
+    info = tarfile.TarInfo(name)
+    info.size = size
+    info.mtime = int(mtime)
+    info.mode = 0o644
+    # PAX 格式: 中文文件名和超过 100 字节的路径
+    return info.tobuf(format=tarfile.PAX_FORMAT, encoding='utf-8', errors='surrogateescape')
+
+
+def _tar_blocks(plan):
+    # 依次产生 tar 的各个片段; 文件在这里才打开, 大小以打开时为准
+    until = plan['manifest']['until']
+    manifest = json.dumps(plan['manifest'], ensure_ascii=False).encode('utf-8')
+    yield _tar_header(MANIFEST_NAME, len(manifest), until)
+    yield manifest
+    yield tarfile.NUL * (-len(manifest) % tarfile.BLOCKSIZE)
+    if plan['diary']:
+        # 日记整体在内存中 (十年约几 MB), 需要先知道总大小才能写 tar 头
+        lines = b''.join(json.dumps(e, ensure_ascii=False).encode('utf-8') + b'\n' for e in plan['diary'])
+        yield _tar_header(DIARY_NAME, len(lines), until)
+        yield lines
+        yield tarfile.NUL * (-len(lines) % tarfile.BLOCKSIZE)
+    for name, path in plan['files']:
+        try:
+            f = open(path, 'rb')
+        except OSError:
+            # 导出期间被删除的文件; 导入时这个胶囊因为缺文件而跳过
+            logger.warning('archive export skipped missing file=%s', path)
+            continue
+        with f:
+            st = os.fstat(f.fileno())
+            yield _tar_header(name, st.st_size, st.st_mtime)
+            remaining = st.st_size
+            while remaining > 0:
+                chunk = f.read(min(CHUNK_SIZE, remaining))
+                if not chunk:
+                    # 文件在读取期间被截断, 用 0 补齐到头部声明的大小
+                    chunk = tarfile.NUL * min(CHUNK_SIZE, remaining)
+                remaining -= len(chunk)
+                yield chunk
+            yield tarfile.NUL * (-st.st_size % tarfile.BLOCKSIZE)
+    yield tarfile.NUL * (tarfile.BLOCKSIZE * 2)
+
+
+def _record_padded(blocks):
+    # 结尾补齐到 tar 记录大小 (10240 字节)
+    total = 0
+    for block in blocks:
+        total += len(block)
+        yield block
+    yield tarfile.NUL * (-total % tarfile.RECORDSIZE)
+
+
+def stream_export(plan, compress=False):
+    # 生成 tar (compress=True 时为 tar.gz) 的字节块; 小文件合并到 CHUNK_SIZE 再输出
+    start = time.perf_counter()
+    compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31) if compress else None
+    buffer = bytearray()
+    written = 0
+    try:
+        for block in _record_padded(_tar_blocks(plan)):
+            if compressor:
+                block = compressor.compress(block)
+            buffer += block
+            if len(buffer) >= CHUNK_SIZE:
+                written += len(buffer)
+                yield bytes(buffer)
+                buffer.clear()
+        if compressor:
+            buffer += compressor.flush()
+        written += len(buffer)
+        yield bytes(buffer)
+    finally:
+        seconds = time.perf_counter() - start
+        ARCHIVE_SECONDS.labels('export').observe(seconds)
+        ARCHIVE_BYTES.labels('export').inc(written)
+        ARCHIVE_CAPSULES.labels('export', 'exported').inc(len(plan['manifest']['capsules']))
+        logger.info('archive export capsules=%d diary=%d bytes=%d seconds=%.3f',
+                    len(plan['manifest']['capsules']), len(plan['diary']), written, seconds)
+
+
+# --- 导入 ---
+
+class _CountingReader:
+    # 统计从请求体读取的字节数
+    def __init__(self, stream):
+        self.stream = stream
+        self.bytes = 0
+
+    def read(self, size=-1):
+        data = self.stream.read(size)
+        self.bytes += len(data)
+        return data
+
+
+def _member_target(name):
+    # models/<id>/<相对路径> -> (id, [路径各段]); 拒绝绝对路径、.. 和奇怪的 id
+    if not name.startswith(MODELS_PREFIX):
+        return None, None
+    parts = name[len(MODELS_PREFIX):].split('/')
+    if len(parts) < 2 or not MODEL_ID_RE.match(parts[0]) or \
+            any(p in ('', '.', '..') or '\\' in p or '\0' in p for p in parts[1:]):
+        raise ArchiveError(f'Unsafe path in archive: {name}')
+    return parts[0], parts[1:]
+
+
+class _Importer:
+    def __init__(self, model_folder, catalog, diary, assets, on_capsule, replace, workers, static_root):
+        self.model_folder = model_folder
+        self.catalog = catalog
+        self.diary = diary
+        self.assets = assets
+        self.on_capsule = on_capsule
+        self.replace = replace
+        self.static_root = static_root
+        self.staging = os.path.join(model_folder, STAGING_PREFIX + uuid.uuid4().hex[:12])
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='import') if workers > 0 else None
+        self.models = []
+        self.futures = []
+        self.ready = []
+        self.lock = threading.Lock()
+        self.manifest = None
+        self.expected = {}
+        # active: 正在读取的胶囊; current: 正在写入的胶囊 (跳过或已经失败时为 None)
+        self.active = None
+        self.current = None
+        self.received = {}
+        self.finished = set()
+        self.result = {'imported': 0, 'skipped': 0, 'failed': 0, 'diary_entries': 0, 'files': 0,
+                       'bytes': 0, 'errors': []}
+
+    def _count(self, key, model_id=None, error=None):
+        with self.lock:
+            self.result[key] += 1
+            if error:
+                self.result['errors'].append({'id': model_id, 'error': error})
+        ARCHIVE_CAPSULES.labels('import', key).inc()
+
+    def read_manifest(self, tar, member):
+        manifest = json.load(tar.extractfile(member))
+        if manifest.get('format') != FORMAT or manifest.get('version', 0) > FORMAT_VERSION:
+            raise ArchiveError('Unsupported archive format')
+        self.manifest = manifest
+        self.expected = {c['id']: c['files'] for c in manifest.get('capsules', [])}
+
+    def read_diary(self, tar, member):
+        rows = []
+        for line in tar.extractfile(member):
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            if valid_date(entry.get('date')) and entry.get('content'):
+                rows.append((entry['date'], entry['content'], float(entry.get('updated_at') or time.time())))
+        if self.diary is not None:
+            self.diary.merge(rows)
+        self.result['diary_entries'] = len(rows)
+
+    def write_file(self, tar, member, model_id, parts):
+        if model_id != self.active:
+            self.close_capsule()
+            self.open_capsule(model_id)
+        if self.current is None:
+            return
+        rel_path = '/'.join(parts)
+        expected = self.expected[model_id].get(rel_path)
+        target = os.path.join(self.staging, model_id, *parts)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        digest = hashlib.sha256() if expected and expected.get('sha256') else None
+        src = tar.extractfile(member)
+        with open(target, 'wb') as dst:
+            while True:
+                chunk = src.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                if digest:
+                    digest.update(chunk)
+                dst.write(chunk)
+        os.utime(target, (member.mtime, member.mtime))
+        if digest and digest.hexdigest() != expected['sha256']:
+            raise ArchiveError(f'Checksum mismatch: {member.name}')
+        self.received[rel_path] = member.size
+        self.result['files'] += 1
+
+    def open_capsule(self, model_id):
+        # 同一个胶囊的文件在包里是连续的; 已有的胶囊默认跳过 (replace=True 时覆盖)
+        self.active = model_id
+        self.current = None
+        self.received = {}
+        if model_id in self.finished or model_id not in self.expected:
+            self._count('failed', model_id, 'Not listed in manifest or not contiguous')
+            self.finished.add(model_id)
+            return
+        self.finished.add(model_id)
+        if os.path.exists(os.path.join(self.model_folder, model_id)) and not self.replace:
+            self._count('skipped')
+            return
+        self.current = model_id
+
+    def close_capsule(self, error=None):
+        model_id, self.current = self.current, None
+        if model_id is None:
+            return
+        staged = os.path.join(self.staging, model_id)
+        missing = set(self.expected[model_id]) - set(self.received)
+        error = error or (f'Missing files: {", ".join(sorted(missing))}' if missing else None)
+        if error:
+            shutil.rmtree(staged, ignore_errors=True)
+            self._count('failed', model_id, error)
+            return
+        self.ready.append((model_id, staged))
+        if len(self.ready) >= IMPORT_BATCH:
+            self.flush()
+
+    def flush(self):
+        if self.ready:
+            if self.pool:
+                self.futures.append(self.pool.submit(self.finish_batch, self.ready))
+            else:
+                self.models.extend(self.finish_batch(self.ready))
+            self.ready = []
+
+    def _move_into_place(self, model_id, staged):
+        target = os.path.join(self.model_folder, model_id)
+        if os.path.exists(target):
+            old = os.path.join(self.staging, model_id + '.old')
+            os.replace(target, old)
+            os.replace(staged, target)
+            shutil.rmtree(old, ignore_errors=True)
+            if self.assets:
+                self.assets.release_folder(target)
+        else:
+            os.replace(staged, target)
+        return target
+
+    def finish_batch(self, batch):
+        # 线程池中执行: 改名到位、入库去重 (一批一个事务)、写版本号、扫描目录、应用的收尾 hook;
+        # 返回目录索引的行
+        placed = []
+        for model_id, staged in batch:
+            try:
+                placed.append((model_id, self._move_into_place(model_id, staged)))
+            except OSError as e:
+                logger.exception('archive import failed model=%s', model_id)
+                self._count('failed', model_id, str(e))
+        models = []
+        try:
+            hashes = self.assets.ingest_folders([target for _, target in placed]) if self.assets else None
+        except Exception as e:
+            logger.exception('archive import failed to ingest %d capsules', len(placed))
+            for model_id, _ in placed:
+                self._count('failed', model_id, str(e))
+            return models
+        for i, (model_id, target) in enumerate(placed):
+            try:
+                if hashes is not None:
+                    update_metadata_file(target, asset_version=folder_version(hashes[i]))
+                model = scan_model(target, model_id, self.static_root)
+            except Exception as e:
+                logger.exception('archive import failed model=%s', model_id)
+                self._count('failed', model_id, str(e))
+                continue
+            if self.on_capsule:
+                # 补充处理 (GLB、LOD 等) 失败不影响已经到位的胶囊
+                try:
+                    self.on_capsule(target)
+                except Exception:
+                    logger.exception('archive import post-processing failed model=%s', model_id)
+            if model:
+                models.append(model)
+            self._count('imported')
+        return models
+
+    def run(self, stream):
+        os.makedirs(self.staging, exist_ok=True)
+        try:
+            with tarfile.open(fileobj=stream, mode='r|*') as tar:
+                for member in tar:
+                    if self.manifest is None:
+                        if member.name != MANIFEST_NAME:
+                            raise ArchiveError('Not a Memory Capsule archive (manifest.json must come first)')
+                        self.read_manifest(tar, member)
+                    elif member.name == DIARY_NAME:
+                        self.read_diary(tar, member)
+                    elif member.isfile():
+                        try:
+                            model_id, parts = _member_target(member.name)
+                        except ArchiveError as e:
+                            self.result['errors'].append({'id': None, 'error': str(e)})
+                            continue
+                        if model_id is not None:
+                            try:
+                                self.write_file(tar, member, model_id, parts)
+                            except ArchiveError as e:
+                                self.close_capsule(str(e))
+                    # 目录、链接等其他成员忽略
+                self.close_capsule()
+                self.flush()
+            if self.manifest is None:
+                raise ArchiveError('Empty archive')
+        except (tarfile.TarError, EOFError, ValueError) as e:
+            if self.manifest is None:
+                raise ArchiveError(f'Not a Memory Capsule archive: {e}') from e
+            # 流被截断或格式错误: 已经收齐的胶囊照常导入, 当前这个丢弃
+            self.close_capsule(f'Archive truncated or corrupt: {e}')
+            self.result['errors'].append({'id': None, 'error': f'Archive truncated or corrupt: {e}'})
+        finally:
+            self.flush()
+            models = self.models + [m for f in self.futures for m in f.result()]
+            if self.pool:
+                self.pool.shutdown(wait=True)
+            shutil.rmtree(self.staging, ignore_errors=True)
+            if self.catalog is not None:
+                self.catalog.upsert_many(models)
+        return self.result
+
+
+def import_archive(stream, model_folder, catalog=None, diary=None, assets=None, on_capsule=None,
+                   replace=False, workers=IMPORT_WORKERS, static_root='static'):
+    # 从文件对象 (请求体、文件、stdin) 读取 tar / tar.gz; on_capsule(folder) 在每个胶囊到位后调用
+    start = time.perf_counter()
+    counting = _CountingReader(stream)
+    importer = _Importer(model_folder, catalog, diary, assets, on_capsule, replace, workers, static_root)
+    with metrics.span('archive.import', ARCHIVE_SECONDS.labels('import')):
+        result = importer.run(counting)
+    result['bytes'] = counting.bytes
+    result['seconds'] = round(time.perf_counter() - start, 3)
+    if importer.manifest:
+        result['until'] = importer.manifest.get('until')
+    ARCHIVE_BYTES.labels('import').inc(counting.bytes)
+    logger.info('archive import imported=%d skipped=%d failed=%d diary=%d bytes=%d seconds=%.3f',
+                result['imported'], result['skipped'], result['failed'], result['diary_entries'],
+                result['bytes'], result['seconds'])
+    return result
+
+
+if __name__ == '__main__':
+    # 本地 (直接读写 data/ 和 static/) 或经过 --url 指定的服务:
+    #   python archive.py export backup.tar.gz [--since <时间戳|ISO 时间>] [--ids a,b] [--from D] [--to D]
+    #   python archive.py import backup.tar.gz [--replace] [--workers 8]
+    # 文件名为 - 时使用 stdout / stdin
+    parser = argparse.ArgumentParser(description='导出 / 导入胶囊和日记')
+    parser.add_argument('--url', help='服务地址, 例如 http://127.0.0.1:5000; 不设置时直接操作本地数据')
+    commands = parser.add_subparsers(dest='command', required=True)
+    export_parser = commands.add_parser('export')
+    export_parser.add_argument('path')
+    export_parser.add_argument('--since')
+    export_parser.add_argument('--ids', help='逗号分隔的胶囊 id')
+    export_parser.add_argument('--from', dest='date_from')
+    export_parser.add_argument('--to', dest='date_to')
+    export_parser.add_argument('--no-models', action='store_true')
+    export_parser.add_argument('--no-diary', action='store_true')
+    export_parser.add_argument('--gzip', action='store_true', help='默认按文件名 (.gz / .tgz) 判断')
+    import_parser = commands.add_parser('import')
+    import_parser.add_argument('path')
+    import_parser.add_argument('--replace', action='store_true', help='覆盖已有的胶囊')
+    import_parser.add_argument('--workers', type=int, default=IMPORT_WORKERS)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(name)s %(message)s')
+
+    if args.command == 'export':
+        compress = args.gzip or args.path.endswith(('.gz', '.tgz'))
+        out = sys.stdout.buffer if args.path == '-' else open(args.path, 'wb')
+        with out:
+            if args.url:
+                import requests
+                params = {'since': args.since, 'ids': args.ids, 'from': args.date_from, 'to': args.date_to,
+                          'models': '0' if args.no_models else None, 'diary': '0' if args.no_diary else None,
+                          'gzip': '1' if compress else None}
+                with requests.get(args.url.rstrip('/') + '/export', params=params, stream=True) as res:
+                    if res.status_code != 200:
+                        sys.exit(f'export failed: {res.status_code} {res.text}')
+                    until = res.headers.get('X-Archive-Until')
+                    for chunk in res.iter_content(CHUNK_SIZE):
+                        out.write(chunk)
+            else:
+                models_dir = os.path.join('static', 'models')
+                plan = plan_export(ModelCatalog(os.path.join('data', 'catalog.db'), models_dir),
+                                   DiaryStore(os.path.join('data', 'diary.db')), models_dir,
+                                   ids=args.ids.split(',') if args.ids else None, since=parse_since(args.since),
+                                   date_from=args.date_from, date_to=args.date_to,
+                                   include_models=not args.no_models, include_diary=not args.no_diary,
+                                   assets=AssetStore(os.path.join('data', 'cas'), os.path.join('data', 'assets.db')))
+                until = plan['manifest']['until']
+                for chunk in stream_export(plan, compress=compress):
+                    out.write(chunk)
+        # 下一次增量导出使用 --since <until>
+        print(f'until={until}', file=sys.stderr)
+    else:
+        source = sys.stdin.buffer if args.path == '-' else open(args.path, 'rb')
+        with source:
+            if args.url:
+                import requests
+                res = requests.post(args.url.rstrip('/') + '/import', data=source,
+                                    params={'replace': '1' if args.replace else None, 'workers': args.workers},
+                                    headers={'Content-Type': 'application/x-tar'})
+                print(json.dumps(res.json(), ensure_ascii=False, indent=2))
+                sys.exit(0 if res.status_code == 200 else 1)
+            models_dir = os.path.join('static', 'models')
+            os.makedirs(models_dir, exist_ok=True)
+            result = import_archive(source, models_dir,
+                                    catalog=ModelCatalog(os.path.join('data', 'catalog.db'), models_dir),
+                                    diary=DiaryStore(os.path.join('data', 'diary.db')),
+                                    assets=AssetStore(os.path.join('data', 'cas'), os.path.join('data', 'assets.db')),
+                                    replace=args.replace, workers=args.workers)
+            print(json.dumps(result, ensure_ascii=False, indent=2))
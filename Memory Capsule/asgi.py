@@ -0,0 +1,390 @@
+import os
+import json
+import time
+import asyncio
+import logging
+from urllib.parse import parse_qs
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import aiohttp
+    from asgiref.sync import ThreadSensitiveContext
+    from asgiref.wsgi import WsgiToAsgi
+except ImportError as e:  # 异步模式是可选的, 同步的 python app.py 不需要这些依赖
+    raise ImportError("ASGI mode needs aiohttp, asgiref and an ASGI server: "
+                      "pip install aiohttp asgiref uvicorn") from e
+
+import app as app_module
+import imagegen
+import metrics
+from imagegen import ImageGenError
+from imagecache import cache_key
+from jobs import progress_event, TERMINAL_STATES
+from http_clients import CONNECT_TIMEOUT, READ_TIMEOUT, RETRIES, POOL_SIZE
+
+# 异步 (ASGI) 服务模式: uvicorn asgi:app --port 5000
+# - 图片生成 (/generate_image, /generate_images) 用 aiohttp 请求 Vector Engine,
+#   等待上游的几十秒不占线程, 单进程可以同时挂起几百个生成请求
+# - 任务进度 SSE (/jobs/<id>/events) 由事件循环推送, 每个连接只是一个 asyncio.Queue
+# - 解码保存图片、SQLite 缓存等阻塞操作放到线程池; 其余路由仍由 Flask 在线程池中处理
+# - 混元提交/轮询/下载本来就在 JobManager 的后台线程 (一个 JobPoller 线程轮询所有任务), 不占请求
+
+IO_THREADS = int(os.environ.get('ASGI_IO_THREADS', '16'))
+WSGI_THREADS = int(os.environ.get('ASGI_WSGI_THREADS', '32'))
+# 同时发往 Vector Engine 的连接上限; 超出的请求在客户端排队而不是打开新连接
+UPSTREAM_CONNECTIONS = int(os.environ.get('ASGI_UPSTREAM_CONNECTIONS', str(max(POOL_SIZE, 256))))
+
+flask_app = app_module.app
+logger = logging.getLogger('memory_capsule.asgi')
+
+
+def make_async_client(max_connections=UPSTREAM_CONNECTIONS):
+    # 与 http_clients.make_session 相同的超时; 必须在事件循环中调用
+    # (httpx 的连接池每次分配连接都要扫描全部连接, 几百个并发时 CPU 占满, 所以用 aiohttp)
+    return aiohttp.ClientSession(
+        connector=aiohttp.TCPConnector(limit=max_connections, limit_per_host=0),
+        timeout=aiohttp.ClientTimeout(total=None, sock_connect=CONNECT_TIMEOUT, sock_read=READ_TIMEOUT),
+    )
+
+
+async def post_json(client, url, payload, headers, retries=RETRIES, backoff=0.5, timeout=None):
+    # 只在连接建立失败时退避重试 (同 http_clients), 请求已发出后不会重复提交付费请求
+    # timeout 为等待响应的秒数, 不传时用 client 的默认值
+    kwargs = {'timeout': aiohttp.ClientTimeout(total=None, sock_connect=CONNECT_TIMEOUT, sock_read=timeout)} \
+        if timeout else {}
+    for attempt in range(retries + 1):
+        try:
+            async with client.post(url, json=payload, headers=headers, **kwargs) as res:
+                return res.status, await res.read()
+        except aiohttp.ClientConnectorError:
+            if attempt == retries:
+                raise
+            await asyncio.sleep(backoff * (2 ** attempt))
+
+
+class _Wsgi(WsgiToAsgi):
+    # asgiref 默认把 WSGI 调用放到同一个线程 (thread_sensitive), Flask 请求会排成一队;
+    # Flask 路由本身是线程安全的, 每个请求放在自己的 ThreadSensitiveContext 里由单独的线程执行,
+    # 同时处理的请求数 (包括读取请求体) 由信号量限制为 max_threads
+    def __init__(self, wsgi_application, max_threads=WSGI_THREADS, **kwargs):
+        super().__init__(wsgi_application, **kwargs)
+        self._slots = asyncio.Semaphore(max_threads)
+
+    async def __call__(self, scope, receive, send):
+        async with self._slots, ThreadSensitiveContext():
+            await super().__call__(scope, receive, send)
+
+
+# --- ASGI 辅助函数 ---
+
+async def read_body(receive):
+    chunks = []
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            return None
+        chunks.append(message.get('body', b''))
+        if not message.get('more_body'):
+            return b''.join(chunks)
+
+
+async def wait_disconnect(receive):
+    # 读完请求体后 receive() 只会在客户端断开时返回
+    while (await receive())['type'] != 'http.disconnect':
+        pass
+
+
+async def read_json(receive):
+    body = await read_body(receive)
+    try:
+        return json.loads(body) if body else None
+    except ValueError:
+        return None
+
+
+async def start_response(send, status=200, content_type='application/json', headers=None):
+    raw = [(b'content-type', content_type.encode('latin-1'))]
+    raw += [(k.lower().encode('latin-1'), v.encode('latin-1')) for k, v in (headers or {}).items()]
+    await send({'type': 'http.response.start', 'status': status, 'headers': raw})
+
+
+async def send_json(send, data, status=200):
+    await start_response(send, status)
+    await send({'type': 'http.response.body', 'body': json.dumps(data, ensure_ascii=False).encode('utf-8')})
+
+
+async def send_chunk(send, text):
+    await send({'type': 'http.response.body', 'body': text.encode('utf-8'), 'more_body': True})
+
+
+def request_header(scope, name):
+    name = name.lower().encode('latin-1')
+    for key, value in scope.get('headers', []):
+        if key == name:
+            return value.decode('latin-1')
+    return ''
+
+
+def query_arg(scope, name):
+    values = parse_qs(scope.get('query_string', b'').decode('latin-1')).get(name)
+    return values[0] if values else None
+
+
+STREAM_HEADERS = {'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+
+
+class AsyncApp:
+    def __init__(self, wsgi_app):
+        self.wsgi = _Wsgi(wsgi_app)
+        self.client = None
+        self.io_pool = ThreadPoolExecutor(max_workers=IO_THREADS, thread_name_prefix='asgi-io')
+        self.loop = None
+        self._generate_slots = None
+        self._subscribers = {}
+        self._started = None
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self.lifespan(receive, send)
+            return
+        if scope['type'] != 'http':
+            return
+        await self.startup()
+        method, path = scope['method'], scope['path']
+        if method == 'POST' and path == '/generate_image':
+            await self.timed(self.generate_image, path, scope, receive, send)
+        elif method == 'POST' and path == '/generate_images':
+            await self.timed(self.generate_images, path, scope, receive, send)
+        elif method == 'GET' and path.startswith('/jobs/') and path.endswith('/events') \
+                and path.count('/') == 3:
+            await self.job_events(scope, receive, send, path.split('/')[2])
+        else:
+            await self.wsgi(scope, receive, send)
+
+    async def timed(self, handler, endpoint, scope, receive, send):
+        # 与 Flask 的 after_request 相同, 记录到响应头发出为止的耗时
+        start = time.perf_counter()
+
+        async def send_timed(message):
+            if message['type'] == 'http.response.start':
+                app_module.HTTP_SECONDS.labels(endpoint, scope['method'], str(message['status'])).observe(
+                    time.perf_counter() - start)
+            await send(message)
+
+        await handler(scope, receive, send_timed)
+
+    # --- 生命周期 ---
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                try:
+                    await self.startup()
+                except Exception as e:
+                    await send({'type': 'lifespan.startup.failed', 'message': str(e)})
+                    return
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await self.shutdown()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def startup(self):
+        # 由 lifespan 调用; 服务器不支持 lifespan 时在第一个请求时调用
+        if self._started is None:
+            self._started = asyncio.ensure_future(self._startup())
+        await asyncio.shield(self._started)
+
+    async def _startup(self):
+        self.loop = asyncio.get_running_loop()
+        self.client = make_async_client()
+        self._generate_slots = asyncio.Semaphore(flask_app.config['GENERATE_CONCURRENCY'])
+        app_module._job_events.add_listener(self._on_job_event)
+        # 启动 JobManager 并恢复未完成的任务 (同步模式下由 Flask before_request 触发)
+        await self.loop.run_in_executor(self.io_pool, app_module.get_job_manager)
+
+    async def shutdown(self):
+        if self._started is None:
+            return
+        app_module._job_events.remove_listener(self._on_job_event)
+        await self.client.close()
+        await self.run_blocking(app_module.shutdown_workers)
+        self.io_pool.shutdown(wait=False)
+
+    def run_blocking(self, func, *args):
+        return self.loop.run_in_executor(self.io_pool, func, *args)
+
+    # --- 图片生成 ---
+
+    async def generate(self, prompt, api_key, n=1, cache=None):
+        # 与 imagegen.generate 相同, 只是等待上游时不占线程
+        key = cache_key(prompt, imagegen.DEFAULT_MODEL, imagegen.DEFAULT_SIZE, n)
+        if cache:
+            cached = await self.run_blocking(imagegen.cached_results, cache, key)
+            if cached:
+                return cached
+        url, payload, headers = imagegen.build_request(prompt, api_key, n, app_module.VECTOR_ENGINE_BASE_URL)
+        with metrics.api_call('vector_engine', 'images.generations', n=n):
+            try:
+                status, body = await post_json(self.client, url, payload, headers,
+                                               timeout=flask_app.config['GENERATE_TIMEOUT'])
+            except asyncio.TimeoutError:
+                raise imagegen.timeout_error(flask_app.config['GENERATE_TIMEOUT'])
+        return await self.run_blocking(self._save, status, body, prompt, key, cache)
+
+    def _save(self, status, body, prompt, key, cache):
+        # 线程池中运行: 解析几 MB 的 JSON、解码 base64 写文件、写缓存
+        response_data = imagegen.parse_response(status, lambda: json.loads(body))
+        return imagegen.save_results(response_data, flask_app.config['UPLOAD_FOLDER'], prompt, key, cache,
+                                     flask_app.config['DEBUG_PAYLOADS'])
+
+    async def generate_image(self, scope, receive, send):
+        data = await read_json(receive) or {}
+        prompt = data.get('prompt')
+        api_key = data.get('api_key') or app_module.VECTOR_ENGINE_API_KEY
+        if not prompt:
+            return await send_json(send, {'error': 'No prompt provided'})
+        if not api_key:
+            return await send_json(send, {'error': 'No API Key provided'})
+        try:
+            cache = None if data.get('no_cache') else app_module.get_image_cache()
+            images = await self.generate(prompt, api_key, cache=cache)
+            await send_json(send, dict(images[0], status='success'))
+        except ImageGenError as e:
+            result = {'error': str(e)}
+            if e.details is not None:
+                result['details'] = e.details
+            await send_json(send, result)
+        except Exception as e:
+            logger.exception('image generation failed')
+            await send_json(send, {'error': str(e)})
+
+    async def generate_batch_item(self, index, prompt, n, api_key, cache):
+        # 全局信号量与同步模式的 generate 线程池一样限制批量请求的并发数
+        async with self._generate_slots:
+            start = time.perf_counter()
+            result = {'index': index, 'prompt': prompt}
+            try:
+                result['images'] = await self.generate(prompt, api_key, n=n, cache=cache)
+                result['status'] = 'success'
+            except Exception as e:
+                result.update(status='error', error=str(e))
+            result['seconds'] = round(time.perf_counter() - start, 3)
+            return result
+
+    async def generate_images(self, scope, receive, send):
+        data = await read_json(receive) or {}
+        api_key = data.get('api_key') or app_module.VECTOR_ENGINE_API_KEY
+        if not api_key:
+            return await send_json(send, {'error': 'No API Key provided'}, 400)
+        items, error = app_module.parse_batch(data)
+        if error:
+            return await send_json(send, {'error': error}, 400)
+
+        sse = query_arg(scope, 'format') == 'sse' or 'text/event-stream' in request_header(scope, 'Accept')
+        cache = None if data.get('no_cache') else app_module.get_image_cache()
+        tasks = [asyncio.ensure_future(self.generate_batch_item(i, prompt, n, api_key, cache))
+                 for i, (prompt, n) in enumerate(items)]
+
+        def encode(event, payload):
+            if sse:
+                return f"event: {event}\ndata: {json.dumps(payload, ensure_ascii=False)}\n\n"
+            return json.dumps(payload, ensure_ascii=False) + "\n"
+
+        start = time.perf_counter()
+        succeeded = 0
+        try:
+            await start_response(send, 200, 'text/event-stream' if sse else 'application/x-ndjson', STREAM_HEADERS)
+            for task in asyncio.as_completed(tasks):
+                result = await task
+                succeeded += result['status'] == 'success'
+                await send_chunk(send, encode('result', result))
+            await send_chunk(send, encode('done', {'done': True, 'total': len(tasks), 'succeeded': succeeded,
+                                                   'failed': len(tasks) - succeeded,
+                                                   'seconds': round(time.perf_counter() - start, 3)}))
+            await send({'type': 'http.response.body', 'body': b''})
+        finally:
+            # 客户端断开时取消还没完成的请求
+            for task in tasks:
+                task.cancel()
+
+    # --- 任务进度 SSE ---
+
+    def _on_job_event(self, job_id, event):
+        # 在发布事件的 JobManager 线程中调用, 转到事件循环再分发
+        if self._subscribers.get(job_id):
+            self.loop.call_soon_threadsafe(self._dispatch, job_id, event)
+
+    def _dispatch(self, job_id, event):
+        for queue in self._subscribers.get(job_id, ()):
+            queue.put_nowait(event)
+
+    async def job_events(self, scope, receive, send, job_id):
+        # 与 app.job_events 相同的协议: retry、无历史时的当前状态快照、Last-Event-ID 补发、心跳
+        job = await self.run_blocking(app_module.get_job_manager().get, job_id)
+        if not job:
+            return await send_json(send, {'error': 'Job not found'}, 404)
+        last_id = request_header(scope, 'Last-Event-ID') or query_arg(scope, 'last_event_id') or '0'
+        sent = int(last_id) if last_id.isdigit() else 0
+        heartbeat = flask_app.config['SSE_HEARTBEAT']
+
+        queue = asyncio.Queue()
+        # 先订阅再读历史, 两者之间发布的事件按编号去重
+        self._subscribers.setdefault(job_id, set()).add(queue)
+        disconnected = asyncio.ensure_future(wait_disconnect(receive))
+        try:
+            await start_response(send, 200, 'text/event-stream', STREAM_HEADERS)
+            await send_chunk(send, "retry: 3000\n\n")
+            sent, snapshot = app_module.sse_resume_point(job, sent)
+            if snapshot:
+                await send_chunk(send, app_module.format_sse('progress', progress_event(job)))
+                if job['status'] in TERMINAL_STATES:
+                    return
+            events = app_module._job_events.since(job_id)[sent:]
+            while True:
+                for event in events:
+                    if event['id'] <= sent:
+                        continue
+                    sent = event['id']
+                    await send_chunk(send, app_module.format_sse('progress', event, event['id']))
+                    if event['status'] in TERMINAL_STATES:
+                        return
+                getter = asyncio.ensure_future(queue.get())
+                done, _ = await asyncio.wait({getter, disconnected}, timeout=heartbeat,
+                                             return_when=asyncio.FIRST_COMPLETED)
+                if disconnected in done:
+                    getter.cancel()
+                    return
+                if getter in done:
+                    events = [getter.result()]
+                    while not queue.empty():
+                        events.append(queue.get_nowait())
+                else:
+                    getter.cancel()
+                    events = []
+                    # 等待期间频道可能被淘汰, 新事件不会再到这里; 以保存的状态为准
+                    current = await self.run_blocking(app_module.get_job_manager().get, job_id)
+                    if current and current['status'] in TERMINAL_STATES:
+                        await send_chunk(send, app_module.format_sse('progress', progress_event(current)))
+                        return
+                    await send_chunk(send, ": keep-alive\n\n")
+        finally:
+            disconnected.cancel()
+            subscribers = self._subscribers.get(job_id)
+            if subscribers is not None:
+                subscribers.discard(queue)
+                if not subscribers:
+                    del self._subscribers[job_id]
+            try:
+                await send({'type': 'http.response.body', 'body': b''})
+            except Exception:
+                pass
+
+
+app = AsyncApp(flask_app)
+
+
+if __name__ == '__main__':
+    import uvicorn
+    uvicorn.run(app, host='127.0.0.1', port=5000)
@@ -0,0 +1,318 @@
+import os
+import sys
+import gzip
+import json
+import time
+import shutil
+import sqlite3
+import hashlib
+import threading
+
+try:
+    import brotli
+except ImportError:  # 没有 brotli 时只生成 gzip 预压缩文件
+    brotli = None
+
+# 内容寻址的资源存储: static/models 下的文件按 sha256 存成 blob (data/cas),
+# 任务目录里的文件是指向 blob 的硬链接, 对外的 URL 不变
+# - 相同内容的 OBJ/MTL/PNG/GLB 在磁盘上只保存一份
+# - refs 表记录每个路径引用的 blob, 引用数为 0 的 blob 由 gc() 删除
+# - inputs 表记录输入图片的 sha256 -> 已生成的模型, 重复上传时直接复用, 不再付费生成
+# - OBJ/MTL 的 blob 旁边保存预压缩的 .br/.gz 文件, 按内容哈希生成, 相同内容只压缩一次
+# 注意: 入库后的文件只能整体替换 (写临时文件再 os.replace), 不能原地修改
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS blobs (
+    sha256 TEXT PRIMARY KEY,
+    size INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS refs (
+    path TEXT PRIMARY KEY,
+    sha256 TEXT NOT NULL,
+    ino INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS refs_sha256 ON refs (sha256);
+CREATE TABLE IF NOT EXISTS inputs (
+    sha256 TEXT PRIMARY KEY,
+    model_id TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+"""
+
+# 这些文件会被原地修改, 不进入内容存储
+EXCLUDED_NAMES = ('metadata.json',)
+
+# 文本格式的模型文件压缩率高 (OBJ 约 3~4 倍); PNG/GLB 已经压缩过, 不生成预压缩文件
+COMPRESSIBLE_EXTENSIONS = ('.obj', '.mtl')
+# (Content-Encoding, 文件后缀), 按优先级排列
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+# 压缩后不小于原文件的这个比例时不保存
+MIN_COMPRESSION_RATIO = 0.9
+
+
+def file_sha256(path, chunk_size=1024 * 1024):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def folder_version(hashes):
+    # 由目录内所有文件的 sha256 得出的版本号, 任一文件变化时改变; 用在 /assets/<id>/<version>/ URL 中
+    digest = hashlib.sha256()
+    for rel_path in sorted(hashes):
+        digest.update(f"{rel_path.replace(os.sep, '/')}\0{hashes[rel_path]}\n".encode('utf-8'))
+    return digest.hexdigest()[:16]
+
+
+def precompress(blob, brotli_quality=11, gzip_level=9):
+    # 在 blob 旁边生成 .br/.gz, 已存在的跳过; 纯 CPU 计算, 在进程池中运行 (brotli 11 级压缩 4MB OBJ 约十几秒)
+    # 返回 {encoding: 压缩后字节数}
+    with open(blob, 'rb') as f:
+        data = f.read()
+    sizes = {}
+    for encoding, suffix in ENCODINGS:
+        path = blob + suffix
+        if os.path.exists(path):
+            sizes[encoding] = os.path.getsize(path)
+            continue
+        if encoding == 'br':
+            if brotli is None:
+                continue
+            compressed = brotli.compress(data, quality=brotli_quality)
+        else:
+            compressed = gzip.compress(data, gzip_level, mtime=0)
+        if len(compressed) >= len(data) * MIN_COMPRESSION_RATIO:
+            continue
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(compressed)
+        os.replace(tmp_path, path)
+        sizes[encoding] = len(compressed)
+    return sizes
+
+
+class AssetStore:
+    def __init__(self, blob_root, db_path):
+        self.blob_root = blob_root
+        self.db_path = db_path
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        os.makedirs(blob_root, exist_ok=True)
+        os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+        self._conn().executescript(SCHEMA)
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=10)
+            conn.row_factory = sqlite3.Row
+            self._local.conn = conn
+        return conn
+
+    def blob_path(self, sha256):
+        return os.path.join(self.blob_root, sha256[:2], sha256[2:4], sha256)
+
+    def encoded_path(self, sha256, encoding):
+        # 预压缩文件的路径, 还没有生成时返回 None
+        for name, suffix in ENCODINGS:
+            if name == encoding:
+                path = self.blob_path(sha256) + suffix
+                return path if os.path.exists(path) else None
+        return None
+
+    def pending_compression(self, hashes):
+        # ingest_folder 的结果中需要预压缩的 blob
+        blobs = set()
+        for rel_path, sha256 in hashes.items():
+            if rel_path.lower().endswith(COMPRESSIBLE_EXTENSIONS):
+                blob = self.blob_path(sha256)
+                if not all(os.path.exists(blob + suffix) for encoding, suffix in ENCODINGS
+                           if encoding != 'br' or brotli is not None):
+                    blobs.add(blob)
+        return sorted(blobs)
+
+    def sha256_for(self, path):
+        # 已入库且之后没有被替换的文件返回 sha256, 否则返回 None; 只读, 不重新哈希
+        path = os.path.abspath(path)
+        row = self._conn().execute("SELECT sha256, ino, mtime_ns FROM refs WHERE path = ?", (path,)).fetchone()
+        if row is None:
+            return None
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            return None
+        if row['ino'] != st.st_ino or row['mtime_ns'] != st.st_mtime_ns:
+            return None
+        return row['sha256']
+
+    # --- 资源文件 ---
+
+    def _hash_if_changed(self, path):
+        # 返回 (sha256, 是否需要入库); 文件没变化时跳过重新哈希
+        st = os.stat(path)
+        row = self._conn().execute("SELECT sha256, ino, mtime_ns FROM refs WHERE path = ?", (path,)).fetchone()
+        if row and row['ino'] == st.st_ino and row['mtime_ns'] == st.st_mtime_ns:
+            return row['sha256'], False
+        return file_sha256(path), True
+
+    def _link(self, path, sha256):
+        # 调用方持有 self._lock; 把文件换成指向 blob 的硬链接, 返回 blobs / refs 两张表的行
+        blob = self.blob_path(sha256)
+        if os.path.exists(blob):
+            if not os.path.samefile(blob, path):
+                tmp_path = path + '.cas'
+                try:
+                    os.link(blob, tmp_path)
+                    os.replace(tmp_path, path)
+                except OSError:
+                    # 不支持硬链接 (跨设备等) 时保留原文件, 只是不去重
+                    if os.path.exists(tmp_path):
+                        os.remove(tmp_path)
+        else:
+            os.makedirs(os.path.dirname(blob), exist_ok=True)
+            try:
+                os.link(path, blob)
+            except OSError:
+                shutil.copyfile(path, blob)
+        st = os.stat(path)
+        return (sha256, st.st_size), (path, sha256, st.st_ino, st.st_mtime_ns)
+
+    def _ingest(self, paths):
+        # 哈希在锁外进行; 链接和写表在锁内, 一个事务写完 (每个文件单独提交时, fsync 占了入库的大部分时间)
+        hashes = {}
+        pending = []
+        for path in paths:
+            hashes[path], changed = self._hash_if_changed(path)
+            if changed:
+                pending.append(path)
+        if pending:
+            with self._lock:
+                rows = [self._link(path, hashes[path]) for path in pending]
+                conn = self._conn()
+                with conn:
+                    conn.executemany("INSERT OR IGNORE INTO blobs (sha256, size) VALUES (?, ?)",
+                                     [blob for blob, ref in rows])
+                    conn.executemany("INSERT OR REPLACE INTO refs (path, sha256, ino, mtime_ns) VALUES (?, ?, ?, ?)",
+                                     [ref for blob, ref in rows])
+        return hashes
+
+    def ingest_file(self, path):
+        # 把文件换成指向 blob 的硬链接, 返回 sha256
+        path = os.path.abspath(path)
+        return self._ingest([path])[path]
+
+    def ingest_folder(self, folder):
+        return self.ingest_folders([folder])[0]
+
+    def ingest_folders(self, folders):
+        # 多个目录一次入库 (批量导入时使用), 返回每个目录的 {相对路径: sha256}
+        listing = []
+        for folder in folders:
+            paths = {}
+            for root, dirs, files in os.walk(folder):
+                for name in files:
+                    if name in EXCLUDED_NAMES or name.endswith(('.tmp', '.part', '.cas')):
+                        continue
+                    path = os.path.join(root, name)
+                    paths[os.path.relpath(path, folder)] = os.path.abspath(path)
+            listing.append(paths)
+        hashes = self._ingest([path for paths in listing for path in paths.values()])
+        return [{rel_path: hashes[path] for rel_path, path in paths.items()} for paths in listing]
+
+    def release_folder(self, folder):
+        # 目录被删除前调用, 去掉其中所有路径的引用
+        prefix = os.path.abspath(folder) + os.sep
+        with self._lock:
+            conn = self._conn()
+            with conn:
+                conn.execute("DELETE FROM refs WHERE substr(path, 1, ?) = ?", (len(prefix), prefix))
+
+    def gc(self):
+        # 清理失效的引用 (文件已删除或被替换), 再删除没有引用的 blob
+        conn = self._conn()
+        stale = []
+        for row in conn.execute("SELECT path, ino FROM refs").fetchall():
+            try:
+                if os.stat(row['path']).st_ino != row['ino']:
+                    stale.append(row['path'])
+            except FileNotFoundError:
+                stale.append(row['path'])
+        removed = 0
+        freed = 0
+        with self._lock:
+            with conn:
+                conn.executemany("DELETE FROM refs WHERE path = ?", [(p,) for p in stale])
+                orphans = conn.execute(
+                    "SELECT sha256, size FROM blobs WHERE sha256 NOT IN (SELECT sha256 FROM refs)").fetchall()
+                for row in orphans:
+                    blob = self.blob_path(row['sha256'])
+                    for path in [blob] + [blob + suffix for encoding, suffix in ENCODINGS]:
+                        if os.path.exists(path):
+                            os.remove(path)
+                    freed += row['size']
+                    removed += 1
+                conn.executemany("DELETE FROM blobs WHERE sha256 = ?", [(row['sha256'],) for row in orphans])
+        return {'stale_refs': len(stale), 'blobs_removed': removed, 'bytes_freed': freed}
+
+    def stats(self):
+        row = self._conn().execute(
+            "SELECT COUNT(*) AS refs, COALESCE(SUM(b.size), 0) AS logical "
+            "FROM refs r JOIN blobs b ON b.sha256 = r.sha256").fetchone()
+        blobs = self._conn().execute(
+            "SELECT COUNT(*) AS blobs, COALESCE(SUM(size), 0) AS physical FROM blobs").fetchone()
+        inputs = self._conn().execute("SELECT COUNT(*) FROM inputs").fetchone()[0]
+        logical, physical = row['logical'], blobs['physical']
+        return {
+            'files': row['refs'],
+            'blobs': blobs['blobs'],
+            'logical_bytes': logical,
+            'physical_bytes': physical,
+            'saved_bytes': logical - physical,
+            'dedup_ratio': round(logical / physical, 3) if physical else 1.0,
+            'cached_inputs': inputs,
+        }
+
+    # --- 输入图片缓存 ---
+
+    def lookup_input(self, image_sha256):
+        row = self._conn().execute("SELECT model_id FROM inputs WHERE sha256 = ?", (image_sha256,)).fetchone()
+        return row['model_id'] if row else None
+
+    def record_input(self, image_sha256, model_id):
+        with self._lock:
+            conn = self._conn()
+            with conn:
+                conn.execute("INSERT OR REPLACE INTO inputs (sha256, model_id, created_at) VALUES (?, ?, ?)",
+                             (image_sha256, model_id, time.time()))
+
+    def forget_input(self, image_sha256):
+        with self._lock:
+            conn = self._conn()
+            with conn:
+                conn.execute("DELETE FROM inputs WHERE sha256 = ?", (image_sha256,))
+
+
+if __name__ == '__main__':
+    # python assets.py ingest|gc|stats
+    # ingest 之后运行 python catalog.py rebuild, 让模型列表使用 /assets/ 版本化 URL
+    from catalog import update_metadata_file
+    store = AssetStore(os.path.join('data', 'cas'), os.path.join('data', 'assets.db'))
+    command = sys.argv[1] if len(sys.argv) > 1 else 'stats'
+    if command == 'ingest':
+        models_dir = os.path.join('static', 'models')
+        for job_id in os.listdir(models_dir):
+            job_folder = os.path.join(models_dir, job_id)
+            if os.path.isdir(job_folder) and not job_id.startswith('.'):
+                hashes = store.ingest_folder(job_folder)
+                for blob in store.pending_compression(hashes):
+                    precompress(blob)
+                update_metadata_file(job_folder, asset_version=folder_version(hashes))
+    elif command == 'gc':
+        print(json.dumps(store.gc(), indent=2))
+    print(json.dumps(store.stats(), indent=2))
@@ -0,0 +1,94 @@
+import os
+import hashlib
+import binascii
+
+# 分块的 base64 编解码, 避免整张图片在内存里多次复制
+# - 编码: readinto 复用同一个 memoryview 缓冲区, 按 3 字节对齐分块编码, 写入预分配的输出
+# - 解码: 按 4 字符对齐分块解码并直接写文件, 同时去掉空白、补齐 padding、计算 sha256
+# 结果与 base64.b64encode / b64decode 完全一致
+
+ENCODE_CHUNK = 3 * 64 * 1024
+DECODE_CHUNK = 4 * 64 * 1024
+
+_WHITESPACE = (' ', '\n', '\r', '\t')
+
+
+def _read_full(f, view):
+    # 普通文件的 readinto 也可能读不满, 分块必须是 3 的倍数才能拼接
+    total = 0
+    while total < len(view):
+        n = f.readinto(view[total:])
+        if not n:
+            break
+        total += n
+    return total
+
+
+def encode_file(path, chunk_size=ENCODE_CHUNK):
+    # 返回 str, 与 base64.b64encode(data).decode() 相同
+    if chunk_size % 3:
+        raise ValueError('chunk_size must be a multiple of 3')
+    size = os.path.getsize(path)
+    out = bytearray(4 * ((size + 2) // 3))
+    view = memoryview(bytearray(chunk_size))
+    pos = 0
+    with open(path, 'rb') as f:
+        while True:
+            n = _read_full(f, view)
+            if not n:
+                break
+            encoded = binascii.b2a_base64(view[:n], newline=False)
+            out[pos:pos + len(encoded)] = encoded
+            pos += len(encoded)
+    del out[pos:]
+    return out.decode('ascii')
+
+
+def strip_data_uri(data):
+    # "data:image/png;base64,xxxx" -> 正文开始的下标, 不复制字符串
+    if data.startswith('data:'):
+        comma = data.find(',')
+        if comma < 0:
+            raise ValueError('Malformed data URI')
+        return comma + 1
+    return 0
+
+
+def decode_to_file(data, path, chunk_size=DECODE_CHUNK):
+    # data 可以是纯 base64 或 data URI, 可以缺少 padding 或夹带换行;
+    # 先写临时文件, 成功后再替换, 返回 {'bytes', 'sha256'}
+    if chunk_size % 4:
+        raise ValueError('chunk_size must be a multiple of 4')
+    digest = hashlib.sha256()
+    total = 0
+    carry = ''
+    tmp_path = path + '.tmp'
+    try:
+        with open(tmp_path, 'wb') as f:
+            for i in range(strip_data_uri(data), len(data), chunk_size):
+                chunk = data[i:i + chunk_size]
+                if any(c in chunk for c in _WHITESPACE):
+                    chunk = ''.join(chunk.split())
+                if carry:
+                    chunk = carry + chunk
+                usable = len(chunk) - len(chunk) % 4
+                carry = chunk[usable:]
+                if usable:
+                    block = binascii.a2b_base64(chunk[:usable])
+                    digest.update(block)
+                    f.write(block)
+                    total += len(block)
+            if carry:
+                if len(carry) % 4 == 1:
+                    raise ValueError('Invalid base64 length')
+                block = binascii.a2b_base64(carry + '=' * (-len(carry) % 4))
+                digest.update(block)
+                f.write(block)
+                total += len(block)
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return {'bytes': total, 'sha256': digest.hexdigest()}
+
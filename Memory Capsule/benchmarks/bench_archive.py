@@ -0,0 +1,157 @@
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import datetime
+import tempfile
+import tracemalloc
+
+# 批量导出 / 导入: 几千个胶囊 (每个 OBJ + MTL + 贴图 + GLB + metadata.json, 约 150KB) 和十年的日记
+# - 对比: 手工复制 static/models 和数据库 (copytree)
+# - 导出: 生成 manifest 的耗时 (是否查询 sha256)、首字节时间、tar / tar.gz 吞吐、流式导出的内存峰值
+# - 增量导出: 修改 1% 的胶囊和 30 天的日记后按 since 导出
+# - 导入: 不同线程数下导入到空目录 (写文件 + sha256 校验 + 入库去重 + 一次写入目录索引)
+# 用法: python benchmarks/bench_archive.py [胶囊数量, 默认 3000] [导入线程数...]
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, APP_DIR)
+
+import archive
+from catalog import ModelCatalog, update_metadata_file
+from diary import DiaryStore
+from assets import AssetStore, folder_version
+
+
+def make_capsule(job_path, i, rng):
+    os.makedirs(job_path)
+    with open(os.path.join(job_path, 'metadata.json'), 'w', encoding='utf-8') as f:
+        json.dump({'title': f'Memory {i}', 'date': f'{2000 + i % 25}-{1 + i % 12:02d}-{1 + i % 28:02d}'}, f)
+    lines = ['mtllib material.mtl']
+    lines += [f'v {rng.uniform(-1, 1):.6f} {rng.uniform(-1, 1):.6f} {rng.uniform(-1, 1):.6f}' for _ in range(1200)]
+    lines += [f'f {rng.randint(1, 1200)} {rng.randint(1, 1200)} {rng.randint(1, 1200)}' for _ in range(800)]
+    with open(os.path.join(job_path, f'{i:032x}.obj'), 'w') as f:
+        f.write('\n'.join(lines))
+    with open(os.path.join(job_path, 'material.mtl'), 'w') as f:
+        f.write('newmtl material_0\nKd 1 1 1\nmap_Kd material_0.png\n')
+    with open(os.path.join(job_path, 'material_0.png'), 'wb') as f:
+        f.write(rng.randbytes(60 * 1024))
+    with open(os.path.join(job_path, 'model.glb'), 'wb') as f:
+        f.write(rng.randbytes(30 * 1024))
+
+
+def make_collection(root, count):
+    rng = random.Random(0)
+    models_dir = os.path.join(root, 'static', 'models')
+    os.makedirs(models_dir)
+    for i in range(count):
+        make_capsule(os.path.join(models_dir, str(1391000000000000000 + i)), i, rng)
+    assets = AssetStore(os.path.join(root, 'data', 'cas'), os.path.join(root, 'data', 'assets.db'))
+    for job_id in os.listdir(models_dir):
+        job_folder = os.path.join(models_dir, job_id)
+        update_metadata_file(job_folder, asset_version=folder_version(assets.ingest_folder(job_folder)))
+    catalog = ModelCatalog(os.path.join(root, 'data', 'catalog.db'), models_dir)
+    diary = DiaryStore(os.path.join(root, 'data', 'diary.db'))
+    start = datetime.date(2015, 1, 1)
+    diary.merge([((start + datetime.timedelta(days=d)).isoformat(), ' '.join(['今天 天气 不错'] * rng.randint(5, 60)),
+                  time.time() - 86400) for d in range(3650)])
+    return models_dir, catalog, diary, assets
+
+
+def mb(n):
+    return f"{n / 1024 / 1024:7.1f} MB"
+
+
+def export(plan, compress, out_path=None):
+    start = time.perf_counter()
+    first = None
+    total = 0
+    out = open(out_path, 'wb') if out_path else None
+    for chunk in archive.stream_export(plan, compress=compress):
+        if first is None:
+            first = time.perf_counter() - start
+        total += len(chunk)
+        if out:
+            out.write(chunk)
+    if out:
+        out.close()
+    return total, first, time.perf_counter() - start
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 3000
+    workers_list = [int(n) for n in sys.argv[2:]] or [0, 1, 4]
+    tmp = tempfile.mkdtemp()
+    try:
+        source = os.path.join(tmp, 'source')
+        start = time.perf_counter()
+        models_dir, catalog, diary, assets = make_collection(source, count)
+        size = sum(os.path.getsize(os.path.join(r, f)) for r, _, fs in os.walk(models_dir) for f in fs)
+        print(f"{count} capsules, {mb(size).strip()} of model files, 3650 diary entries "
+              f"(built in {time.perf_counter() - start:.1f} s, {os.cpu_count()} CPU)")
+
+        # 手工备份: 复制整个目录和数据库文件
+        start = time.perf_counter()
+        shutil.copytree(models_dir, os.path.join(tmp, 'copy', 'models'))
+        shutil.copy(os.path.join(source, 'data', 'diary.db'), os.path.join(tmp, 'copy'))
+        print(f"copytree static/models + diary.db        {time.perf_counter() - start:6.2f} s")
+        shutil.rmtree(os.path.join(tmp, 'copy'))
+
+        print("export:")
+        for label, store in (('manifest (no sha256)', None), ('manifest (sha256 from CAS)', assets)):
+            start = time.perf_counter()
+            plan = archive.plan_export(catalog, diary, models_dir, assets=store)
+            print(f"  {label:38} {time.perf_counter() - start:6.2f} s")
+        tar_path = os.path.join(tmp, 'backup.tar')
+        for compress, out_path in ((False, None), (False, tar_path), (True, tar_path + '.gz')):
+            total, first, seconds = export(plan, compress, out_path)
+            label = ('tar.gz' if compress else 'tar') + (' -> file' if out_path else ' -> /dev/null')
+            print(f"  {label:38} {seconds:6.2f} s  {mb(total)}  {size / seconds / 1024 / 1024:6.1f} MB/s  "
+                  f"first byte {first * 1000:5.1f} ms")
+        tracemalloc.start()
+        export(plan, False)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        print(f"  peak Python memory while streaming       {mb(peak)}")
+
+        # 增量: 1% 的胶囊改了标题, 最近 30 天的日记有修改
+        since = plan['manifest']['until']
+        time.sleep(0.01)
+        changed = catalog.select()[::100]
+        for model in changed:
+            catalog.update_metadata(model['id'], title=model['name'] + ' (edited)')
+        today = datetime.date(2024, 12, 1)
+        for d in range(30):
+            diary.put((today + datetime.timedelta(days=d)).isoformat(), 'edited')
+        start = time.perf_counter()
+        incremental = archive.plan_export(catalog, diary, models_dir, since=since, assets=assets)
+        total, first, seconds = export(incremental, False)
+        print(f"  incremental since last export          {time.perf_counter() - start:6.2f} s  {mb(total)}  "
+              f"({len(incremental['manifest']['capsules'])} capsules, {len(incremental['diary'])} diary entries)")
+
+        print("import into an empty collection (write + verify sha256 + CAS ingest + catalog):")
+        for workers in workers_list:
+            target = os.path.join(tmp, f'import_{workers}')
+            target_models = os.path.join(target, 'static', 'models')
+            os.makedirs(target_models)
+            target_catalog = ModelCatalog(os.path.join(target, 'data', 'catalog.db'), target_models)
+            with open(tar_path, 'rb') as f:
+                result = archive.import_archive(
+                    f, target_models, catalog=target_catalog,
+                    diary=DiaryStore(os.path.join(target, 'data', 'diary.db')),
+                    assets=AssetStore(os.path.join(target, 'data', 'cas'), os.path.join(target, 'data', 'assets.db')),
+                    workers=workers)
+            label = 'inline' if workers == 0 else f'{workers} threads'
+            print(f"  {label:9}: {result['seconds']:6.2f} s  {result['imported'] / result['seconds']:6.0f} capsules/s  "
+                  f"imported {result['imported']}, failed {result['failed']}, catalog {target_catalog.count()}")
+            shutil.rmtree(target)
+        with open(tar_path, 'rb') as f:
+            result = archive.import_archive(f, models_dir, catalog=catalog, diary=diary, assets=assets)
+        print(f"  same archive over the source (all skipped): {result['seconds']:6.2f} s, skipped {result['skipped']}")
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+import os
+import sys
+import time
+import shutil
+import tempfile
+
+# 模型文件传输: 示例模型的 OBJ + MTL + 贴图 (首次渲染需要的全部文件)
+# - 旧方式: /static/models/... 未压缩, 默认缓存头, 再次访问时每个文件一次条件请求 (304)
+# - 新方式: /assets/<id>/<version>/... 返回预压缩的 br/gzip, immutable 缓存, 再次访问不发请求
+# 首次渲染时间按 带宽 + RTT 估算: MTL 先加载, 之后 OBJ 和贴图并行 (与 MTLLoader/OBJLoader 的顺序一致)
+# 用法: python benchmarks/bench_assets.py [带宽 Mbit/s] [RTT ms]
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, APP_DIR)
+
+
+def fetch(client, url, headers=None):
+    start = time.perf_counter()
+    r = client.get(url, headers=headers or {})
+    data = r.data
+    return {'status': r.status_code, 'bytes': len(data), 'seconds': time.perf_counter() - start,
+            'etag': r.headers.get('ETag'), 'encoding': r.headers.get('Content-Encoding'),
+            'cache_control': r.headers.get('Cache-Control')}
+
+
+def model_files(client, model, versioned):
+    # 返回 (MTL, [OBJ, 贴图...]) 的 URL
+    obj_url, mtl_url = model['obj_url'], model['mtl_url']
+    if not versioned:
+        # /assets/<id>/<version>/<文件> -> /static/models/<id>/<文件>
+        obj_url, mtl_url = (f"/static/models/{model['id']}/{url.split('/', 4)[4]}" for url in (obj_url, mtl_url))
+    mtl = client.get(mtl_url).get_data(as_text=True)
+    base = mtl_url.rsplit('/', 1)[0]
+    textures = [f"{base}/{line.split()[-1]}" for line in mtl.splitlines() if line.strip().startswith('map_')]
+    return mtl_url, [obj_url] + textures
+
+
+def first_render(client, model, versioned, bandwidth, rtt, accept):
+    mtl_url, rest = model_files(client, model, versioned)
+    headers = {'Accept-Encoding': accept} if accept else {}
+    mtl = fetch(client, mtl_url, headers)
+    others = [fetch(client, url, headers) for url in rest]
+    total = mtl['bytes'] + sum(o['bytes'] for o in others)
+    # 连接共享带宽: MTL 之后并行下载, 耗时取决于总字节数
+    modelled = 2 * rtt + total * 8 / bandwidth + mtl['seconds'] + max(o['seconds'] for o in others)
+    return total, modelled, [mtl] + others
+
+
+def repeat_visit(client, model, versioned, first, rtt):
+    # 旧方式浏览器用 ETag 逐个重新验证; immutable 资源直接用缓存, 不发请求
+    mtl_url, rest = model_files(client, model, versioned)
+    requests = 0
+    transferred = 0
+    for url, previous in zip([mtl_url] + rest, first):
+        if previous['cache_control'] and 'immutable' in previous['cache_control']:
+            continue
+        r = fetch(client, url, {'If-None-Match': previous['etag']} if previous['etag'] else {})
+        requests += 1
+        transferred += r['bytes']
+    return requests, transferred, (2 * rtt if requests else 0.0)
+
+
+def main():
+    bandwidth = float(sys.argv[1]) * 1e6 if len(sys.argv) > 1 else 20e6
+    rtt = float(sys.argv[2]) / 1000 if len(sys.argv) > 2 else 0.05
+    tmp = tempfile.mkdtemp()
+    try:
+        shutil.copytree(os.path.join(APP_DIR, 'static', 'models'), os.path.join(tmp, 'static', 'models'))
+        os.chdir(tmp)
+        os.environ.setdefault('HUNYUAN_STUB', '1')
+        import app as app_module
+        from assets import precompress
+        from catalog import update_metadata_file, read_metadata
+
+        assets = app_module.get_assets()
+        start = time.perf_counter()
+        for job_id in os.listdir(app_module.app.config['MODEL_FOLDER']):
+            job_folder = os.path.join(app_module.app.config['MODEL_FOLDER'], job_id)
+            hashes = assets.ingest_folder(job_folder)
+            update_metadata_file(job_folder, asset_version=app_module.folder_version(hashes))
+            for blob in assets.pending_compression(hashes):
+                precompress(blob)
+        print(f"ingest + precompress: {time.perf_counter() - start:.1f} s")
+        catalog = app_module.get_catalog()
+        catalog.rebuild()
+        client = app_module.app.test_client()
+        models = client.get('/list_models').json['models']
+
+        print(f"link {bandwidth / 1e6:.0f} Mbit/s, RTT {rtt * 1000:.0f} ms")
+        for model in models:
+            version = read_metadata(os.path.join('static', 'models', model['id']))['asset_version']
+            print(f"model {model['id']} ({model['name']}), version {version}")
+            for label, versioned, accept in (('static', False, 'gzip, deflate, br'),
+                                             ('assets gzip', True, 'gzip, deflate'),
+                                             ('assets br', True, 'gzip, deflate, br')):
+                total, modelled, first = first_render(client, model, versioned, bandwidth, rtt, accept)
+                requests, transferred, revalidate = repeat_visit(client, model, versioned, first, rtt)
+                encodings = '/'.join(sorted({f['encoding'] or 'identity' for f in first}))
+                print(f"  {label:12} first visit {total / 1024 / 1024:6.2f} MB ({encodings:14}) "
+                      f"~{modelled:5.2f} s to first render | repeat visit {requests} requests, "
+                      f"{transferred} bytes, ~{revalidate * 1000:.0f} ms")
+        r = client.get(models[0]['obj_url'], headers={'Range': 'bytes=0-1023'})
+        print(f"Range bytes=0-1023: {r.status_code} {r.headers.get('Content-Range')}")
+        app_module.shutdown_workers()
+    finally:
+        os.chdir(APP_DIR)
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+import os
+import sys
+import json
+import time
+import base64
+import tempfile
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+# base64 编解码的内存峰值 (tracemalloc): 一批并发的图片生成 / 上传
+# - 解码: 旧版 generate_image 的做法 (浅拷贝调试输出、拼 data URI、多次 replace、补 padding、b64decode)
+#   对比 b64stream.decode_to_file
+# - 编码: 旧版 get_image_base64 (read + b64encode + decode) 对比 b64stream.encode_file
+# 用法: python benchmarks/bench_base64.py [并发数]
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, APP_DIR)
+
+from b64stream import encode_file, decode_to_file
+
+SAMPLE_IMAGE = os.path.join(APP_DIR, 'static', 'uploads', 'gen_1765683303.png')
+
+
+def legacy_decode(response_data, file_path):
+    debug_data = response_data.copy()
+    debug_items = [dict(item) for item in debug_data['data']]
+    for item in debug_items:
+        item['b64_json'] = item['b64_json'][:50] + "..."
+    json.dumps(dict(debug_data, data=debug_items), indent=2)
+    b64_data = response_data['data'][0]['b64_json']
+    image_url = f"data:image/png;base64,{b64_data}"
+    header, encoded = image_url.split(",", 1)
+    encoded = encoded.strip().replace("\n", "").replace("\r", "").replace(" ", "")
+    missing_padding = len(encoded) % 4
+    if missing_padding:
+        encoded += '=' * (4 - missing_padding)
+    img_data = base64.b64decode(encoded)
+    with open(file_path, 'wb') as f:
+        f.write(img_data)
+
+
+def streaming_decode(response_data, file_path):
+    decode_to_file(response_data['data'][0]['b64_json'], file_path)
+
+
+def legacy_encode(file_path):
+    with open(file_path, "rb") as image_file:
+        return base64.b64encode(image_file.read()).decode('utf-8')
+
+
+def measure(label, fn, args_list, workers):
+    tracemalloc.start()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        list(pool.map(lambda args: fn(*args), args_list))
+    seconds = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"  {label:<32} peak {peak / 1e6:8.1f} MB   {seconds * 1000:7.0f} ms")
+    return peak
+
+
+def main():
+    workers = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+    size = os.path.getsize(SAMPLE_IMAGE)
+    encoded = legacy_encode(SAMPLE_IMAGE)
+    with tempfile.TemporaryDirectory() as tmp:
+        # 每个请求各自的响应对象, 模拟并发生成 (解析 JSON 的开销两边相同, 不计入)
+        responses = [json.loads(json.dumps({'data': [{'b64_json': encoded}]})) for _ in range(workers)]
+        print(f"decode: {workers} concurrent generations of a {size / 1e6:.1f} MB PNG")
+        before = measure('legacy generate_image (before)', legacy_decode,
+                         [(r, os.path.join(tmp, f'legacy_{i}.png')) for i, r in enumerate(responses)], workers)
+        after = measure('decode_to_file (after)', streaming_decode,
+                        [(r, os.path.join(tmp, f'stream_{i}.png')) for i, r in enumerate(responses)], workers)
+        print(f"  peak reduced {before / after:.1f}x")
+        with open(SAMPLE_IMAGE, 'rb') as f:
+            original = f.read()
+        for i in range(workers):
+            with open(os.path.join(tmp, f'stream_{i}.png'), 'rb') as f:
+                assert f.read() == original
+        del responses
+
+        print(f"encode: {workers} concurrent uploads")
+        before = measure('get_image_base64 (before)', legacy_encode, [(SAMPLE_IMAGE,)] * workers, workers)
+        after = measure('encode_file (after)', encode_file, [(SAMPLE_IMAGE,)] * workers, workers)
+        print(f"  peak reduced {before / after:.1f}x")
+        assert encode_file(SAMPLE_IMAGE) == encoded
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,115 @@
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import tempfile
+import datetime
+
+# 日记读取: 10 年每天一篇
+# - 旧实现: static/diaries/<date>.json, 日历每显示一天发一次 /diary?date= 请求 (一个月 ~30 次)
+# - 新实现: DiaryStore (SQLite + FTS5), /diary?from=&to= 一次范围查询, ?q= 全文搜索
+# 用法: python benchmarks/bench_diary.py [年数]
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, APP_DIR)
+
+from diary import DiaryStore
+
+WORDS = ('today', 'beach', 'sunset', 'birthday', 'gift', 'rain', 'coffee', 'train', 'mountain', 'friend',
+         '海边', '日落', '生日', '礼物', '下雨', '咖啡', '火车', '爬山', '朋友', '小狐狸')
+
+
+def make_legacy(folder, years):
+    rng = random.Random(0)
+    day = datetime.date(2016, 1, 1)
+    dates = []
+    for _ in range(int(365.25 * years)):
+        date = day.isoformat()
+        content = ' '.join(rng.choice(WORDS) for _ in range(rng.randint(20, 120)))
+        with open(os.path.join(folder, f'{date}.json'), 'w', encoding='utf-8') as f:
+            json.dump({'date': date, 'content': content, 'updated_at': time.time()}, f)
+        dates.append(date)
+        day += datetime.timedelta(days=1)
+    return dates
+
+
+def legacy_get(folder, date):
+    file_path = os.path.join(folder, f"{date}.json")
+    if os.path.exists(file_path):
+        with open(file_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    return {'date': date, 'content': ''}
+
+
+def legacy_search(folder, query):
+    hits = []
+    for name in os.listdir(folder):
+        with open(os.path.join(folder, name), 'r', encoding='utf-8') as f:
+            entry = json.load(f)
+        if query in entry['content']:
+            hits.append(entry['date'])
+    return hits
+
+
+def timed(fn, repeat=20):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000, result
+
+
+def main():
+    years = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    tmp = tempfile.mkdtemp()
+    try:
+        legacy_folder = os.path.join(tmp, 'diaries')
+        os.makedirs(legacy_folder)
+        dates = make_legacy(legacy_folder, years)
+        month = [d for d in dates if d.startswith('2021-03')]
+        year = [d for d in dates if d.startswith('2021')]
+        print(f"{len(dates)} entries over {years} years")
+
+        start = time.perf_counter()
+        store = DiaryStore(os.path.join(tmp, 'diary.db'), legacy_folder)
+        print(f"  migration of per-day files      {(time.perf_counter() - start) * 1000:8.1f} ms")
+
+        rows = []
+        ms, _ = timed(lambda: [legacy_get(legacy_folder, d) for d in month])
+        rows.append(('month view, 31 file reads (before)', ms, len(month)))
+        ms, result = timed(lambda: store.range(month[0], month[-1]))
+        rows.append(('month view, 1 range query (after)', ms, len(result)))
+        ms, _ = timed(lambda: [legacy_get(legacy_folder, d) for d in year], repeat=5)
+        rows.append(('year, 365 file reads (before)', ms, len(year)))
+        ms, result = timed(lambda: store.range(year[0], year[-1]))
+        rows.append(('year, 1 range query (after)', ms, len(result)))
+        ms, result = timed(lambda: legacy_search(legacy_folder, '小狐狸 gift'), repeat=3)
+        rows.append(("search, scan all files (before)", ms, len(result)))
+        ms, result = timed(lambda: store.search('小狐狸 gift', limit=10000))
+        rows.append(("search, FTS5 trigram (after)", ms, len(result)))
+        for label, ms, count in rows:
+            print(f"  {label:<36} {ms:8.2f} ms  {count:5d} entries")
+
+        # HTTP 往返: 日历显示一个月的请求数和总耗时
+        os.chdir(tmp)
+        import app as app_module
+        app_module.app.config['DIARY_DB'] = os.path.join(tmp, 'diary.db')
+        app_module.app.config['DIARY_FOLDER'] = legacy_folder
+        app_module._diary = store
+        client = app_module.app.test_client()
+        client.get('/diary?date=2021-03-01')
+        ms, _ = timed(lambda: [client.get(f'/diary?date={d}') for d in month], repeat=5)
+        print(f"  {'month, 31 GET /diary?date= (before)':<36} {ms:8.2f} ms")
+        ms, _ = timed(lambda: client.get(f'/diary?from={month[0]}&to={month[-1]}'), repeat=5)
+        print(f"  {'month, 1 GET /diary?from=&to= (after)':<36} {ms:8.2f} ms")
+        app_module.get_job_manager().shutdown(wait=False)
+    finally:
+        os.chdir(APP_DIR)
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+import os
+import sys
+import time
+import shutil
+import zipfile
+import tempfile
+import tracemalloc
+
+# 结果压缩包下载 + 解压: 对本地 HTTP 服务器上的示例 model.zip
+# 对比旧实现 (requests.get 全量缓冲 + extractall) 与流式实现 (含断点续传)
+# 用法: python benchmarks/bench_fetch.py
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, APP_DIR)
+
+import requests
+
+from fetch import stream_download, safe_extract, FetchError
+from stubs import FileServer
+
+SAMPLE = os.path.join(APP_DIR, 'static', 'models', '1391423262294409216', 'model.zip')
+
+
+def legacy(url, folder):
+    zip_path = os.path.join(folder, 'model.zip')
+    r = requests.get(url)
+    with open(zip_path, 'wb') as f:
+        f.write(r.content)
+    with zipfile.ZipFile(zip_path, 'r') as zip_ref:
+        zip_ref.extractall(folder)
+
+
+def streaming(url, folder):
+    zip_path = os.path.join(folder, 'model.zip')
+    download = stream_download(url, zip_path)
+    safe_extract(zip_path, folder)
+    os.remove(zip_path)
+    return download
+
+
+def run(name, fn, url):
+    folder = tempfile.mkdtemp(prefix='bench_fetch_')
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = fn(url, folder)
+    seconds = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    disk = sum(os.path.getsize(os.path.join(folder, f)) for f in os.listdir(folder))
+    print(f"{name:<26}{seconds * 1000:>10.0f}{peak / 1024 / 1024:>12.1f}{disk / 1024 / 1024:>12.1f}")
+    shutil.rmtree(folder)
+    return result
+
+
+def main():
+    root = tempfile.mkdtemp(prefix='bench_fetch_root_')
+    shutil.copy(SAMPLE, os.path.join(root, 'model.zip'))
+    with zipfile.ZipFile(os.path.join(root, 'evil.zip'), 'w') as z:
+        z.writestr('../escape.txt', 'nope')
+
+    print(f"{'case':<26}{'ms':>10}{'peak MB':>12}{'disk MB':>12}")
+    with FileServer(root) as server:
+        run('before: buffered', legacy, server.url('model.zip'))
+        run('after: streaming', streaming, server.url('model.zip'))
+
+    with FileServer(root, drop_after=1024 * 1024, drop_count=2) as server:
+        result = run('after: 2 drops + resume', streaming, server.url('model.zip'))
+        print(f"resumes={result['resumes']} ranges={[r for _, r in server.requests]}")
+
+    with FileServer(root) as server:
+        folder = tempfile.mkdtemp()
+        zip_path = os.path.join(folder, 'evil.zip')
+        stream_download(server.url('evil.zip'), zip_path)
+        try:
+            safe_extract(zip_path, folder)
+            print('zip slip: NOT rejected')
+        except FetchError as e:
+            print(f'zip slip rejected: {e}')
+        try:
+            stream_download(server.url('model.zip'), os.path.join(folder, 'x.zip'), expected_sha256='0' * 64)
+        except FetchError as e:
+            print(f'checksum: {str(e)[:40]}...')
+        shutil.rmtree(folder)
+    shutil.rmtree(root)
+
+
+if __name__ == '__main__':
+    main()
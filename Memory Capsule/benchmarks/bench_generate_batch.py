@@ -0,0 +1,78 @@
+import os
+import sys
+import json
+import time
+import shutil
+import tempfile
+
+# 批量图片生成: 对本地 Vector Engine stub (注入 0.2~0.6s 延迟, 每 5 个请求失败一次)
+# - 旧方式: 客户端逐个调用 /generate_image
+# - 新方式: 一次 /generate_images, 服务端有上限地并发请求, 每完成一项推送一行 NDJSON
+# 用法: python benchmarks/bench_generate_batch.py [prompt 数]
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, APP_DIR)
+
+from stubs import VectorEngineStub
+
+SAMPLE_IMAGE = os.path.join(APP_DIR, 'static', 'uploads', 'gen_1765683303.png')
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 12
+    prompts = [f'memory capsule {i}' for i in range(count)]
+    tmp = tempfile.mkdtemp()
+    try:
+        os.chdir(tmp)
+        os.environ.setdefault('HUNYUAN_STUB', '1')
+        import app as app_module
+        app = app_module.app
+        client = app.test_client()
+
+        with VectorEngineStub(SAMPLE_IMAGE, latency=(0.2, 0.6), fail_every=5) as stub:
+            app_module.VECTOR_ENGINE_BASE_URL = stub.base_url
+
+            start = time.perf_counter()
+            serial_ok = 0
+            for prompt in prompts:
+                r = client.post('/generate_image', json={'prompt': prompt, 'api_key': 'test'})
+                serial_ok += r.json.get('status') == 'success'
+            serial = time.perf_counter() - start
+            print(f"serial /generate_image x{count}:   {serial:6.2f} s  ({serial_ok} ok)")
+
+            stub.requests = 0
+            stub.max_in_flight = 0
+            start = time.perf_counter()
+            r = client.post('/generate_images', json={'prompts': prompts, 'api_key': 'test'}, buffered=False)
+            first = None
+            lines = []
+            for chunk in r.response:
+                for line in chunk.decode('utf-8').splitlines():
+                    if line.strip():
+                        first = first or time.perf_counter() - start
+                        lines.append(json.loads(line))
+            batch = time.perf_counter() - start
+            summary = lines[-1]
+            order = [line['index'] for line in lines[:-1]]
+            print(f"batch /generate_images x{count}:  {batch:6.2f} s  ({summary['succeeded']} ok, "
+                  f"{summary['failed']} failed)  first result after {first:.2f} s")
+            print(f"  concurrency limit {app.config['GENERATE_CONCURRENCY']}, "
+                  f"max in flight at stub {stub.max_in_flight}, completion order {order}")
+            errors = [line['error'] for line in lines[:-1] if line['status'] == 'error']
+            print(f"  errors: {errors[:2]}")
+
+            r = client.post('/generate_images?format=sse',
+                            json={'prompts': [{'prompt': 'two candidates', 'n': 2}], 'api_key': 'test'})
+            events = []
+            for block in r.get_data(as_text=True).strip().split('\n\n'):
+                event, data = block.split('\n', 1)
+                events.append((event[len('event: '):], json.loads(data[len('data: '):])))
+            print(f"  SSE with n=2: events {[e for e, _ in events]}, {len(events[0][1]['images'])} images")
+        app_module.get_job_manager().shutdown(wait=False)
+    finally:
+        os.chdir(APP_DIR)
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,122 @@
+import os
+import sys
+import ssl
+import json
+import time
+import tempfile
+import subprocess
+import http.client
+import statistics
+
+# 图片生成请求的单次延迟: 对本地 HTTPS stub 对比
+# - 旧实现: 每次请求新建 http.client.HTTPSConnection (每次都做 TCP + TLS 握手)
+# - 新实现: 共享 requests.Session, keep-alive 复用连接
+# 另外对比每次上传都新建 CommonClient 与懒加载单例的构造开销
+# 用法: python benchmarks/bench_http.py [次数]  (需要 openssl 命令生成自签名证书)
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, APP_DIR)
+
+from http_clients import make_session
+from stubs import VectorEngineStub
+
+SAMPLE_IMAGE = os.path.join(APP_DIR, 'static', 'uploads', 'gen_1765683303.png')
+PAYLOAD = {"size": "1024x1024", "prompt": "a red fox", "model": "gpt-image-1", "n": 1,
+           "response_format": "b64_json"}
+
+
+def make_cert(folder):
+    key = os.path.join(folder, 'key.pem')
+    cert = os.path.join(folder, 'cert.pem')
+    subprocess.run(['openssl', 'req', '-x509', '-newkey', 'rsa:2048', '-nodes', '-keyout', key,
+                    '-out', cert, '-days', '1', '-subj', '/CN=127.0.0.1',
+                    '-addext', 'subjectAltName=IP:127.0.0.1'],
+                   check=True, capture_output=True)
+    bundle = os.path.join(folder, 'bundle.pem')
+    with open(bundle, 'w') as f:
+        f.write(open(cert).read() + open(key).read())
+    return cert, bundle
+
+
+def legacy_call(port, context):
+    # 与旧版 generate_image 相同: 每次新建连接, 用完也不关闭
+    conn = http.client.HTTPSConnection('127.0.0.1', port, context=context)
+    conn.request('POST', '/v1/images/generations', json.dumps(PAYLOAD),
+                 {'Accept': 'application/json', 'Content-Type': 'application/json'})
+    return json.loads(conn.getresponse().read().decode('utf-8'))
+
+
+def pooled_call(session, base_url):
+    return session.post(f'{base_url}/v1/images/generations', json=PAYLOAD,
+                        headers={'Accept': 'application/json'}).json()
+
+
+def measure(fn, n):
+    times = []
+    for _ in range(n):
+        start = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - start) * 1000)
+    times.sort()
+    return {'mean_ms': statistics.mean(times), 'p50_ms': times[len(times) // 2],
+            'p95_ms': times[int(len(times) * 0.95) - 1]}
+
+
+def report(label, result, connections=None):
+    line = f"  {label:<34} mean {result['mean_ms']:7.2f} ms  p50 {result['p50_ms']:7.2f}  p95 {result['p95_ms']:7.2f}"
+    if connections is not None:
+        line += f"  connections {connections}"
+    print(line)
+
+
+def bench_sdk_client(n):
+    from tencentcloud.common import credential
+    from tencentcloud.common.profile.client_profile import ClientProfile
+    from tencentcloud.common.profile.http_profile import HttpProfile
+    from tencentcloud.common.common_client import CommonClient
+
+    def build():
+        cred = credential.Credential('id', 'key')
+        http_profile = HttpProfile()
+        http_profile.endpoint = "hunyuan.tencentcloudapi.com"
+        profile = ClientProfile()
+        profile.httpProfile = http_profile
+        return CommonClient("hunyuan", "2023-09-01", cred, "ap-guangzhou", profile)
+
+    singleton = build()
+    print("CommonClient per upload:")
+    report('new client each time (before)', measure(build, n))
+    report('lazy singleton (after)', measure(lambda: singleton, n))
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    with tempfile.TemporaryDirectory() as tmp:
+        cert, bundle = make_cert(tmp)
+        context = ssl.create_default_context(cafile=cert)
+        small_image = os.path.join(tmp, 'small.png')
+        with open(small_image, 'wb') as f:
+            f.write(os.urandom(1024))
+
+        for label, image in (('1 KB image', small_image),
+                             (f'{os.path.getsize(SAMPLE_IMAGE) // 1024} KB image', SAMPLE_IMAGE)):
+            print(f"POST /v1/images/generations over HTTPS, {label}, {n} calls:")
+            with VectorEngineStub(image, certfile=bundle) as stub:
+                report('new HTTPSConnection (before)', measure(lambda: legacy_call(stub.port, context), n),
+                       stub.connections)
+            with VectorEngineStub(image, certfile=bundle) as stub:
+                session = make_session()
+                session.verify = cert
+                session.trust_env = False  # 否则 REQUESTS_CA_BUNDLE 等环境变量会覆盖 verify
+                report('pooled Session (after)', measure(lambda: pooled_call(session, stub.base_url), n),
+                       stub.connections)
+                session.close()
+
+    try:
+        bench_sdk_client(max(n, 1000))
+    except ImportError:
+        print("tencentcloud SDK not installed, skipping CommonClient benchmark")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,156 @@
+import io
+import os
+import sys
+import time
+import shutil
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from PIL import Image
+
+# 上传图片预处理: 用合成的大图 (手机照片带 EXIF 方向和 GPS、单反照片、4K 截图、带透明通道的 PNG) 对比
+# - 旧方式: 原图直接 base64 提交
+# - 新方式: uploads.prepare 转正方向、长边缩到 1024、重新编码、去掉 EXIF 后再 base64
+# 另外测试线程池并发预处理的吞吐, 以及经过 /upload 的完整流程 (HUNYUAN_STUB) 和超大上传的 413
+# 用法: python benchmarks/bench_ingest.py [线程数...]
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, APP_DIR)
+
+import uploads
+from b64stream import encode_file
+
+ORIENTATION = 0x0112
+GPS_IFD = 0x8825
+
+
+def photo(width, height, seed):
+    # 平滑渐变 + 噪声, 压缩率接近真实照片 (纯噪声太难压, 纯渐变太容易)
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0:height, 0:width].astype(np.float32)
+    base = np.stack([x / width * 255, y / height * 255, (x + y) / (width + height) * 255], axis=-1)
+    noise = rng.normal(0, 12, size=(height, width, 3)).astype(np.float32)
+    return Image.fromarray(np.clip(base + noise, 0, 255).astype(np.uint8), 'RGB')
+
+
+def make_images(folder):
+    images = {}
+    exif = Image.Exif()
+    exif[ORIENTATION] = 6  # 顺时针转 90 度显示, 横向存储的竖拍照片
+    exif[GPS_IFD] = {1: 'N', 2: (31.0, 14.0, 2.5), 3: 'E', 4: (121.0, 28.0, 9.1)}
+    path = os.path.join(folder, 'phone_12mp.jpg')
+    photo(4032, 3024, 1).save(path, quality=95, exif=exif.tobytes())
+    images['phone 12MP JPEG (EXIF rotate, GPS)'] = path
+
+    path = os.path.join(folder, 'camera_24mp.jpg')
+    photo(6000, 4000, 2).save(path, quality=95)
+    images['camera 24MP JPEG'] = path
+
+    path = os.path.join(folder, 'screenshot_4k.png')
+    photo(3840, 2160, 3).save(path)
+    images['screenshot 4K PNG'] = path
+
+    path = os.path.join(folder, 'cutout_rgba.png')
+    image = photo(3000, 3000, 4).convert('RGBA')
+    mask = Image.new('L', image.size, 0)
+    mask.paste(255, (500, 500, 2500, 2500))
+    image.putalpha(mask)
+    image.save(path)
+    images['cutout 9MP RGBA PNG'] = path
+    return images
+
+
+def mb(n):
+    return f"{n / 1024 / 1024:6.2f} MB"
+
+
+def compare(images, out_folder):
+    for label, path in images.items():
+        start = time.perf_counter()
+        raw_b64 = len(encode_file(path))
+        raw_seconds = time.perf_counter() - start
+
+        result = uploads.prepare(path, out_folder)
+        start = time.perf_counter()
+        prepared_b64 = len(encode_file(result['path']))
+        prepared_seconds = time.perf_counter() - start
+        with Image.open(result['path']) as img:
+            exif_tags = len(img.getexif())
+        s = result['seconds']
+        print(f"{label}")
+        print(f"  source   {result['source_size'][0]}x{result['source_size'][1]} {mb(result['source_bytes'])} "
+              f"-> base64 {mb(raw_b64)} in {raw_seconds * 1000:5.0f} ms")
+        print(f"  prepared {result['size'][0]}x{result['size'][1]} {result['format']:4} {mb(result['bytes'])} "
+              f"-> base64 {mb(prepared_b64)} in {prepared_seconds * 1000:5.0f} ms "
+              f"({(1 - prepared_b64 / raw_b64) * 100:4.1f}% smaller request), EXIF tags {exif_tags}")
+        print(f"  prepare  decode {s['decode'] * 1000:5.0f} ms, orient+resize {s['resize'] * 1000:5.0f} ms, "
+              f"encode {s['encode'] * 1000:5.0f} ms, hash {s['hash'] * 1000:4.0f} ms, total {s['total'] * 1000:5.0f} ms")
+
+
+def throughput(path, out_folder, workers_list, count=8):
+    # 任务 worker 线程池中并发预处理; Pillow 解码/缩放/编码时释放 GIL
+    for workers in workers_list:
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            list(pool.map(lambda _: uploads.prepare(path, out_folder), range(count)))
+        elapsed = time.perf_counter() - start
+        print(f"  {workers} threads: {count} x 12MP in {elapsed:5.2f} s ({count / elapsed:4.1f} images/s)")
+
+
+def end_to_end(path, tmp):
+    # 经过 /upload -> 任务 (PREPARING -> SUBMITTED ...) 的完整流程, 上游使用 HUNYUAN_STUB
+    os.chdir(tmp)
+    os.environ.setdefault('HUNYUAN_STUB', '1')
+    import app as app_module
+    client = app_module.app.test_client()
+    with open(path, 'rb') as f:
+        data = f.read()
+    start = time.perf_counter()
+    r = client.post('/upload', data={'file': (io.BytesIO(data), 'IMG_0001.JPG'), 'title': 'bench'},
+                    content_type='multipart/form-data')
+    response_seconds = time.perf_counter() - start
+    status_url = r.json['status_url']
+    while True:
+        job = client.get(status_url).json
+        if job['status'] in ('DONE', 'FAILED') or job['status'] in ('SUBMITTED', 'RUNNING') and 'ingest' in job:
+            break
+        time.sleep(0.05)
+    ingest = job['ingest']
+    print(f"  /upload responded in {response_seconds * 1000:.0f} ms (receive {ingest['upload']['seconds'] * 1000:.0f} ms), "
+          f"job {job['status']}, PREPARING -> SUBMITTED in "
+          f"{(job['timings']['SUBMITTED'] - job['timings']['PREPARING']) * 1000:.0f} ms")
+    print(f"  ingest: {ingest['source_size']} {mb(ingest['source_bytes']).strip()} -> {ingest['size']} "
+          f"{mb(ingest['bytes']).strip()}, prepare {ingest['seconds']['total'] * 1000:.0f} ms")
+    print(f"  raw upload left in incoming folder: {os.listdir(app_module.app.config['INCOMING_FOLDER'])}")
+
+    app_module.app.config['UPLOAD_MAX_BYTES'] = 1024 * 1024
+    r = client.post('/upload', data={'file': (io.BytesIO(data), 'big.jpg')}, content_type='multipart/form-data')
+    print(f"  upload over UPLOAD_MAX_BYTES: {r.status_code} {r.json['error']}")
+    r = client.post('/upload', data={'file': (io.BytesIO(b'not an image'), 'x.jpg')},
+                    content_type='multipart/form-data')
+    print(f"  non-image upload: {r.status_code} {r.json['error']}")
+    print(f"  /uploads/stats: {client.get('/uploads/stats').json}")
+    app_module.shutdown_workers()
+
+
+def main():
+    workers_list = [int(n) for n in sys.argv[1:]] or [1, 4]
+    tmp = tempfile.mkdtemp()
+    try:
+        source_folder = os.path.join(tmp, 'source')
+        out_folder = os.path.join(tmp, 'out')
+        os.makedirs(source_folder)
+        images = make_images(source_folder)
+        compare(images, out_folder)
+        print(f"throughput ({os.cpu_count()} CPU):")
+        throughput(images['phone 12MP JPEG (EXIF rotate, GPS)'], out_folder, workers_list)
+        print("end to end:")
+        end_to_end(images['phone 12MP JPEG (EXIF rotate, GPS)'], tmp)
+    finally:
+        os.chdir(APP_DIR)
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
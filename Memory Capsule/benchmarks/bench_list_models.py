@@ -0,0 +1,113 @@
+import os
+import sys
+import json
+import time
+import shutil
+import tempfile
+import statistics
+
+# /list_models 性能对比: 旧的逐目录扫描 vs 目录索引 + 分页 + ETag
+# 用法: python benchmarks/bench_list_models.py [capsule 数量, 默认 10000]
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, APP_DIR)
+
+
+def make_capsules(root, count):
+    models_dir = os.path.join(root, 'static', 'models')
+    os.makedirs(models_dir)
+    for i in range(count):
+        job_path = os.path.join(models_dir, str(1391000000000000000 + i))
+        os.makedirs(job_path)
+        with open(os.path.join(job_path, 'metadata.json'), 'w', encoding='utf-8') as f:
+            json.dump({'title': f'Memory {i}', 'date': f'{2000 + i % 30}-{1 + i % 12:02d}-{1 + i % 28:02d}'}, f)
+        for name in ('model.obj', 'material.mtl', 'material_0.png', 'model.zip'):
+            with open(os.path.join(job_path, name), 'wb') as f:
+                f.write(b'0' * 64)
+
+
+def legacy_list_models(models_dir):
+    # baseline 版本的 list_models 逻辑
+    models = []
+    for job_id in os.listdir(models_dir):
+        job_path = os.path.join(models_dir, job_id)
+        if os.path.isdir(job_path):
+            obj_file = None
+            mtl_file = None
+            metadata = {}
+            meta_path = os.path.join(job_path, "metadata.json")
+            if os.path.exists(meta_path):
+                with open(meta_path, 'r', encoding='utf-8') as f:
+                    metadata = json.load(f)
+            for root, dirs, files in os.walk(job_path):
+                for f in files:
+                    if f.lower().endswith('.obj'):
+                        obj_file = os.path.relpath(os.path.join(root, f), 'static').replace('\\', '/')
+                    elif f.lower().endswith('.mtl'):
+                        mtl_file = os.path.relpath(os.path.join(root, f), 'static').replace('\\', '/')
+            if obj_file:
+                models.append({
+                    'id': job_id,
+                    'name': metadata.get('title', f"Memory {job_id[:4]}"),
+                    'date': metadata.get('date'),
+                    'obj_url': f'/static/{obj_file}',
+                    'mtl_url': f'/static/{mtl_file}' if mtl_file else None,
+                    'created_at': os.path.getctime(job_path),
+                })
+    models.sort(key=lambda x: x['date'], reverse=True)
+    return json.dumps({'models': models}).encode('utf-8')
+
+
+def measure(fn, repeat):
+    timings = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings), result
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    root = tempfile.mkdtemp(prefix='bench_list_models_')
+    cwd = os.getcwd()
+    try:
+        make_capsules(root, count)
+        os.chdir(root)
+
+        rows = []
+        ms, body = measure(lambda: legacy_list_models(os.path.join('static', 'models')), 5)
+        rows.append(('before: full scan', ms, len(body)))
+
+        import app as app_module
+        app_module.app.config['CATALOG_DB'] = os.path.join(root, 'data', 'catalog.db')
+        start = time.perf_counter()
+        app_module.get_catalog()
+        rows.append(('after: cold rebuild', (time.perf_counter() - start) * 1000, 0))
+
+        client = app_module.app.test_client()
+        ms, resp = measure(lambda: client.get('/list_models'), 20)
+        rows.append(('after: full list (cached)', ms, len(resp.data)))
+        etag = resp.headers['ETag']
+        ms, resp = measure(lambda: client.get('/list_models', headers={'If-None-Match': etag}), 50)
+        rows.append((f'after: full list 304', ms, len(resp.data)))
+        ms, resp = measure(lambda: client.get('/list_models?limit=50'), 50)
+        rows.append(('after: page limit=50', ms, len(resp.data)))
+        cursor = resp.json['next_cursor']
+        ms, resp = measure(lambda: client.get(f'/list_models?limit=50&cursor={cursor}'), 50)
+        rows.append(('after: next page', ms, len(resp.data)))
+        ms, resp = measure(lambda: client.get('/list_models?limit=50&from=2010-01-01&to=2010-12-31&q=Memory%201'), 50)
+        rows.append(('after: filtered page', ms, len(resp.data)))
+
+        print(f"/list_models with {count} capsules")
+        print(f"{'case':<28}{'median ms':>12}{'bytes':>12}")
+        for name, ms, size in rows:
+            print(f"{name:<28}{ms:>12.2f}{size:>12}")
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,52 @@
+import os
+import sys
+import glob
+import gzip
+import time
+import tempfile
+import statistics
+
+# OBJ -> 量化 GLB 转换基准: 文件大小和服务端转换耗时
+# 用法: python benchmarks/bench_mesh.py
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, APP_DIR)
+
+from mesh import convert_obj_to_glb, parse_obj
+
+
+def main():
+    objs = sorted(glob.glob(os.path.join(APP_DIR, 'static', 'models', '*', '*.obj')))
+    print(f"{'model':<22}{'obj KB':>10}{'obj.gz KB':>11}{'glb KB':>10}{'glb.gz KB':>11}"
+          f"{'ratio':>8}{'verts':>8}{'tris':>8}{'parse ms':>10}{'convert ms':>12}")
+    out_dir = tempfile.mkdtemp(prefix='bench_mesh_')
+    for obj in objs:
+        job_folder = os.path.dirname(obj)
+        mtl = os.path.join(job_folder, 'material.mtl')
+        glb = os.path.join(out_dir, os.path.basename(job_folder) + '.glb')
+        with open(obj, 'rb') as f:
+            data = f.read()
+
+        parse_ms = []
+        for _ in range(3):
+            start = time.perf_counter()
+            parse_obj(data)
+            parse_ms.append((time.perf_counter() - start) * 1000)
+        convert_ms = []
+        for _ in range(3):
+            stats = convert_obj_to_glb(obj, glb, mtl)
+            convert_ms.append(stats['seconds'] * 1000)
+        with open(glb, 'rb') as f:
+            glb_data = f.read()
+
+        print(f"{os.path.basename(job_folder):<22}"
+              f"{len(data) / 1024:>10.0f}{len(gzip.compress(data)) / 1024:>11.0f}"
+              f"{len(glb_data) / 1024:>10.0f}{len(gzip.compress(glb_data)) / 1024:>11.0f}"
+              f"{len(data) / len(glb_data):>8.1f}{stats['vertices']:>8}{stats['triangles']:>8}"
+              f"{statistics.median(parse_ms):>10.0f}{statistics.median(convert_ms):>12.0f}")
+        os.remove(glb)
+    os.rmdir(out_dir)
+
+
+if __name__ == '__main__':
+    main()
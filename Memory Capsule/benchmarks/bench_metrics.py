@@ -0,0 +1,91 @@
+import os
+import sys
+import time
+import shutil
+import logging
+import tempfile
+
+# 指标和追踪的开销
+# - 单次操作: span + 直方图 (开启 / METRICS_ENABLED=0 / 设置 LogTracer 但 DEBUG 未开启), counter.inc
+# - 对请求的影响: 经过 Flask test client 的 /list_models (命中缓存, 最轻的路由) 和 /diary 开启与关闭指标的吞吐
+# - /metrics 导出耗时
+# 用法: python benchmarks/bench_metrics.py [次数]
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, APP_DIR)
+
+import metrics
+
+
+def per_op(fn, n):
+    start = time.perf_counter()
+    for _ in range(n):
+        fn()
+    return (time.perf_counter() - start) / n * 1e9
+
+
+def micro(n):
+    histogram = metrics.histogram('bench_seconds', 'Benchmark histogram', ('operation',))
+    counter = metrics.counter('bench_total', 'Benchmark counter', ('operation',))
+
+    def timed_span():
+        with metrics.span('bench', histogram.labels('op')):
+            pass
+
+    def count():
+        counter.labels('op').inc()
+
+    baseline = per_op(lambda: None, n)
+    for label, enabled, tracer in (('enabled', True, None), ('disabled', False, None),
+                                   ('enabled + LogTracer (DEBUG off)', True, metrics.LogTracer())):
+        metrics.ENABLED = enabled
+        metrics.set_tracer(tracer)
+        print(f"  {label:32} span {per_op(timed_span, n) - baseline:6.0f} ns  "
+              f"counter.inc {per_op(count, n) - baseline:6.0f} ns")
+    metrics.ENABLED = True
+    metrics.set_tracer(None)
+
+
+def requests_per_second(client, path, n):
+    start = time.perf_counter()
+    for _ in range(n):
+        client.get(path)
+    return n / (time.perf_counter() - start)
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    print(f"per operation (minus an empty call), {n} iterations:")
+    micro(n)
+
+    tmp = tempfile.mkdtemp()
+    try:
+        shutil.copytree(os.path.join(APP_DIR, 'static', 'models'), os.path.join(tmp, 'static', 'models'))
+        os.chdir(tmp)
+        os.environ.setdefault('HUNYUAN_STUB', '1')
+        import app as app_module
+        logging.getLogger().setLevel(logging.WARNING)
+        client = app_module.app.test_client()
+        client.post('/diary', json={'date': '2024-01-01', 'content': 'hello'})
+        requests = max(1000, n // 100)
+        print(f"requests per second over the Flask test client ({requests} requests):")
+        for path in ('/list_models', '/diary?date=2024-01-01'):
+            client.get(path)
+            rates = {}
+            for enabled in (True, False, True, False):
+                metrics.ENABLED = enabled
+                rates.setdefault(enabled, []).append(requests_per_second(client, path, requests))
+            on, off = max(rates[True]), max(rates[False])
+            print(f"  {path:24} metrics on {on:7.0f} req/s, off {off:7.0f} req/s ({(off - on) / off * 100:+.1f}%)")
+        metrics.ENABLED = True
+        start = time.perf_counter()
+        body = client.get('/metrics').get_data(as_text=True)
+        print(f"/metrics: {len(body.splitlines())} lines, {len(body)} bytes in {(time.perf_counter() - start) * 1000:.1f} ms")
+        app_module.shutdown_workers()
+    finally:
+        os.chdir(APP_DIR)
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
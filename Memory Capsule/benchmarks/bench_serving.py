@@ -0,0 +1,157 @@
+import os
+import sys
+import time
+import shutil
+import socket
+import asyncio
+import argparse
+import tempfile
+import threading
+import subprocess
+from urllib.request import urlopen
+
+import aiohttp
+
+# 同步 (flask run, 每个请求一个线程) 与异步 (uvicorn asgi:app) 服务模式的压测
+# - 本地 Vector Engine stub 注入固定延迟, 模拟上游生成耗时
+# - 每种模式在独立的子进程和临时目录中启动, 客户端以固定并发数发送 /generate_image (no_cache)
+# - 报告吞吐、p50/p99 延迟、错误数, 以及服务进程的峰值线程数和 RSS
+# 用法: python benchmarks/bench_serving.py [--concurrency 50 200] [--requests 400] [--latency 1.0]
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, APP_DIR)
+
+from stubs import VectorEngineStub
+
+SAMPLE_IMAGE = os.path.join(APP_DIR, 'static', 'uploads', 'gen_1765683303.png')
+
+MODES = {
+    'sync': lambda port: [sys.executable, '-m', 'flask', '--app', 'app', 'run', '--port', str(port)],
+    # 单核满载时客户端可能超过默认 5s 才复用连接, 放宽 keep-alive 避免服务端先关闭
+    'async': lambda port: [sys.executable, '-m', 'uvicorn', 'asgi:app', '--port', str(port),
+                           '--log-level', 'warning', '--backlog', '4096', '--timeout-keep-alive', '60'],
+}
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))] if values else 0.0
+
+
+class ProcessSampler:
+    # 每 50ms 读一次 /proc/<pid>/status, 记录峰值线程数和 RSS
+    def __init__(self, pid):
+        self.pid = pid
+        self.threads = 0
+        self.rss_kb = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        path = f'/proc/{self.pid}/status'
+        while not self._stop.wait(0.05):
+            try:
+                with open(path) as f:
+                    for line in f:
+                        if line.startswith('Threads:'):
+                            self.threads = max(self.threads, int(line.split()[1]))
+                        elif line.startswith('VmRSS:'):
+                            self.rss_kb = max(self.rss_kb, int(line.split()[1]))
+            except OSError:
+                return
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+
+async def load(base_url, concurrency, total):
+    latencies = []
+    errors = []
+    counter = iter(range(total))
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    async with aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=300)) as client:
+        async def worker():
+            for i in counter:
+                start = time.perf_counter()
+                try:
+                    async with client.post(base_url + '/generate_image',
+                                           json={'prompt': f'load {i}', 'api_key': 'test', 'no_cache': True}) as r:
+                        body = await r.json()
+                    if body.get('status') != 'success':
+                        errors.append(body.get('error'))
+                except Exception as e:
+                    errors.append(repr(e))
+                latencies.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+    return elapsed, latencies, errors
+
+
+def wait_ready(base_url, proc, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f'server exited with {proc.returncode}')
+        try:
+            urlopen(base_url + '/image_cache/stats', timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError('server did not start')
+
+
+def run_mode(mode, stub, concurrency, total):
+    tmp = tempfile.mkdtemp()
+    port = free_port()
+    env = dict(os.environ, HUNYUAN_STUB='1', VECTOR_ENGINE_BASE_URL=stub.base_url,
+               PYTHONPATH=APP_DIR, HTTP_POOL_SIZE=str(concurrency))
+    proc = subprocess.Popen(MODES[mode](port), cwd=tmp, env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    base_url = f'http://127.0.0.1:{port}'
+    try:
+        wait_ready(base_url, proc)
+        with ProcessSampler(proc.pid) as sampler:
+            elapsed, latencies, errors = asyncio.run(load(base_url, concurrency, total))
+        print(f"{mode:5} c={concurrency:<4} {total / elapsed:7.1f} req/s  "
+              f"p50 {percentile(latencies, 50) * 1000:7.0f} ms  p99 {percentile(latencies, 99) * 1000:7.0f} ms  "
+              f"errors {len(errors):3}  threads {sampler.threads:4}  rss {sampler.rss_kb // 1024:4} MB")
+        if errors:
+            print(f"      first error: {errors[0]}")
+    finally:
+        proc.terminate()
+        proc.wait()
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[50, 200])
+    parser.add_argument('--requests', type=int, default=400)
+    parser.add_argument('--latency', type=float, default=1.0, help='stub 的上游生成耗时 (秒)')
+    parser.add_argument('--image', default=SAMPLE_IMAGE, help='stub 返回的图片, 决定响应大小和解码开销')
+    parser.add_argument('--modes', nargs='+', default=list(MODES))
+    args = parser.parse_args()
+
+    print(f"stub latency {args.latency}s, image {os.path.getsize(args.image) // 1024} KB, "
+          f"{args.requests} requests per run")
+    with VectorEngineStub(args.image, latency=args.latency) as stub:
+        for concurrency in args.concurrency:
+            for mode in args.modes:
+                run_mode(mode, stub, concurrency, max(args.requests, concurrency))
+
+
+if __name__ == '__main__':
+    main()
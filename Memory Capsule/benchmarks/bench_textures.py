@@ -0,0 +1,59 @@
+import os
+import sys
+import time
+import shutil
+import tempfile
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+# 纹理重新编码: 对示例模型的副本运行 textures.optimize_textures (与服务中一样放在 spawn 进程池)
+# 报告每个模型的 PNG 无损优化、WebP 各尺寸的体积和编码耗时
+# 用法: python benchmarks/bench_textures.py [进程数]
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, APP_DIR)
+
+from textures import optimize_textures
+
+
+def kb(n):
+    return f"{n / 1024:7.0f} KB"
+
+
+def main():
+    workers = int(sys.argv[1]) if len(sys.argv) > 1 else 2
+    tmp = tempfile.mkdtemp()
+    try:
+        models_dir = os.path.join(tmp, 'models')
+        shutil.copytree(os.path.join(APP_DIR, 'static', 'models'), models_dir)
+        folders = sorted(os.path.join(models_dir, name) for name in os.listdir(models_dir))
+
+        start = time.perf_counter()
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+            results = list(pool.map(optimize_textures, folders))
+        wall = time.perf_counter() - start
+
+        total_before = total_after = total_webp = 0
+        for folder, result in zip(folders, results):
+            name = os.path.basename(folder)
+            if not result or not result['textures']:
+                print(f"{name}: no PNG textures")
+                continue
+            for texture, t in result['textures'].items():
+                webp = t['webp_bytes']
+                print(f"{name} {texture}: png {kb(t['png_bytes'])} -> optimized {kb(t['optimized_bytes'])} "
+                      f"({(1 - t['optimized_bytes'] / t['png_bytes']) * 100:4.1f}% smaller) | webp "
+                      + ', '.join(f"{k} {kb(v).strip()}" for k, v in webp.items())
+                      + f" ({(1 - webp['full'] / t['png_bytes']) * 100:4.1f}% smaller) | {t['seconds']:.1f} s")
+                total_before += t['png_bytes']
+                total_after += t['optimized_bytes']
+                total_webp += webp['full']
+            print(f"  alternate MTL: {result['webp_mtl']}")
+        print(f"total: png {kb(total_before)}, optimized png {kb(total_after)}, webp {kb(total_webp)}; "
+              f"wall {wall:.1f} s with {workers} workers on {os.cpu_count()} CPU")
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
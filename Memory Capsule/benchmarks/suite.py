@@ -0,0 +1,322 @@
+import io
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import platform
+import tempfile
+import datetime
+import statistics
+import subprocess
+
+# 离线基准套件: 覆盖 /list_models (10 / 1k / 10k 个胶囊)、/upload 完整流程、/diary 吞吐、/generate_image 解码开销
+# - 混元使用 stubs.StubHunyuanClient (可配置耗时、延迟、失败率, 结果压缩包由示例模型生成),
+#   Vector Engine 使用 stubs.VectorEngineStub; 不需要网络和密钥
+# - app 使用相对路径和模块级单例, 每个用例在独立的子进程和临时目录中运行
+# - 结果保存为 JSON (默认 benchmarks/results/<时间>-<commit>.json), --compare 与基线逐项对比,
+#   变差超过阈值 (默认 25%) 时列出并以退出码 1 结束
+# 用法:
+#   python benchmarks/suite.py [--quick] [--cases list_models upload diary generate_image]
+#   python benchmarks/suite.py --compare benchmarks/results/baseline.json
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+APP_DIR = os.path.dirname(BENCH_DIR)
+RESULTS_DIR = os.path.join(BENCH_DIR, 'results')
+sys.path.insert(0, APP_DIR)
+
+CAPSULE_COUNTS = {'quick': (10, 1000), 'full': (10, 1000, 10000)}
+UPLOAD_JOBS = {'quick': 3, 'full': 6}
+DIARY_DAYS = {'quick': 120, 'full': 365}
+GENERATE_REQUESTS = {'quick': 10, 'full': 30}
+
+# 模拟器参数: 混元任务 1 秒完成, 每次 API 调用 20~80ms
+HUNYUAN_ENV = {'HUNYUAN_STUB': '1', 'HUNYUAN_STUB_DURATION': '1', 'HUNYUAN_STUB_LATENCY': '0.02,0.08',
+               'HUNYUAN_STUB_RESULTS': 'samples'}
+
+
+def metric(value, unit, better='lower'):
+    return {'value': round(value, 4), 'unit': unit, 'better': better}
+
+
+def median_ms(fn, repeat, warmup=1):
+    for _ in range(warmup):
+        fn()
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+def rate(fn, count, repeat=3):
+    # 每秒次数, 取几轮中最好的一轮 (单核机器上波动较大)
+    best = 0.0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for i in range(count):
+            fn(i)
+        best = max(best, count / (time.perf_counter() - start))
+    return best
+
+
+def quiet_app():
+    import logging
+    import app as app_module
+    logging.getLogger().setLevel(logging.WARNING)
+    return app_module
+
+
+# --- 用例 (在子进程中运行, 当前目录为临时目录) ---
+
+def case_list_models(count):
+    from bench_list_models import make_capsules
+    make_capsules('.', count)
+    app_module = quiet_app()
+    start = time.perf_counter()
+    app_module.get_catalog()
+    rebuild_ms = (time.perf_counter() - start) * 1000
+    client = app_module.app.test_client()
+    etag = client.get('/list_models').headers['ETag']
+    cursor = client.get('/list_models?limit=50').json['next_cursor']
+    results = {
+        'cold_rebuild_ms': metric(rebuild_ms, 'ms'),
+        'full_list_ms': metric(median_ms(lambda: client.get('/list_models'), 20), 'ms'),
+        'revalidate_304_ms': metric(median_ms(
+            lambda: client.get('/list_models', headers={'If-None-Match': etag}), 50), 'ms'),
+        'page_ms': metric(median_ms(lambda: client.get('/list_models?limit=50'), 50), 'ms'),
+        'next_page_ms': metric(median_ms(lambda: client.get(f'/list_models?limit=50&cursor={cursor}'), 50), 'ms'),
+        'filtered_page_ms': metric(median_ms(
+            lambda: client.get('/list_models?limit=50&from=2010-01-01&to=2010-12-31&q=Memory%201'), 50), 'ms'),
+    }
+    app_module.shutdown_workers()
+    return results
+
+
+def synthetic_photo(seed, size=(2000, 1500)):
+    from PIL import Image
+    rng = random.Random(seed)
+    image = Image.effect_noise(size, 40).convert('RGB')
+    tint = Image.new('RGB', size, tuple(rng.randrange(256) for _ in range(3)))
+    buffer = io.BytesIO()
+    Image.blend(image, tint, 0.6).save(buffer, format='JPEG', quality=92)
+    return buffer.getvalue()
+
+
+def wait_done(client, status_url, timeout=300):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = client.get(status_url).json
+        if job['status'] in ('DONE', 'FAILED'):
+            return job
+        time.sleep(0.05)
+    raise RuntimeError(f'{status_url} did not finish')
+
+
+def case_upload(count):
+    shutil.copytree(os.path.join(APP_DIR, 'static', 'models'), os.path.join('static', 'models'))
+    app_module = quiet_app()
+    client = app_module.app.test_client()
+    images = [synthetic_photo(i) for i in range(count)]
+
+    def post(data, name):
+        return client.post('/upload', data={'file': (io.BytesIO(data), name), 'title': name},
+                           content_type='multipart/form-data')
+
+    request_ms = []
+    status_urls = []
+    for i, data in enumerate(images):
+        start = time.perf_counter()
+        r = post(data, f'bench_{i}.jpg')
+        request_ms.append((time.perf_counter() - start) * 1000)
+        status_urls.append(r.json['status_url'])
+    jobs = [wait_done(client, url) for url in status_urls]
+    done = [j for j in jobs if j['status'] == 'DONE']
+    total = [j['timings']['DONE'] for j in done]
+
+    def stage(first, last):
+        return statistics.median(j['timings'][last] - j['timings'][first] for j in done) * 1000
+
+    # 同一张图片再次上传: 预处理后哈希相同, 直接复用已生成的模型
+    start = time.perf_counter()
+    clone = wait_done(client, post(images[0], 'again.jpg').json['status_url'])
+    clone_seconds = time.perf_counter() - start
+
+    results = {
+        'failed_jobs': metric(len(jobs) - len(done), 'jobs'),
+        'upload_request_ms': metric(statistics.median(request_ms), 'ms'),
+        'upload_to_done_s': metric(statistics.median(total), 's'),
+        'upload_to_done_max_s': metric(max(total), 's'),
+        'prepare_ms': metric(stage('PREPARING', 'SUBMITTED'), 'ms'),
+        'download_extract_ms': metric(stage('DOWNLOADING', 'CONVERTING'), 'ms'),
+        'hooks_ms': metric(stage('CONVERTING', 'DONE'), 'ms'),
+        'dedupe_upload_to_done_s': metric(clone_seconds, 's'),
+        'dedupe_reused_model': metric(1 if clone.get('cached_from') else 0, 'bool', 'higher'),
+    }
+    app_module.shutdown_workers()
+    return results
+
+
+def case_diary(days):
+    from bench_diary import WORDS
+    app_module = quiet_app()
+    client = app_module.app.test_client()
+    rng = random.Random(0)
+    start_day = datetime.date(2020, 1, 1)
+    dates = [(start_day + datetime.timedelta(days=i)).isoformat() for i in range(days)]
+    contents = [' '.join(rng.choice(WORDS) for _ in range(rng.randint(20, 120))) for _ in dates]
+    results = {
+        'post_req_s': metric(rate(lambda i: client.post('/diary', json={'date': dates[i], 'content': contents[i]}),
+                                  days), 'req/s', 'higher'),
+        'get_day_req_s': metric(rate(lambda i: client.get(f'/diary?date={dates[i % days]}'), 500), 'req/s', 'higher'),
+        'get_month_req_s': metric(rate(lambda i: client.get('/diary?from=2020-03-01&to=2020-03-31'), 300),
+                                  'req/s', 'higher'),
+        'search_req_s': metric(rate(lambda i: client.get(f'/diary?q={WORDS[i % len(WORDS)]}'), 300),
+                               'req/s', 'higher'),
+    }
+    app_module.shutdown_workers()
+    return results
+
+
+def case_generate_image(count):
+    from stubs import VectorEngineStub
+    import imagegen
+    image = os.path.join(APP_DIR, 'static', 'uploads', 'gen_1765683303.png')
+    with VectorEngineStub(image) as stub:
+        os.environ['VECTOR_ENGINE_BASE_URL'] = stub.base_url
+        app_module = quiet_app()
+        client = app_module.app.test_client()
+        payload = {'prompt': 'bench', 'api_key': 'test'}
+        request_ms = median_ms(lambda: client.post('/generate_image', json=dict(payload, no_cache=True)), count)
+        client.post('/generate_image', json=payload)
+        cached_ms = median_ms(lambda: client.post('/generate_image', json=payload), count)
+
+        # 只计解码保存: 事先取得响应, 重复调用 save_results
+        response = imagegen.request_images('bench', 'test', base_url=stub.base_url)
+        folder = app_module.app.config['UPLOAD_FOLDER']
+        decode_ms = median_ms(lambda: imagegen.save_results(response, folder), count)
+        app_module.shutdown_workers()
+    return {
+        'request_ms': metric(request_ms, 'ms'),
+        'cached_request_ms': metric(cached_ms, 'ms'),
+        'decode_save_ms': metric(decode_ms, 'ms'),
+        'image_mb': metric(os.path.getsize(image) / 1024 / 1024, 'MB'),
+    }
+
+
+CASES = {
+    'list_models': (case_list_models, CAPSULE_COUNTS, {}),
+    'upload': (case_upload, UPLOAD_JOBS, HUNYUAN_ENV),
+    'diary': (case_diary, DIARY_DAYS, {}),
+    'generate_image': (case_generate_image, GENERATE_REQUESTS, {}),
+}
+
+
+# --- 运行和对比 ---
+
+def run_case(name, size, env):
+    # 在临时目录中启动子进程运行一个用例, 返回指标 dict
+    tmp = tempfile.mkdtemp(prefix=f'bench_{name}_')
+    output = os.path.join(tmp, 'result.json')
+    try:
+        subprocess.run([sys.executable, os.path.abspath(__file__), '--run-case', name, '--size', str(size),
+                        '--output', output], cwd=tmp, env=dict(os.environ, PYTHONPATH=APP_DIR, **env), check=True)
+        with open(output, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=APP_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline, threshold):
+    # 返回变差超过阈值的 (用例, 指标, 基线值, 当前值, 变化比例)
+    regressions = []
+    if baseline.get('mode') != results['mode'] or baseline.get('cpus') != results['cpus']:
+        print(f"note: baseline ran in {baseline.get('mode')} mode on {baseline.get('cpus')} CPUs, "
+              f"this run in {results['mode']} mode on {results['cpus']} CPUs; sizes or timings may differ")
+    print(f"\n{'case':<24}{'metric':<26}{'baseline':>12}{'current':>12}{'change':>9}")
+    for case, metrics in results['cases'].items():
+        for name, current in metrics.items():
+            old = baseline.get('cases', {}).get(case, {}).get(name)
+            if not old or not old['value']:
+                continue
+            change = (current['value'] - old['value']) / old['value']
+            worse = change > threshold if current['better'] == 'lower' else change < -threshold
+            flag = '  REGRESSION' if worse else ''
+            print(f"{case:<24}{name:<26}{old['value']:>12.3f}{current['value']:>12.3f}{change * 100:>+8.1f}%{flag}")
+            if worse:
+                regressions.append((case, name, old['value'], current['value'], change))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--cases', nargs='+', choices=list(CASES), default=list(CASES))
+    parser.add_argument('--quick', action='store_true', help='小规模运行 (list_models 不测 10k)')
+    parser.add_argument('--save', help='结果文件路径, 默认 benchmarks/results/<时间>-<commit>.json')
+    parser.add_argument('--no-save', action='store_true')
+    parser.add_argument('--compare', help='基线结果文件')
+    parser.add_argument('--threshold', type=float, default=0.25, help='超过这个比例的变差视为退化')
+    parser.add_argument('--run-case', help=argparse.SUPPRESS)
+    parser.add_argument('--size', type=int, help=argparse.SUPPRESS)
+    parser.add_argument('--output', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_case:
+        sys.path.insert(0, BENCH_DIR)
+        result = CASES[args.run_case][0](args.size)
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(result, f)
+        return
+
+    mode = 'quick' if args.quick else 'full'
+    commit = git_commit()
+    results = {
+        'created_at': datetime.datetime.now().isoformat(timespec='seconds'),
+        'commit': commit,
+        'mode': mode,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'cases': {},
+    }
+    for name in args.cases:
+        fn, sizes, env = CASES[name]
+        for size in sizes[mode] if isinstance(sizes[mode], tuple) else (sizes[mode],):
+            key = f'{name}_{size}' if isinstance(sizes[mode], tuple) else name
+            start = time.perf_counter()
+            results['cases'][key] = run_case(name, size, env)
+            print(f"{key} ({time.perf_counter() - start:.1f} s)")
+            for metric_name, m in results['cases'][key].items():
+                print(f"  {metric_name:<26}{m['value']:>12.3f} {m['unit']}")
+
+    if not args.no_save:
+        path = args.save or os.path.join(
+            RESULTS_DIR, f"{datetime.datetime.now():%Y%m%d-%H%M%S}-{commit or 'unknown'}.json")
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+        print(f"results saved to {path}")
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"{len(regressions)} metrics regressed by more than {args.threshold * 100:.0f}%")
+            sys.exit(1)
+        print("no regressions")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,11 +1,11 @@
 import json
-import time
 import base64
 import os
 from tencentcloud.common import credential
 from tencentcloud.common.profile.client_profile import ClientProfile
 from tencentcloud.common.profile.http_profile import HttpProfile
 from tencentcloud.common.exception.tencent_cloud_sdk_exception import TencentCloudSDKException
+from poller import JobPoller
 # 尝试导入具体的客户端，如果不存在则使用通用客户端
 # from tencentcloud.hunyuan.v20230901 import hunyuan_client, models
 
@@ -33,6 +33,10 @@ def call_hunyuan_3d_api(secret_id, secret_key, image_path):
         # Service: hunyuan, Version: 2023-09-01 (假设版本，需根据实际文档确认)
         from tencentcloud.common.common_client import CommonClient
         client = CommonClient("hunyuan", "2023-09-01", cred, "ap-guangzhou", clientProfile)
+        if os.environ.get("HUNYUAN_STUB"):
+            # 离线运行: 使用本地模拟器 (参数见 stubs.StubHunyuanClient.from_env), 不需要真实密钥
+            from stubs import StubHunyuanClient
+            client = StubHunyuanClient.from_env()
 
         # 1. 提交任务
         print(f"正在提交图片: {image_path} ...")
@@ -67,64 +71,49 @@ def call_hunyuan_3d_api(secret_id, secret_key, image_path):
             
         print(f"任务提交成功，JobId: {job_id}")
         
-        # 2. 轮询结果
-        action_query = "QueryHunyuanTo3DJob" # 替换为实际的查询 Action
-        
-        while True:
-            print("正在查询任务状态...")
-            query_params = {
-                "JobId": job_id
-            }
-            response_query = client.call_json(action_query, query_params)
-            
-            # 解析状态
-            # 假设返回结构中有 Status: "RUNNING" | "SUCCESS" | "FAILED"
-            # 具体字段需参考文档
-            data = response_query.get("Response", {})
-            status = data.get("Status")
+        # 2. 轮询结果 (共享轮询器, 自适应退避)
+        print("正在等待任务完成...")
+        poller = JobPoller(lambda: client)
+        status, data = poller.wait(job_id)
+        poller.stop()
+        print(f"当前状态: {status}, 查询次数: {poller.poll_count}")
+
+        if status == "SUCCESS" or status == "DONE":
+            print("生成成功！")
+            # 打印完整数据以便调试
+            print("完整响应数据:", json.dumps(data, indent=2, ensure_ascii=False))
             
-            print(f"当前状态: {status}")
+            # result_url = data.get("ResultUrl") 
+            # if result_url:
+            #     print(f"3D模型下载链接: {result_url}")
+            # else:
+            #     print("未找到 ResultUrl 字段，请检查上方完整响应数据中的链接字段。")
             
-            if status == "SUCCESS" or status == "DONE":
-                print("生成成功！")
-                # 打印完整数据以便调试
-                print("完整响应数据:", json.dumps(data, indent=2, ensure_ascii=False))
-                
-                # result_url = data.get("ResultUrl") 
-                # if result_url:
-                #     print(f"3D模型下载链接: {result_url}")
-                # else:
-                #     print("未找到 ResultUrl 字段，请检查上方完整响应数据中的链接字段。")
-                
-                # 解析 ResultFile3Ds 结构
-                result_files = data.get("ResultFile3Ds", [])
-                if result_files:
-                    # 遍历查找 OBJ 或 GLB 类型的文件
-                    found_model = False
-                    for item in result_files:
-                        file_3d_list = item.get("File3D", [])
-                        for file_info in file_3d_list:
-                            file_type = file_info.get("Type")
-                            file_url = file_info.get("Url")
+            # 解析 ResultFile3Ds 结构
+            result_files = data.get("ResultFile3Ds", [])
+            if result_files:
+                # 遍历查找 OBJ 或 GLB 类型的文件
+                found_model = False
+                for item in result_files:
+                    file_3d_list = item.get("File3D", [])
+                    for file_info in file_3d_list:
+                        file_type = file_info.get("Type")
+                        file_url = file_info.get("Url")
+                        
+                        if file_type in ["OBJ", "GLB"]:
+                            print(f"找到 3D 模型 ({file_type}): {file_url}")
+                            found_model = True
+                        elif file_type == "GIF":
+                            print(f"找到预览 GIF: {file_url}")
                             
-                            if file_type in ["OBJ", "GLB"]:
-                                print(f"找到 3D 模型 ({file_type}): {file_url}")
-                                found_model = True
-                            elif file_type == "GIF":
-                                print(f"找到预览 GIF: {file_url}")
-                                
-                    if not found_model:
-                        print("未找到 OBJ 或 GLB 格式的 3D 模型文件。")
-                else:
-                    print("未找到 ResultFile3Ds 字段。")
-                
-                break
-            elif status == "FAILED":
-                print("生成失败。")
-                print(data)
-                break
+                if not found_model:
+                    print("未找到 OBJ 或 GLB 格式的 3D 模型文件。")
+            else:
+                print("未找到 ResultFile3Ds 字段。")
             
-            time.sleep(5) # 等待5秒再次查询
+        else:
+            print("生成失败。" if status == "FAILED" else "等待超时。")
+            print(data)
 
     except TencentCloudSDKException as err:
         print(f"腾讯云SDK异常: {err}")
@@ -0,0 +1,390 @@
+import os
+import sys
+import json
+import time
+import base64
+import sqlite3
+import threading
+
+import metrics
+from jobs import find_model_files
+from mesh import GLB_NAME
+
+# 模型目录索引: 用 SQLite 保存每个胶囊的元数据和文件路径,
+# /list_models 只需读索引, 不再遍历 static/models 下的所有文件
+# - upload 流水线和 update_model 写入时维护索引
+# - 进程内缓存按数据库文件的 mtime/size 失效 (其他进程写入也能感知)
+# - 数据库不存在或为空时从文件系统冷启动重建
+
+CATALOG_SECONDS = metrics.histogram('catalog_seconds', 'Model catalog operations; rebuild and refresh scan '
+                                    'model folders on disk', ('operation',))
+CATALOG_SCANNED = metrics.counter('catalog_scanned_folders_total', 'Model folders scanned on disk')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS models (
+    id TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    date TEXT NOT NULL,
+    obj_url TEXT NOT NULL,
+    mtl_url TEXT,
+    glb_url TEXT,
+    thumbnail_url TEXT,
+    lods TEXT,
+    created_at REAL NOT NULL,
+    webp_mtl_url TEXT,
+    updated_at REAL
+);
+CREATE INDEX IF NOT EXISTS models_date ON models (date DESC, id);
+CREATE INDEX IF NOT EXISTS models_name ON models (name, id);
+CREATE INDEX IF NOT EXISTS models_created_at ON models (created_at DESC, id);
+CREATE INDEX IF NOT EXISTS models_updated_at ON models (updated_at);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+COLUMNS = ('id', 'name', 'date', 'obj_url', 'mtl_url', 'glb_url', 'thumbnail_url', 'lods', 'created_at',
+           'webp_mtl_url', 'updated_at')
+SELECT_MODELS = f"SELECT {', '.join(COLUMNS)} FROM models"
+UPSERT_MODEL = (f"INSERT OR REPLACE INTO models ({', '.join(COLUMNS)}) "
+                f"VALUES ({', '.join(':' + c for c in COLUMNS)})")
+
+# 旧版本数据库缺少的列, 启动时补齐后重建索引
+ADDED_COLUMNS = {
+    'glb_url': 'TEXT',
+    'thumbnail_url': 'TEXT',
+    'lods': 'TEXT',
+    'webp_mtl_url': 'TEXT',
+    'updated_at': 'REAL',
+}
+
+# sort 参数 -> (列名, 是否升序)
+SORTS = {
+    'date': ('date', False),
+    'date_asc': ('date', True),
+    'name': ('name', True),
+    'created_at': ('created_at', False),
+}
+
+
+def encode_cursor(value, model_id):
+    raw = json.dumps([value, model_id], ensure_ascii=False).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        value, model_id = json.loads(raw.decode('utf-8'))
+    except (ValueError, TypeError):
+        raise ValueError('Invalid cursor')
+    return value, model_id
+
+
+_metadata_lock = threading.Lock()
+
+
+def read_metadata(job_path):
+    meta_path = os.path.join(job_path, "metadata.json")
+    if os.path.exists(meta_path):
+        try:
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            pass
+    return {}
+
+
+def update_metadata_file(job_path, **fields):
+    # metadata.json 会被 update_model 和后台 LOD 处理同时修改, 读改写需要加锁
+    with _metadata_lock:
+        metadata = read_metadata(job_path)
+        metadata.update(fields)
+        meta_path = os.path.join(job_path, "metadata.json")
+        tmp_path = meta_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(metadata, f)
+        os.replace(tmp_path, meta_path)
+    return metadata
+
+
+def static_url(path, static_root='static'):
+    if not os.path.exists(path):
+        return None
+    return '/static/' + os.path.relpath(path, static_root).replace('\\', '/')
+
+
+def asset_url(path, job_path, job_id, version=None, static_root='static'):
+    # 资源入库后有版本号 (assets.folder_version), 使用可永久缓存的 /assets/<id>/<version>/<文件>;
+    # 同一目录下 MTL 引用的贴图等相对路径不受影响. 没有版本号的旧目录仍走 /static/
+    if not version:
+        return static_url(path, static_root)
+    if not os.path.exists(path):
+        return None
+    return f'/assets/{job_id}/{version}/' + os.path.relpath(path, job_path).replace('\\', '/')
+
+
+def scan_model(job_path, job_id, static_root='static'):
+    # 扫描单个任务目录, 没有 OBJ 的目录不进入目录索引
+    obj_file, mtl_file = find_model_files(job_path, static_root)
+    if not obj_file:
+        return None
+    metadata = read_metadata(job_path)
+    version = metadata.get('asset_version')
+    webp_mtl = (metadata.get('texture_variants') or {}).get('webp_mtl')
+    ctime = os.path.getctime(job_path)
+    # 增量导出 (archive.py) 按这个时间筛选: 目录增删文件或 metadata.json 被替换时都会变化
+    meta_path = os.path.join(job_path, 'metadata.json')
+    updated_at = max(os.path.getmtime(job_path), os.path.getmtime(meta_path) if os.path.exists(meta_path) else 0)
+
+    def url(path):
+        return asset_url(path, job_path, job_id, version, static_root)
+
+    lods = []
+    for lod in metadata.get('lods', []):
+        lod_url = url(os.path.join(job_path, lod['file']))
+        if lod_url:
+            lods.append({'level': lod['level'], 'url': lod_url, 'triangles': lod.get('triangles')})
+    return {
+        'id': job_id,
+        'name': metadata.get('title', f"Memory {job_id[:4]}"),
+        'date': metadata.get('date', time.strftime('%Y-%m-%d', time.localtime(ctime))),
+        'obj_url': url(os.path.join(static_root, obj_file)),
+        'mtl_url': url(os.path.join(static_root, mtl_file)) if mtl_file else None,
+        'glb_url': url(os.path.join(job_path, GLB_NAME)),
+        'thumbnail_url': url(os.path.join(job_path, metadata['thumbnail']))
+        if metadata.get('thumbnail') else None,
+        'lods': json.dumps(lods) if lods else None,
+        'created_at': ctime,
+        'webp_mtl_url': url(os.path.join(job_path, webp_mtl)) if webp_mtl else None,
+        'updated_at': updated_at,
+    }
+
+
+def row_to_model(row):
+    model = dict(row)
+    model['lods'] = json.loads(model['lods']) if model['lods'] else []
+    return model
+
+
+class ModelCatalog:
+    def __init__(self, db_path, model_folder, static_root='static'):
+        self.db_path = db_path
+        self.model_folder = model_folder
+        self.static_root = static_root
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+        self._cache_key = None
+        self._cache = None
+        self._cache_version = 0
+
+        os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+        cold = not os.path.exists(db_path)
+        self._conn().executescript(SCHEMA)
+        migrated = self._migrate()
+        if cold or migrated or self.count() == 0:
+            self.rebuild()
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=10)
+            conn.row_factory = sqlite3.Row
+            self._local.conn = conn
+        return conn
+
+    def _migrate(self):
+        conn = self._conn()
+        existing = {row['name'] for row in conn.execute("PRAGMA table_info(models)")}
+        missing = [c for c in ADDED_COLUMNS if c not in existing]
+        with conn:
+            for column in missing:
+                conn.execute(f"ALTER TABLE models ADD COLUMN {column} {ADDED_COLUMNS[column]}")
+        return bool(missing)
+
+    def _bump_version(self, conn):
+        conn.execute("INSERT INTO meta (key, value) VALUES ('version', '1') "
+                     "ON CONFLICT(key) DO UPDATE SET value = CAST(value AS INTEGER) + 1")
+
+    def _check_cache(self):
+        # 数据库文件没有变化时沿用缓存, 代价是一次 stat
+        st = os.stat(self.db_path)
+        key = (st.st_mtime_ns, st.st_size)
+        if key != self._cache_key:
+            row = self._conn().execute("SELECT value FROM meta WHERE key = 'version'").fetchone()
+            self._cache_version = int(row['value']) if row else 0
+            self._cache = None
+            self._cache_key = key
+
+    def version(self):
+        # 每次写入递增, 用作 /list_models 的 ETag
+        self._check_cache()
+        return self._cache_version
+
+    def count(self):
+        return self._conn().execute("SELECT COUNT(*) FROM models").fetchone()[0]
+
+    def ids(self):
+        return {row[0] for row in self._conn().execute("SELECT id FROM models")}
+
+    # --- 写入 ---
+
+    def upsert(self, model):
+        with self._write_lock:
+            conn = self._conn()
+            with conn:
+                conn.execute(UPSERT_MODEL, model)
+                self._bump_version(conn)
+            self._cache_key = None
+
+    def upsert_many(self, models):
+        # 批量导入时一次事务写入, 版本号只递增一次
+        if not models:
+            return
+        with self._write_lock:
+            conn = self._conn()
+            with conn:
+                conn.executemany(UPSERT_MODEL, models)
+                self._bump_version(conn)
+            self._cache_key = None
+
+    def refresh(self, job_id):
+        # 重新扫描一个任务目录并写入索引 (上传完成后调用)
+        job_path = os.path.join(self.model_folder, job_id)
+        with metrics.span('catalog.refresh', CATALOG_SECONDS.labels('refresh'), job_id=job_id):
+            model = scan_model(job_path, job_id, self.static_root) if os.path.isdir(job_path) else None
+        CATALOG_SCANNED.inc()
+        if model:
+            self.upsert(model)
+        else:
+            self.remove(job_id)
+        return model
+
+    def update_metadata(self, job_id, title=None, date=None):
+        fields = {}
+        if title:
+            fields['name'] = title
+        if date:
+            fields['date'] = date
+        if not fields:
+            return
+        fields['updated_at'] = time.time()
+        with self._write_lock:
+            conn = self._conn()
+            with conn:
+                assignments = ', '.join(f"{k} = :{k}" for k in fields)
+                conn.execute(f"UPDATE models SET {assignments} WHERE id = :id", dict(fields, id=job_id))
+                self._bump_version(conn)
+            self._cache_key = None
+
+    def remove(self, job_id):
+        with self._write_lock:
+            conn = self._conn()
+            with conn:
+                conn.execute("DELETE FROM models WHERE id = ?", (job_id,))
+                self._bump_version(conn)
+            self._cache_key = None
+
+    def rebuild(self):
+        models = []
+        with metrics.span('catalog.rebuild', CATALOG_SECONDS.labels('rebuild')):
+            if os.path.exists(self.model_folder):
+                for job_id in os.listdir(self.model_folder):
+                    job_path = os.path.join(self.model_folder, job_id)
+                    # . 开头的是下载解压中 (jobs.py) 和导入中 (archive.py) 的临时目录, 完成后才改名为正式目录
+                    if os.path.isdir(job_path) and not job_id.startswith('.'):
+                        CATALOG_SCANNED.inc()
+                        model = scan_model(job_path, job_id, self.static_root)
+                        if model:
+                            models.append(model)
+            with self._write_lock:
+                conn = self._conn()
+                with conn:
+                    conn.execute("DELETE FROM models")
+                    conn.executemany(UPSERT_MODEL, models)
+                    self._bump_version(conn)
+                self._cache_key = None
+        return len(models)
+
+    # --- 读取 ---
+
+    def list(self):
+        self._check_cache()
+        if self._cache is None:
+            # 只在缓存失效时读数据库, 命中缓存不计时
+            with metrics.span('catalog.list', CATALOG_SECONDS.labels('list')):
+                rows = self._conn().execute(SELECT_MODELS + " ORDER BY date DESC, id").fetchall()
+                self._cache = [row_to_model(row) for row in rows]
+        return self._cache
+
+    def select(self, ids=None, since=None, date_from=None, date_to=None):
+        # 导出用: 返回所有符合条件的胶囊 (不分页), 按 id 排序; since 为时间戳, 只取之后有变化的
+        where = []
+        params = []
+        if ids is not None:
+            if not ids:
+                return []
+            where.append(f"id IN ({', '.join('?' * len(ids))})")
+            params.extend(ids)
+        if since is not None:
+            where.append("COALESCE(updated_at, created_at) > ?")
+            params.append(since)
+        if date_from:
+            where.append("date >= ?")
+            params.append(date_from)
+        if date_to:
+            where.append("date <= ?")
+            params.append(date_to)
+        sql = SELECT_MODELS
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        with metrics.span('catalog.select', CATALOG_SECONDS.labels('select')):
+            return [row_to_model(row) for row in self._conn().execute(sql + " ORDER BY id", params).fetchall()]
+
+    def query(self, limit=None, cursor=None, date_from=None, date_to=None,
+              title_prefix=None, sort='date'):
+        # 游标分页 (keyset), 返回 (models, next_cursor)
+        if sort not in SORTS:
+            raise ValueError(f'Unknown sort key: {sort}')
+        column, ascending = SORTS[sort]
+        where = []
+        params = []
+        if date_from:
+            where.append("date >= ?")
+            params.append(date_from)
+        if date_to:
+            where.append("date <= ?")
+            params.append(date_to)
+        if title_prefix:
+            escaped = title_prefix.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+            where.append("name LIKE ? ESCAPE '\\'")
+            params.append(escaped + '%')
+        if cursor:
+            value, last_id = decode_cursor(cursor)
+            op = '>' if ascending else '<'
+            where.append(f"({column} {op} ? OR ({column} = ? AND id > ?))")
+            params.extend([value, value, last_id])
+
+        sql = SELECT_MODELS
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += f" ORDER BY {column} {'ASC' if ascending else 'DESC'}, id"
+        if limit:
+            sql += " LIMIT ?"
+            params.append(limit + 1)
+
+        with metrics.span('catalog.query', CATALOG_SECONDS.labels('query'), sort=sort):
+            models = [row_to_model(row) for row in self._conn().execute(sql, params).fetchall()]
+        next_cursor = None
+        if limit and len(models) > limit:
+            models = models[:limit]
+            last = models[-1]
+            next_cursor = encode_cursor(last[column], last['id'])
+        return models, next_cursor
+
+if __name__ == '__main__':
+    # python catalog.py rebuild
+    if len(sys.argv) > 1 and sys.argv[1] == 'rebuild':
+        catalog = ModelCatalog(os.path.join('data', 'catalog.db'), os.path.join('static', 'models'))
+        print(f"Indexed {catalog.rebuild()} models")
@@ -0,0 +1,186 @@
+import os
+import re
+import sys
+import json
+import time
+import sqlite3
+import threading
+
+import metrics
+
+# 日记存储: SQLite 一张表按日期索引, FTS5 (trigram 分词, 中英文都能按子串搜索) 做全文检索
+# - /diary?from=&to= 一次查询返回整月/整年的日记, 不再每天一个请求、一次文件读取
+# - 首次启动时把旧的 static/diaries/<date>.json 导入数据库 (只做一次, 原文件保留)
+
+DIARY_SECONDS = metrics.histogram('diary_seconds', 'Diary store operations', ('operation',))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    date TEXT PRIMARY KEY,
+    content TEXT NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS entries_fts USING fts5(
+    content, content='entries', content_rowid='rowid', tokenize='trigram'
+);
+CREATE TRIGGER IF NOT EXISTS entries_ai AFTER INSERT ON entries BEGIN
+    INSERT INTO entries_fts (rowid, content) VALUES (new.rowid, new.content);
+END;
+CREATE TRIGGER IF NOT EXISTS entries_ad AFTER DELETE ON entries BEGIN
+    INSERT INTO entries_fts (entries_fts, rowid, content) VALUES ('delete', old.rowid, old.content);
+END;
+CREATE TRIGGER IF NOT EXISTS entries_au AFTER UPDATE ON entries BEGIN
+    INSERT INTO entries_fts (entries_fts, rowid, content) VALUES ('delete', old.rowid, old.content);
+    INSERT INTO entries_fts (rowid, content) VALUES (new.rowid, new.content);
+END;
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+DATE_RE = re.compile(r'^\d{4}-\d{2}-\d{2}$')
+
+# trigram 分词的查询至少需要 3 个字符, 更短的关键词退回 LIKE 扫描
+MIN_MATCH_CHARS = 3
+
+
+def valid_date(value):
+    return bool(value) and bool(DATE_RE.match(value))
+
+
+class DiaryStore:
+    def __init__(self, db_path, legacy_folder=None):
+        self.db_path = db_path
+        self.legacy_folder = legacy_folder
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+        os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+        self._conn().executescript(SCHEMA)
+        if legacy_folder and not self._meta('legacy_migrated'):
+            self.migrate(legacy_folder)
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=10)
+            conn.row_factory = sqlite3.Row
+            self._local.conn = conn
+        return conn
+
+    def _meta(self, key):
+        row = self._conn().execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row['value'] if row else None
+
+    # --- 写入 ---
+
+    def put(self, date, content, updated_at=None):
+        # 内容为空时删除这一天的日记
+        with metrics.span('diary.put', DIARY_SECONDS.labels('put')), self._write_lock:
+            conn = self._conn()
+            with conn:
+                if content:
+                    conn.execute("INSERT INTO entries (date, content, updated_at) VALUES (?, ?, ?) "
+                                 "ON CONFLICT(date) DO UPDATE SET content = excluded.content, "
+                                 "updated_at = excluded.updated_at",
+                                 (date, content, updated_at or time.time()))
+                else:
+                    conn.execute("DELETE FROM entries WHERE date = ?", (date,))
+
+    def merge(self, rows):
+        # 批量写入 [(date, content, updated_at)], 数据库里已有且更新时间更晚的条目不覆盖
+        with metrics.span('diary.merge', DIARY_SECONDS.labels('merge')), self._write_lock:
+            conn = self._conn()
+            with conn:
+                conn.executemany("INSERT INTO entries (date, content, updated_at) VALUES (?, ?, ?) "
+                                 "ON CONFLICT(date) DO UPDATE SET content = excluded.content, "
+                                 "updated_at = excluded.updated_at "
+                                 "WHERE excluded.updated_at > entries.updated_at", rows)
+        return len(rows)
+
+    def migrate(self, folder):
+        # 导入旧的每日 JSON 文件, 只做一次
+        rows = []
+        if os.path.isdir(folder):
+            for name in sorted(os.listdir(folder)):
+                date = name[:-len('.json')]
+                if not name.endswith('.json') or not valid_date(date):
+                    continue
+                try:
+                    with open(os.path.join(folder, name), 'r', encoding='utf-8') as f:
+                        entry = json.load(f)
+                except (OSError, ValueError):
+                    continue
+                if entry.get('content'):
+                    rows.append((date, entry['content'], entry.get('updated_at') or time.time()))
+        self.merge(rows)
+        with self._write_lock:
+            conn = self._conn()
+            with conn:
+                conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('legacy_migrated', ?)",
+                             (str(time.time()),))
+        return len(rows)
+
+    # --- 读取 ---
+
+    def get(self, date):
+        with metrics.span('diary.get', DIARY_SECONDS.labels('get')):
+            row = self._conn().execute("SELECT date, content, updated_at FROM entries WHERE date = ?",
+                                       (date,)).fetchone()
+        return dict(row) if row else None
+
+    def range(self, date_from=None, date_to=None, since=None):
+        # since: 时间戳, 只返回之后修改过的条目 (增量导出)
+        where = []
+        params = []
+        if since is not None:
+            where.append("updated_at > ?")
+            params.append(since)
+        if date_from:
+            where.append("date >= ?")
+            params.append(date_from)
+        if date_to:
+            where.append("date <= ?")
+            params.append(date_to)
+        sql = "SELECT date, content, updated_at FROM entries"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY date"
+        with metrics.span('diary.range', DIARY_SECONDS.labels('range')):
+            return [dict(row) for row in self._conn().execute(sql, params).fetchall()]
+
+    def search(self, query, date_from=None, date_to=None, limit=50):
+        # 按相关度排序, 返回 [{date, snippet}]; snippet 中命中的部分用 [ ] 标出
+        query = query.strip()
+        if not query:
+            return []
+        where = []
+        params = []
+        if len(query) >= MIN_MATCH_CHARS:
+            sql = ("SELECT e.date, snippet(entries_fts, 0, '[', ']', '…', 40) AS snippet "
+                   "FROM entries_fts JOIN entries e ON e.rowid = entries_fts.rowid")
+            where.append("entries_fts MATCH ?")
+            params.append('"' + query.replace('"', '""') + '"')
+            order = "ORDER BY rank"
+        else:
+            sql = "SELECT e.date, substr(e.content, 1, 64) AS snippet FROM entries e"
+            where.append("instr(e.content, ?) > 0")
+            params.append(query)
+            order = "ORDER BY e.date DESC"
+        if date_from:
+            where.append("e.date >= ?")
+            params.append(date_from)
+        if date_to:
+            where.append("e.date <= ?")
+            params.append(date_to)
+        sql += " WHERE " + " AND ".join(where) + f" {order} LIMIT ?"
+        params.append(limit)
+        with metrics.span('diary.search', DIARY_SECONDS.labels('search')):
+            return [dict(row) for row in self._conn().execute(sql, params).fetchall()]
+
+
+if __name__ == '__main__':
+    # python diary.py migrate
+    if len(sys.argv) > 1 and sys.argv[1] == 'migrate':
+        store = DiaryStore(os.path.join('data', 'diary.db'))
+        print(f"Imported {store.migrate(os.path.join('static', 'diaries'))} diary entries")
@@ -0,0 +1,69 @@
+import threading
+from collections import OrderedDict
+
+# 任务进度事件: JobManager 每次状态变化发布一条事件, /jobs/<id>/events 以 SSE 推送给前端
+# - 每个任务一个事件列表 + Condition, 等待的连接只在自己的任务有新事件时被唤醒
+# - 只用 threading 原语, gevent monkey patch 后等待是协作式的, 一个连接一个 greenlet 而不是一个线程;
+#   异步模式 (ASGI) 通过 add_listener 把事件转发到事件循环
+# - 事件编号从 1 开始, 断线重连时按 Last-Event-ID 补发
+
+MAX_JOBS = 1000
+
+
+class _Channel:
+    def __init__(self):
+        self.events = []
+        self.cond = threading.Condition()
+
+
+class JobEvents:
+    def __init__(self, max_jobs=MAX_JOBS):
+        self.max_jobs = max_jobs
+        self._lock = threading.Lock()
+        self._channels = OrderedDict()
+        self._listeners = []
+
+    def _channel(self, job_id, create=True):
+        with self._lock:
+            channel = self._channels.get(job_id)
+            if channel is None and create:
+                channel = self._channels[job_id] = _Channel()
+                while len(self._channels) > self.max_jobs:
+                    self._channels.popitem(last=False)
+            return channel
+
+    def publish(self, job_id, event):
+        channel = self._channel(job_id)
+        with channel.cond:
+            event = dict(event, id=len(channel.events) + 1)
+            channel.events.append(event)
+            channel.cond.notify_all()
+        for listener in list(self._listeners):
+            listener(job_id, event)
+        return event
+
+    def since(self, job_id, last_id=0):
+        channel = self._channel(job_id, create=False)
+        if channel is None:
+            return []
+        with channel.cond:
+            return channel.events[last_id:]
+
+    def wait(self, job_id, last_id=0, timeout=15.0):
+        # 阻塞到有编号大于 last_id 的事件或超时, 返回新事件列表 (超时时为空)
+        channel = self._channel(job_id)
+        with channel.cond:
+            channel.cond.wait_for(lambda: len(channel.events) > last_id, timeout)
+            return channel.events[last_id:]
+
+    def add_listener(self, listener):
+        # listener(job_id, event) 在发布线程中调用, 需要自己切换到目标线程/事件循环
+        self._listeners.append(listener)
+
+    def remove_listener(self, listener):
+        self._listeners.remove(listener)
+
+    def stats(self):
+        with self._lock:
+            return {'jobs': len(self._channels),
+                    'events': sum(len(c.events) for c in self._channels.values())}
@@ -0,0 +1,237 @@
+import os
+import time
+import shutil
+import hashlib
+import zipfile
+import threading
+
+import requests
+
+import metrics
+from http_clients import get_session
+
+# 结果压缩包的流式下载和解压
+# - 分块写入 .part 文件, 网络中断后用 Range 请求断点续传
+# - 限制下载大小和解压后总大小 (防止 zip bomb), 可选校验 sha256
+# - 解压时逐个成员流式写到目标位置, 拒绝 ../ 和绝对路径 (zip slip)
+
+CHUNK_SIZE = 256 * 1024
+MAX_DOWNLOAD_BYTES = 500 * 1024 * 1024
+MAX_EXTRACT_BYTES = 2 * 1024 * 1024 * 1024
+
+
+class FetchError(Exception):
+    pass
+
+
+class FetchStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.downloads = 0
+        self.download_bytes = 0
+        self.download_seconds = 0.0
+        self.resumes = 0
+        self.failures = 0
+        self.extractions = 0
+        self.extract_bytes = 0
+        self.extract_seconds = 0.0
+
+    def add(self, **values):
+        with self._lock:
+            for key, value in values.items():
+                setattr(self, key, getattr(self, key) + value)
+
+    def snapshot(self):
+        with self._lock:
+            return {k: v for k, v in vars(self).items() if not k.startswith('_')}
+
+
+STATS = FetchStats()
+
+DOWNLOAD_SECONDS = metrics.histogram('download_seconds', 'Result archive download time')
+DOWNLOAD_BYTES = metrics.counter('download_bytes_total', 'Result archive bytes downloaded')
+DOWNLOAD_FAILURES = metrics.counter('download_failures_total', 'Failed result archive downloads')
+EXTRACT_SECONDS = metrics.histogram('extract_seconds', 'Result archive extraction time')
+EXTRACT_BYTES = metrics.counter('extract_bytes_total', 'Bytes written while extracting result archives')
+
+
+def _hash_file(path, digest):
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            digest.update(chunk)
+
+
+def _copy_local(path, dest_path, max_bytes):
+    # file:// 供本地 stub 使用
+    size = os.path.getsize(path)
+    if size > max_bytes:
+        raise FetchError(f'Archive too large: {size} bytes')
+    digest = hashlib.sha256()
+    with open(path, 'rb') as src, open(dest_path, 'wb') as dst:
+        while True:
+            chunk = src.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            digest.update(chunk)
+            dst.write(chunk)
+    return size, digest
+
+
+def stream_download(url, dest_path, max_bytes=MAX_DOWNLOAD_BYTES, expected_sha256=None,
+                    retries=3, timeout=(10, 60), session=None, resume=False):
+    # resume=True 时从上一次残留的 .part 续传 (重启恢复任务时使用, .part 在该任务自己的临时目录里)
+    start = time.perf_counter()
+    part_path = dest_path + '.part'
+    resumes = 0
+    try:
+        if url.startswith('file://'):
+            total, digest = _copy_local(url[len('file://'):], part_path, max_bytes)
+        else:
+            total, digest, resumes = _download_http(url, part_path, max_bytes, retries, timeout,
+                                                    session or get_session(), resume)
+    except Exception:
+        STATS.add(failures=1)
+        DOWNLOAD_FAILURES.inc()
+        raise
+
+    sha256 = digest.hexdigest()
+    if expected_sha256 and sha256 != expected_sha256.lower():
+        os.remove(part_path)
+        STATS.add(failures=1)
+        DOWNLOAD_FAILURES.inc()
+        raise FetchError(f'Checksum mismatch: expected {expected_sha256}, got {sha256}')
+    os.replace(part_path, dest_path)
+
+    seconds = time.perf_counter() - start
+    STATS.add(downloads=1, download_bytes=total, download_seconds=seconds, resumes=resumes)
+    DOWNLOAD_SECONDS.observe(seconds)
+    DOWNLOAD_BYTES.inc(total)
+    return {'bytes': total, 'sha256': sha256, 'seconds': seconds, 'resumes': resumes}
+
+
+def _download_http(url, part_path, max_bytes, retries, timeout, session, resume=False):
+    # 默认不复用上一次残留的 .part, 中途失败才续传
+    digest = hashlib.sha256()
+    offset = 0
+    resumes = 0
+    if os.path.exists(part_path):
+        if resume:
+            offset = os.path.getsize(part_path)
+            _hash_file(part_path, digest)
+            resumes = 1 if offset else 0
+        else:
+            os.remove(part_path)
+    attempt = 0
+    while True:
+        headers = {'Range': f'bytes={offset}-'} if offset else {}
+        try:
+            with session.get(url, headers=headers, stream=True, timeout=timeout) as r:
+                if offset and r.status_code == 206:
+                    if not r.headers.get('Content-Range', '').startswith(f'bytes {offset}-'):
+                        raise FetchError('Server returned an unexpected range')
+                    mode = 'ab'
+                elif offset and r.status_code == 416:
+                    # 残留的 .part 不短于远端文件, 无法确认内容是否一致, 重新下载
+                    os.remove(part_path)
+                    digest = hashlib.sha256()
+                    offset = 0
+                    continue
+                elif r.status_code == 200:
+                    # 服务器不支持 Range, 从头开始
+                    if offset:
+                        digest = hashlib.sha256()
+                        offset = 0
+                    mode = 'wb'
+                else:
+                    r.raise_for_status()
+                    raise FetchError(f'Unexpected status {r.status_code}')
+
+                length = r.headers.get('Content-Length')
+                expected_end = offset + int(length) if length is not None else None
+                if expected_end is not None and expected_end > max_bytes:
+                    raise FetchError(f'Archive too large: {expected_end} bytes')
+
+                with open(part_path, mode) as f:
+                    for chunk in r.iter_content(CHUNK_SIZE):
+                        offset += len(chunk)
+                        if offset > max_bytes:
+                            raise FetchError(f'Archive too large: more than {max_bytes} bytes')
+                        digest.update(chunk)
+                        f.write(chunk)
+                if expected_end is not None and offset < expected_end:
+                    raise requests.ConnectionError(f'Incomplete read: {offset}/{expected_end} bytes')
+                return offset, digest, resumes
+        except FetchError:
+            raise
+        except (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError):
+            attempt += 1
+            if attempt > retries:
+                raise
+            resumes += 1
+            offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+            digest = hashlib.sha256()
+            if offset:
+                _hash_file(part_path, digest)
+            time.sleep(min(2 ** attempt * 0.1, 2))
+
+
+def _safe_member_path(dest_folder, name):
+    name = name.replace('\\', '/')
+    if name.startswith('/') or (len(name) > 1 and name[1] == ':'):
+        raise FetchError(f'Unsafe path in archive: {name}')
+    root = os.path.realpath(dest_folder)
+    target = os.path.realpath(os.path.join(root, *name.split('/')))
+    if target != root and not target.startswith(root + os.sep):
+        raise FetchError(f'Unsafe path in archive: {name}')
+    return target
+
+
+def safe_extract(zip_path, dest_folder, max_total_bytes=MAX_EXTRACT_BYTES):
+    start = time.perf_counter()
+    total = 0
+    files = []
+    with zipfile.ZipFile(zip_path, 'r') as zip_ref:
+        members = [m for m in zip_ref.infolist() if not m.is_dir()]
+        declared = sum(m.file_size for m in members)
+        if declared > max_total_bytes:
+            raise FetchError(f'Archive expands to {declared} bytes')
+        for member in members:
+            target = _safe_member_path(dest_folder, member.filename)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            tmp_path = target + '.part'
+            with zip_ref.open(member) as src, open(tmp_path, 'wb') as dst:
+                while True:
+                    chunk = src.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    total += len(chunk)
+                    if total > max_total_bytes:
+                        dst.close()
+                        os.remove(tmp_path)
+                        raise FetchError(f'Archive expands to more than {max_total_bytes} bytes')
+                    dst.write(chunk)
+            os.replace(tmp_path, target)
+            files.append(os.path.relpath(target, dest_folder))
+
+    seconds = time.perf_counter() - start
+    STATS.add(extractions=1, extract_bytes=total, extract_seconds=seconds)
+    EXTRACT_SECONDS.observe(seconds)
+    EXTRACT_BYTES.inc(total)
+    return {'bytes': total, 'files': files, 'seconds': seconds}
+
+
+def dispose_archive(zip_path, sha256, archive_dir=None):
+    # 默认解压后删除压缩包; 指定 archive_dir 时按 sha256 只保留一份
+    if not archive_dir:
+        os.remove(zip_path)
+        return None
+    os.makedirs(archive_dir, exist_ok=True)
+    kept = os.path.join(archive_dir, f'{sha256}.zip')
+    if os.path.exists(kept):
+        os.remove(zip_path)
+    else:
+        shutil.move(zip_path, kept)
+    return kept
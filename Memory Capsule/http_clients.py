@@ -0,0 +1,68 @@
+import os
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# 进程内共享的 HTTP 客户端
+# - 一个 requests.Session, 按 host 复用 keep-alive 连接, 不再每次请求重新握手 TLS
+# - 默认超时, 避免上游卡住时占满请求线程
+# - 连接失败和 429/5xx 自动退避重试; POST 只在连接建立失败时重试, 不会重复提交付费请求
+
+CONNECT_TIMEOUT = float(os.environ.get('HTTP_CONNECT_TIMEOUT', '10'))
+READ_TIMEOUT = float(os.environ.get('HTTP_READ_TIMEOUT', '120'))
+DEFAULT_TIMEOUT = (CONNECT_TIMEOUT, READ_TIMEOUT)
+RETRIES = int(os.environ.get('HTTP_RETRIES', '3'))
+POOL_SIZE = int(os.environ.get('HTTP_POOL_SIZE', '16'))
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+class TimeoutSession(requests.Session):
+    # 调用方没有传 timeout 时使用默认值
+    def __init__(self, timeout=DEFAULT_TIMEOUT):
+        super().__init__()
+        self.timeout = timeout
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault('timeout', self.timeout)
+        return super().request(method, url, **kwargs)
+
+
+def make_session(retries=RETRIES, backoff=0.5, pool_size=POOL_SIZE, timeout=DEFAULT_TIMEOUT):
+    session = TimeoutSession(timeout)
+    retry = Retry(
+        total=retries,
+        connect=retries,
+        read=retries,
+        status=retries,
+        backoff_factor=backoff,
+        status_forcelist=RETRY_STATUSES,
+        allowed_methods=frozenset(['GET', 'HEAD', 'OPTIONS']),
+        respect_retry_after_header=True,
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session():
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = make_session()
+    return _session
+
+
+def close_session():
+    global _session
+    with _session_lock:
+        if _session is not None:
+            _session.close()
+            _session = None
@@ -0,0 +1,181 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+import unicodedata
+
+# 图片生成结果缓存: 相同的 prompt + model + size + n 直接返回已保存的本地图片, 不再请求付费接口
+# - 索引保存在 SQLite, 图片仍在 static/uploads (文件名是内容哈希, 相同图片只存一份)
+# - 超过 TTL 没有被使用 (命中或被用来创建模型) 的条目视为未命中并删除; 总大小超过预算时按最近使用时间淘汰
+# - 同一个文件可能被多个条目引用, 最后一个引用删除时才删除文件
+# - in_use() 返回还没处理完的任务引用的文件名, 引用这些文件的条目不会被淘汰, 文件不会被删除
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT PRIMARY KEY,
+    prompt TEXT NOT NULL,
+    results TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    last_used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entries_last_used ON entries (last_used);
+CREATE TABLE IF NOT EXISTS files (
+    filename TEXT NOT NULL,
+    key TEXT NOT NULL,
+    bytes INTEGER NOT NULL,
+    PRIMARY KEY (filename, key)
+);
+CREATE INDEX IF NOT EXISTS files_key ON files (key);
+"""
+
+DEFAULT_MAX_BYTES = 500 * 1024 * 1024
+DEFAULT_TTL = 7 * 24 * 3600
+
+
+def normalize_prompt(prompt):
+    # 全角/半角统一、大小写和多余空白不影响命中
+    return ' '.join(unicodedata.normalize('NFKC', prompt).lower().split())
+
+
+def cache_key(prompt, model, size, n=1):
+    raw = json.dumps([normalize_prompt(prompt), model, size, n], ensure_ascii=False)
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+class ImageCache:
+    def __init__(self, db_path, folder, max_bytes=DEFAULT_MAX_BYTES, ttl=DEFAULT_TTL, clock=time.time,
+                 in_use=None):
+        self.db_path = db_path
+        self.folder = folder
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.clock = clock
+        self.in_use = in_use or frozenset
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evictions = 0
+        self.evicted_bytes = 0
+        os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+        self._conn().executescript(SCHEMA)
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=10)
+            conn.row_factory = sqlite3.Row
+            self._local.conn = conn
+        return conn
+
+    def get(self, key):
+        # 命中时返回保存时的结果列表; 过期或文件已被删除时返回 None
+        now = self.clock()
+        with self._lock:
+            conn = self._conn()
+            row = conn.execute("SELECT results, last_used FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            results = json.loads(row['results'])
+            if self.ttl and now - row['last_used'] > self.ttl:
+                self.expired += 1
+                self.misses += 1
+                if not self._referenced(conn, key, self.in_use()):
+                    with conn:
+                        self._delete_entry(conn, key)
+                return None
+            if not all(os.path.exists(os.path.join(self.folder, r['filename'])) for r in results):
+                self.misses += 1
+                with conn:
+                    self._delete_entry(conn, key)
+                return None
+            with conn:
+                conn.execute("UPDATE entries SET last_used = ? WHERE key = ?", (now, key))
+            self.hits += 1
+            return results
+
+    def put(self, key, prompt, results):
+        now = self.clock()
+        with self._lock:
+            conn = self._conn()
+            with conn:
+                self._delete_entry(conn, key, remove_files=False)
+                conn.execute("INSERT INTO entries (key, prompt, results, created_at, last_used) "
+                             "VALUES (?, ?, ?, ?, ?)", (key, prompt, json.dumps(results), now, now))
+                for result in results:
+                    path = os.path.join(self.folder, result['filename'])
+                    conn.execute("INSERT OR REPLACE INTO files (filename, key, bytes) VALUES (?, ?, ?)",
+                                 (result['filename'], key, os.path.getsize(path)))
+                self._evict(conn, keep=key)
+
+    def touch(self, filename):
+        # 生成的图片被用来创建模型时调用, 避免它马上被淘汰
+        with self._lock:
+            conn = self._conn()
+            with conn:
+                conn.execute("UPDATE entries SET last_used = ? WHERE key IN "
+                             "(SELECT key FROM files WHERE filename = ?)", (self.clock(), filename))
+
+    def total_bytes(self):
+        row = self._conn().execute(
+            "SELECT COALESCE(SUM(bytes), 0) FROM (SELECT MAX(bytes) AS bytes FROM files GROUP BY filename)"
+        ).fetchone()
+        return row[0]
+
+    def _referenced(self, conn, key, in_use):
+        # 条目的文件是否被未完成的任务引用
+        return bool(in_use) and any(row['filename'] in in_use for row in
+                                    conn.execute("SELECT filename FROM files WHERE key = ?", (key,)))
+
+    def _delete_entry(self, conn, key, remove_files=True):
+        # 删除条目, 返回释放的字节数 (只统计不再被其他条目引用的文件)
+        freed = 0
+        filenames = [row['filename'] for row in
+                     conn.execute("SELECT filename FROM files WHERE key = ?", (key,)).fetchall()]
+        conn.execute("DELETE FROM files WHERE key = ?", (key,))
+        conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+        if remove_files:
+            for filename in filenames:
+                if conn.execute("SELECT 1 FROM files WHERE filename = ?", (filename,)).fetchone():
+                    continue
+                path = os.path.join(self.folder, filename)
+                if os.path.exists(path):
+                    freed += os.path.getsize(path)
+                    os.remove(path)
+        return freed
+
+    def _evict(self, conn, keep=None):
+        total = self.total_bytes()
+        if total <= self.max_bytes:
+            return
+        in_use = self.in_use()
+        for row in conn.execute("SELECT key FROM entries ORDER BY last_used").fetchall():
+            if total <= self.max_bytes:
+                break
+            if row['key'] == keep or self._referenced(conn, row['key'], in_use):
+                continue
+            freed = self._delete_entry(conn, row['key'])
+            total -= freed
+            self.evictions += 1
+            self.evicted_bytes += freed
+
+    def stats(self):
+        with self._lock:
+            entries = self._conn().execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+            lookups = self.hits + self.misses
+            return {
+                'entries': entries,
+                'bytes': self.total_bytes(),
+                'max_bytes': self.max_bytes,
+                'ttl_seconds': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'expired': self.expired,
+                'evictions': self.evictions,
+                'evicted_bytes': self.evicted_bytes,
+                'hit_ratio': round(self.hits / lookups, 3) if lookups else 0.0,
+            }
@@ -0,0 +1,185 @@
+import os
+import json
+import uuid
+import hashlib
+import logging
+
+import requests
+
+import metrics
+from http_clients import get_session, CONNECT_TIMEOUT, READ_TIMEOUT
+from b64stream import decode_to_file
+from imagecache import cache_key
+
+# Vector Engine 图片生成: 请求接口、解析响应、把图片保存到 static/uploads
+# 单张的 /generate_image 和批量的 /generate_images 共用
+# 保存的文件名是内容哈希 gen_<sha256 前 16 位>.png, 同一秒内的请求不会互相覆盖
+
+DEFAULT_BASE_URL = "https://api.vectorengine.ai"
+DEFAULT_MODEL = "gpt-image-1"
+DEFAULT_SIZE = "1024x1024"  # 调整为正方形以适应通常的 3D 输入需求
+MAX_IMAGES_PER_PROMPT = 4
+
+logger = logging.getLogger(__name__)
+
+IMAGE_SAVE_SECONDS = metrics.histogram('image_save_seconds', 'Decoding and saving one generated image')
+IMAGES_GENERATED = metrics.counter('images_generated_total', 'Generated images saved to disk')
+
+
+class ImageGenError(Exception):
+    def __init__(self, message, details=None):
+        super().__init__(message)
+        self.details = details
+
+
+def summarize_payload(value, limit=50):
+    # 调试输出用: 长字符串只保留前 limit 个字符, 不复制完整的 base64
+    if isinstance(value, dict):
+        return {k: summarize_payload(v, limit) for k, v in value.items()}
+    if isinstance(value, list):
+        return [summarize_payload(v, limit) for v in value]
+    if isinstance(value, str) and len(value) > limit:
+        return f"{value[:limit]}... ({len(value)} chars)"
+    return value
+
+
+def find_image_payloads(response_data):
+    # 返回 [(image_url, b64_data)], 每项至多一个非空; b64_data 保持原字符串, 不拼 data URI
+    payloads = []
+    items = response_data.get('data')
+    if isinstance(items, list):
+        for item in items:
+            if not isinstance(item, dict):
+                continue
+            if item.get('url'):
+                payloads.append((item['url'], None))
+            elif item.get('image_url'):
+                payloads.append((item['image_url'], None))
+            elif item.get('b64_json'):
+                payloads.append((None, item['b64_json']))
+    if not payloads:
+        # 如果上面没找到，尝试在根目录找
+        url = response_data.get('url') or response_data.get('image_url')
+        if url:
+            payloads.append((url, None))
+    return payloads
+
+
+def request_images(prompt, api_key, n=1, base_url=DEFAULT_BASE_URL, model=DEFAULT_MODEL,
+                   size=DEFAULT_SIZE, session=None, timeout=None):
+    url, payload, headers = build_request(prompt, api_key, n, base_url, model, size)
+    # 共享 Session 复用到 Vector Engine 的 keep-alive 连接; timeout 为等待响应的秒数, 不传时用 Session 的默认值
+    kwargs = {'timeout': (CONNECT_TIMEOUT, timeout)} if timeout else {}
+    with metrics.api_call('vector_engine', 'images.generations', n=n):
+        try:
+            res = (session or get_session()).post(url, json=payload, headers=headers, **kwargs)
+        except requests.Timeout:
+            raise timeout_error(timeout or READ_TIMEOUT)
+        return parse_response(res.status_code, res.json)
+
+
+def timeout_error(timeout):
+    return ImageGenError(f"API Error: no response within {timeout}s", {'timeout': timeout})
+
+
+def build_request(prompt, api_key, n=1, base_url=DEFAULT_BASE_URL, model=DEFAULT_MODEL, size=DEFAULT_SIZE):
+    payload = {
+        "size": size,
+        "prompt": prompt,
+        "model": model,
+        "n": n,
+        "response_format": "b64_json" # 显式请求 b64_json 格式
+    }
+    headers = {
+        'Accept': 'application/json',
+        'Authorization': f'Bearer {api_key}',
+    }
+    return f"{base_url}/v1/images/generations", payload, headers
+
+
+def parse_response(status_code, load_json):
+    # load_json 返回解析后的响应: 同步模式传 requests 的 response.json, 异步模式 (asgi.py, aiohttp) 传解析已读取正文的函数
+    try:
+        response_data = load_json()
+    except ValueError:
+        raise ImageGenError(f"API Error: HTTP {status_code}", {'status': status_code})
+
+    # Check for explicit error from API
+    if 'error' in response_data:
+        error_msg = response_data['error']
+        if isinstance(error_msg, dict) and 'message' in error_msg:
+            raise ImageGenError(f"API Error: {error_msg['message']}", response_data)
+        raise ImageGenError(f"API Error: {str(error_msg)}", response_data)
+    return response_data
+
+
+def save_image(image_url, b64_data, upload_folder, session=None):
+    # 先写到临时文件, 算出 sha256 后改名
+    tmp_path = os.path.join(upload_folder, f"gen_{uuid.uuid4().hex}.part")
+
+    try:
+        if b64_data or image_url.startswith("data:image"):
+            # b64_json 或 data:image/png;base64,xxxx; 分块解码直接写文件
+            try:
+                sha256 = decode_to_file(b64_data or image_url, tmp_path)['sha256']
+            except Exception as e:
+                raise ImageGenError(f'Failed to decode base64 image: {str(e)}')
+            shown = "data:image/png;base64," + (b64_data or image_url)[:78] + "..."
+        else:
+            # 处理普通 HTTP 链接, 流式写入
+            digest = hashlib.sha256()
+            with (session or get_session()).get(image_url, stream=True) as img_response:
+                img_response.raise_for_status()
+                with open(tmp_path, 'wb') as f:
+                    for chunk in img_response.iter_content(64 * 1024):
+                        digest.update(chunk)
+                        f.write(chunk)
+            sha256 = digest.hexdigest()
+            shown = image_url[:100] + "..." if len(image_url) > 100 else image_url
+        filename = f"gen_{sha256[:16]}.png"
+        os.replace(tmp_path, os.path.join(upload_folder, filename))
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+    return {
+        'image_url': shown, # 避免返回过长的 Base64
+        'local_image_url': f'/static/uploads/{filename}', # 本地链接
+        'filename': filename,
+    }
+
+
+def save_results(response_data, upload_folder, prompt=None, key=None, cache=None, debug=False):
+    # 解析响应并保存全部图片; 传入 cache 时写入缓存
+    # debug (DEBUG_PAYLOADS) 打开时以 INFO 记录响应, 否则只在 DEBUG 级别记录 (长字段截断);
+    # 级别未开启时不生成摘要, 正常请求不复制 payload
+    level = logging.INFO if debug else logging.DEBUG
+    if logger.isEnabledFor(level):
+        logger.log(level, 'vector engine response %s', json.dumps(summarize_payload(response_data)))
+    payloads = find_image_payloads(response_data)
+    if not payloads:
+        raise ImageGenError('Failed to parse image URL from response', summarize_payload(response_data))
+    results = []
+    for image_url, b64_data in payloads:
+        with metrics.span('imagegen.save', IMAGE_SAVE_SECONDS.labels()):
+            results.append(save_image(image_url, b64_data, upload_folder))
+    IMAGES_GENERATED.inc(len(results))
+    if cache:
+        cache.put(key, prompt, results)
+    return results
+
+
+def cached_results(cache, key):
+    cached = cache.get(key) if cache else None
+    return [dict(result, cached=True) for result in cached] if cached else None
+
+
+def generate(prompt, api_key, upload_folder, n=1, base_url=DEFAULT_BASE_URL, debug=False, cache=None,
+             timeout=None):
+    # 请求 n 张图片并全部保存, 返回 save_image 的结果列表; 传入 ImageCache 时先查缓存
+    key = cache_key(prompt, DEFAULT_MODEL, DEFAULT_SIZE, n)
+    cached = cached_results(cache, key)
+    if cached:
+        return cached
+    response_data = request_images(prompt, api_key, n=n, base_url=base_url, timeout=timeout)
+    return save_results(response_data, upload_folder, prompt, key, cache, debug)
@@ -0,0 +1,617 @@
+import os
+import json
+import time
+import uuid
+import shutil
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import metrics
+from poller import JobPoller, TIMEOUT
+from mesh import GLB_NAME
+from fetch import stream_download, safe_extract, dispose_archive
+from assets import file_sha256
+from b64stream import encode_file
+
+# 任务状态流转: QUEUED -> PREPARING -> SUBMITTED -> RUNNING -> DOWNLOADING -> EXTRACTING -> CONVERTING -> DONE / FAILED
+QUEUED = 'QUEUED'
+PREPARING = 'PREPARING'
+SUBMITTED = 'SUBMITTED'
+RUNNING = 'RUNNING'
+DOWNLOADING = 'DOWNLOADING'
+EXTRACTING = 'EXTRACTING'
+CONVERTING = 'CONVERTING'
+DONE = 'DONE'
+FAILED = 'FAILED'
+TERMINAL_STATES = (DONE, FAILED)
+
+# 下载解压和复用都先在 .partial-<目录名> 里完成, 最后改名发布; 目录索引跳过 . 开头的目录
+STAGING_PREFIX = '.partial-'
+# 写入任务日志的字段: 足以在快照丢失时重建任务并从当前阶段继续
+JOURNAL_FIELDS = ('status', 'file_path', 'title', 'date', 'created_at', 'prepared', 'image_sha256',
+                  'submit_started_at', 'remote_job_id', 'submitted_at', 'model_id', 'cached_from',
+                  'model_url', 'archive_sha256', 'error')
+
+logger = logging.getLogger(__name__)
+
+JOB_TRANSITIONS = metrics.counter('job_transitions_total', 'Job state transitions, by the state entered', ('status',))
+JOB_STAGE_SECONDS = metrics.histogram('job_stage_seconds', 'Time jobs spend in each state before leaving it',
+                                      ('status',), buckets=(0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800))
+JOB_HOOK_SECONDS = metrics.histogram('job_hook_seconds', 'Post-processing hook time', ('hook',))
+JOB_RECOVERED = metrics.counter('jobs_recovered_total', 'Unfinished jobs resumed at startup, by the state they were in',
+                                ('status',))
+
+
+class JobError(Exception):
+    def __init__(self, message, details=None):
+        super().__init__(message)
+        self.details = details
+
+
+def get_image_base64(file_path):
+    # 分块编码, 不在内存里同时保留原始字节和多份编码结果
+    return encode_file(file_path)
+
+
+def find_model_url(result_data):
+    for item in result_data.get("ResultFile3Ds", []):
+        for file_info in item.get("File3D", []):
+            if file_info.get("Type") in ["OBJ", "GLB"]:
+                return file_info.get("Url")
+    return None
+
+
+def find_model_files(job_folder, static_root='static'):
+    obj_file = None
+    mtl_file = None
+    for root, dirs, files in os.walk(job_folder):
+        for f in files:
+            if f.lower().endswith('.obj'):
+                # 返回相对于 static 的路径, 统一使用 forward slash for web
+                rel_path = os.path.relpath(os.path.join(root, f), static_root)
+                obj_file = rel_path.replace('\\', '/')
+            elif f.lower().endswith('.mtl') and not f.lower().endswith('.webp.mtl'):
+                # material.webp.mtl 是纹理优化生成的备用 MTL (textures.py), 不是模型自带的
+                rel_path = os.path.relpath(os.path.join(root, f), static_root)
+                mtl_file = rel_path.replace('\\', '/')
+    return obj_file, mtl_file
+
+
+class JobStore:
+    # 每个任务一个 JSON 文件, 进程重启后可以恢复
+    def __init__(self, folder):
+        self.folder = folder
+        self._lock = threading.Lock()
+        os.makedirs(folder, exist_ok=True)
+
+    def _path(self, job_id):
+        return os.path.join(self.folder, f"{job_id}.json")
+
+    def save(self, job):
+        path = self._path(job['id'])
+        tmp_path = path + '.tmp'
+        with self._lock:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(job, f)
+            os.replace(tmp_path, path)
+
+    def load(self, job_id):
+        # job_id 来自 URL, 只接受 uuid hex
+        if not job_id or not all(c in '0123456789abcdef' for c in job_id):
+            return None
+        path = self._path(job_id)
+        if not os.path.exists(path):
+            return None
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def all(self):
+        jobs = []
+        for name in os.listdir(self.folder):
+            if name.endswith('.json'):
+                try:
+                    with open(os.path.join(self.folder, name), 'r', encoding='utf-8') as f:
+                        jobs.append(json.load(f))
+                except (OSError, ValueError):
+                    pass
+        return jobs
+
+
+class JobJournal:
+    # 追加写的任务日志 (JSON Lines), 每次状态变化写一行并 fsync;
+    # JobStore 的快照没有 fsync, 崩溃或断电后以日志为准补齐, 例如提交后刚拿到的 JobId
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._file = None
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+
+    def _open(self):
+        if self._file is None:
+            self._file = open(self.path, 'a+b')
+            # 上次崩溃时写了一半的行单独留在一行, 不和新记录连在一起
+            size = self._file.seek(0, os.SEEK_END)
+            if size:
+                self._file.seek(size - 1)
+                if self._file.read(1) != b'\n':
+                    self._file.write(b'\n')
+        return self._file
+
+    def append(self, job_id, at=None, **fields):
+        # at 与快照的 updated_at 一致, 恢复时据此判断快照是否落后
+        record = {'job': job_id, 'at': at or time.time()}
+        record.update(fields)
+        line = (json.dumps(record, ensure_ascii=False) + '\n').encode('utf-8')
+        with self._lock:
+            f = self._open()
+            f.write(line)
+            f.flush()
+            os.fsync(f.fileno())
+
+    def replay(self):
+        # 返回 {job_id: 按顺序合并后的字段 (含最后一条的 at)}; 无法解析的行 (写了一半) 跳过
+        jobs = {}
+        with self._lock:
+            if not os.path.exists(self.path):
+                return jobs
+            with open(self.path, 'rb') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                        job_id = record.pop('job')
+                    except (ValueError, KeyError, AttributeError):
+                        continue
+                    jobs.setdefault(job_id, {}).update(record)
+        return jobs
+
+    def compact(self, keep):
+        # 只保留未完成任务的合并记录 (已结束的任务以快照为准), 启动恢复时调用
+        jobs = self.replay()
+        tmp_path = self.path + '.tmp'
+        with self._lock:
+            with open(tmp_path, 'wb') as f:
+                for job_id in keep:
+                    if job_id in jobs:
+                        record = dict(jobs[job_id], job=job_id)
+                        f.write((json.dumps(record, ensure_ascii=False) + '\n').encode('utf-8'))
+                f.flush()
+                os.fsync(f.fileno())
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+            os.replace(tmp_path, self.path)
+            _fsync_dir(os.path.dirname(self.path))
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+def _fsync_dir(path):
+    # 让改名本身落盘; Windows 不支持打开目录, 跳过
+    try:
+        fd = os.open(path or '.', os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def has_model_file(folder):
+    for root, dirs, files in os.walk(folder):
+        if any(f.lower().endswith(('.obj', '.glb')) for f in files):
+            return True
+    return False
+
+
+def repair_model_folders(model_folder, catalog, quarantine_folder, keep=(), staging_prefixes=(STAGING_PREFIX,)):
+    # 启动恢复: 只检查磁盘上有但目录索引里没有的文件夹, 已索引的模型不逐个扫描
+    # - keep: 未完成的任务正在使用的目录, 留给任务自己处理
+    # - 崩溃留下的临时目录 (staging_prefixes) 直接删除, 任务会重新下载, 导入可以重新执行
+    # - 有 OBJ 的补进索引; 没有任何模型文件的 (旧版本下载解压到一半) 移到 quarantine_folder, 不直接删除
+    report = {'removed': [], 'indexed': [], 'quarantined': []}
+    if not os.path.isdir(model_folder):
+        return report
+    indexed = catalog.ids()
+    for name in os.listdir(model_folder):
+        path = os.path.join(model_folder, name)
+        if name in keep or name in indexed or not os.path.isdir(path):
+            continue
+        if name.startswith(staging_prefixes):
+            shutil.rmtree(path, ignore_errors=True)
+            report['removed'].append(name)
+        elif name.startswith('.'):
+            continue
+        elif catalog.refresh(name):
+            report['indexed'].append(name)
+        elif not has_model_file(path):
+            os.makedirs(quarantine_folder, exist_ok=True)
+            target = os.path.join(quarantine_folder, name)
+            if os.path.exists(target):
+                target = f"{target}-{int(time.time())}"
+            shutil.move(path, target)
+            report['quarantined'].append(name)
+            logger.warning('incomplete model folder moved to quarantine folder=%s', target)
+    if any(report.values()):
+        logger.info('model folders repaired removed=%d indexed=%d quarantined=%d',
+                    len(report['removed']), len(report['indexed']), len(report['quarantined']))
+    return report
+
+
+class JobManager:
+    def __init__(self, store, client_factory, model_folder, max_workers=4,
+                 poller=None, downloader=stream_download, static_root='static', hooks=(),
+                 archive_dir=None, assets=None, events=None, prepare=None, journal=None):
+        self.store = store
+        # JobJournal, 为 None 时只依赖 JobStore 的快照
+        self.journal = journal
+        self.client_factory = client_factory
+        self.model_folder = model_folder
+        self.downloader = downloader
+        # 为 None 时解压后删除 model.zip, 否则按 sha256 去重保存到该目录
+        self.archive_dir = archive_dir
+        self.static_root = static_root
+        # 解压完成后依次调用 hook(job, job_folder), 例如更新模型目录索引
+        self.hooks = list(hooks)
+        # AssetStore, 用于按输入图片的 sha256 复用已生成的模型
+        self.assets = assets
+        # JobEvents, 每次状态变化发布一条进度事件
+        self.events = events
+        # 提交前的图片预处理: prepare(file_path) 返回 {'path', 'sha256', ...} 或 None (不处理);
+        # 结果中 remove_source 为真时, 记录新路径后删除原图
+        self.prepare = prepare
+        # 轮询交给共享的 JobPoller, worker 线程只负责提交和下载解压
+        self.poller = poller or JobPoller(client_factory)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='job')
+        # 未完成任务的输入图片 {job_id: file_path}, 图片缓存淘汰时跳过这些文件
+        self._pending = {}
+        self._pending_lock = threading.Lock()
+
+    def enqueue(self, file_path, title, date, upload=None):
+        # upload: 接收上传时的统计 (字节数、耗时), 预处理的统计之后合并进 job['ingest']
+        job = {
+            'id': uuid.uuid4().hex,
+            'status': QUEUED,
+            'file_path': file_path,
+            'title': title,
+            'date': date,
+            'remote_job_id': None,
+            'created_at': time.time(),
+            'updated_at': time.time(),
+            'timings': {QUEUED: 0.0},
+        }
+        if upload:
+            job['ingest'] = {'upload': upload}
+        self._track(job)
+        if self.journal:
+            self.journal.append(job['id'], at=job['updated_at'], **{k: job[k] for k in JOURNAL_FIELDS if k in job})
+        self.store.save(job)
+        self._publish(job)
+        self._executor.submit(self._run, job['id'])
+        return job
+
+    def get(self, job_id):
+        return self.store.load(job_id)
+
+    def resume(self, repair=None):
+        # 重启后继续处理未完成的任务; 已提交的任务直接恢复轮询, 不会重复付费提交
+        # repair(keep): 任务重新开始之前修复模型目录, keep 是这些任务正在使用的目录名 (见 repair_model_folders)
+        outstanding = self.recover()
+        for job in outstanding:
+            self._track(job)
+        if repair:
+            keep = set()
+            for job in outstanding:
+                name = self._folder_name(job)
+                if name:
+                    keep.update((name, STAGING_PREFIX + name))
+            repair(keep)
+        for job in outstanding:
+            JOB_RECOVERED.labels(job['status']).inc()
+            logger.info('job id=%s resuming status=%s', job['id'], job['status'])
+            self._executor.submit(self._run, job['id'])
+        return [job['id'] for job in outstanding]
+
+    def recover(self):
+        # 用任务日志补齐缺失或落后的快照, 返回未完成的任务; 之后日志只保留这些任务
+        if self.journal:
+            for job_id, state in self.journal.replay().items():
+                self._replay(job_id, state)
+        outstanding = [job for job in self.store.all() if job.get('status') not in TERMINAL_STATES]
+        if self.journal:
+            self.journal.compact([job['id'] for job in outstanding])
+        return outstanding
+
+    def _replay(self, job_id, state):
+        state = dict(state)
+        at = state.pop('at', 0)
+        try:
+            job = self.store.load(job_id)
+        except (OSError, ValueError):
+            job = None
+        if job is None:
+            if 'status' not in state:
+                return
+            job = {'id': job_id, 'remote_job_id': None, 'created_at': at, 'timings': {}}
+        elif job.get('updated_at', 0) >= at:
+            return
+        logger.warning('job id=%s snapshot behind journal, restored status=%s', job_id, state.get('status'))
+        job.update(state)
+        job['updated_at'] = at
+        self.store.save(job)
+
+    def pending_files(self):
+        # 还没处理完的任务正在使用的输入图片路径
+        with self._pending_lock:
+            return set(self._pending.values())
+
+    def _track(self, job):
+        with self._pending_lock:
+            if job.get('status') in TERMINAL_STATES or not job.get('file_path'):
+                self._pending.pop(job['id'], None)
+            else:
+                self._pending[job['id']] = job['file_path']
+
+    def shutdown(self, wait=True):
+        self.poller.stop()
+        self._executor.shutdown(wait=wait)
+        if self.journal:
+            self.journal.close()
+
+    def _update(self, job, **fields):
+        previous = job.get('status')
+        changed = 'status' in fields and fields['status'] != previous
+        job.update(fields)
+        job['updated_at'] = time.time()
+        if 'status' in fields or 'file_path' in fields:
+            self._track(job)
+        journaled = {k: v for k, v in fields.items() if k in JOURNAL_FIELDS}
+        if self.journal and journaled:
+            # 先写日志 (fsync) 再写快照
+            self.journal.append(job['id'], at=job['updated_at'], **journaled)
+        if changed:
+            # 记录进入每个状态时距创建的秒数
+            timings = job.setdefault('timings', {})
+            timings[job['status']] = round(job['updated_at'] - job['created_at'], 3)
+            if previous in timings:
+                JOB_STAGE_SECONDS.labels(previous).observe(timings[job['status']] - timings[previous])
+            JOB_TRANSITIONS.labels(job['status']).inc()
+            if job['status'] == FAILED:
+                logger.warning('job id=%s failed in=%s error=%s', job['id'], previous, job.get('error'))
+            else:
+                logger.info('job id=%s status=%s', job['id'], job['status'])
+        self.store.save(job)
+        if changed:
+            self._publish(job)
+
+    def _publish(self, job):
+        if self.events:
+            self.events.publish(job['id'], progress_event(job))
+
+    def _guarded(self, job, fn, *args):
+        try:
+            fn(job, *args)
+        except JobError as e:
+            self._update(job, status=FAILED, error=str(e), details=e.details)
+        except Exception as e:
+            logger.exception('job id=%s unexpected error', job['id'])
+            self._update(job, status=FAILED, error=str(e))
+
+    def _run(self, job_id):
+        job = self.store.load(job_id)
+        if not job or job['status'] in TERMINAL_STATES:
+            return
+        self._guarded(job, self._start)
+
+    def _start(self, job):
+        status = job['status']
+        name = self._folder_name(job)
+        if status == CONVERTING and name and os.path.isdir(os.path.join(self.model_folder, name)):
+            # 重启前目录已经发布, 重新执行收尾 hook (已完成的部分 hook 会跳过)
+            self._complete(job, os.path.join(self.model_folder, name))
+            return
+        if status in (DOWNLOADING, EXTRACTING, CONVERTING):
+            if job.get('cached_from'):
+                self._clone(job, job['cached_from'])
+                return
+            if job.get('model_url') and (self._staged_archive(job) or not job.get('remote_job_id')):
+                self._download_and_extract(job, job['model_url'])
+                return
+            # 下载没完成: 重新查询一次拿到新的下载地址 (签名 URL 会过期), 已下载的部分续传
+        if not job.get('remote_job_id'):
+            if job.get('submit_started_at'):
+                # 提交请求已经发出但没有记录到 JobId (崩溃在返回之前), 远端可能有一个无法找回的任务
+                logger.warning('job id=%s was being submitted when the process stopped; submitting again',
+                               job['id'])
+            if self.prepare and not job.get('prepared'):
+                self._prepare(job)
+            if self.assets and os.path.exists(job['file_path']):
+                # 同一张图片已经生成过模型时直接复用, 不再提交付费任务
+                if not job.get('image_sha256'):
+                    self._update(job, image_sha256=file_sha256(job['file_path']))
+                source = self.assets.lookup_input(job['image_sha256'])
+                if source and os.path.isdir(os.path.join(self.model_folder, source)):
+                    self._clone(job, source)
+                    return
+            self._submit(job, self.client_factory())
+        self.poller.watch(job['remote_job_id'],
+                          lambda status, data: self._on_poll_complete(job, status, data),
+                          started_at=job.get('submitted_at'),
+                          on_status=lambda status: self._on_remote_status(job, status))
+
+    def _prepare(self, job):
+        if not os.path.exists(job['file_path']):
+            raise JobError('File not found')
+        self._update(job, status=PREPARING)
+        try:
+            with metrics.span('job.prepare', job_id=job['id']):
+                result = self.prepare(job['file_path'])
+        except OSError as e:
+            raise JobError(f'Cannot process image: {e}')
+        if not result:
+            self._update(job, prepared=True)
+            return
+        ingest = dict(job.get('ingest') or {})
+        ingest.update({k: v for k, v in result.items() if k not in ('path', 'sha256', 'remove_source')})
+        source_path = job['file_path']
+        self._update(job, prepared=True, file_path=result['path'], image_sha256=result['sha256'], ingest=ingest)
+        if result.get('remove_source') and source_path != result['path']:
+            os.remove(source_path)
+
+    def _on_remote_status(self, job, status):
+        # 远端开始生成 (WAIT -> RUN)
+        if status in ('RUN', 'RUNNING') and job['status'] == SUBMITTED:
+            self._update(job, status=RUNNING)
+
+    def _on_poll_complete(self, job, status, data):
+        # 在轮询线程中回调, 下载解压交回 worker 线程池
+        if status == 'DONE':
+            self._executor.submit(self._guarded, job, self._finish, data)
+        elif status == TIMEOUT:
+            self._update(job, status=FAILED, error='Timeout waiting for job')
+        else:
+            self._update(job, status=FAILED, error='Job failed', details=data)
+
+    def _submit(self, job, client):
+        if not os.path.exists(job['file_path']):
+            raise JobError('File not found')
+        params = {
+            "ImageBase64": get_image_base64(job['file_path']),
+        }
+        # 付费提交之前落盘, 重启后能知道这次提交的结果可能丢了
+        self._update(job, submit_started_at=time.time())
+        with metrics.api_call('hunyuan', 'SubmitHunyuanTo3DJob', job_id=job['id']):
+            response_submit = client.call_json("SubmitHunyuanTo3DJob", params)
+        if "Response" not in response_submit or "JobId" not in response_submit["Response"]:
+            raise JobError('Failed to submit job', response_submit)
+        self._update(job, status=SUBMITTED, remote_job_id=response_submit["Response"]["JobId"],
+                     submitted_at=time.time())
+
+    def _finish(self, job, result_data):
+        model_url = find_model_url(result_data)
+        if not model_url:
+            raise JobError('No 3D model found in result')
+        self._download_and_extract(job, model_url)
+
+    def _folder_name(self, job):
+        return job.get('model_id') or job.get('remote_job_id')
+
+    def _staging(self, job):
+        return os.path.join(self.model_folder, STAGING_PREFIX + self._folder_name(job))
+
+    def _staged_archive(self, job):
+        # 重启前已经完整下载 (sha256 与记录一致) 的 model.zip, 可以直接解压
+        zip_path = os.path.join(self._staging(job), "model.zip")
+        if job.get('archive_sha256') and os.path.exists(zip_path) and file_sha256(zip_path) == job['archive_sha256']:
+            return zip_path
+        return None
+
+    def _promote(self, job, staging):
+        # 临时目录整体改名为正式目录, 之后才进入目录索引; 同名的旧目录是之前没完成的同一任务留下的
+        job_folder = os.path.join(self.model_folder, self._folder_name(job))
+        if os.path.exists(job_folder):
+            logger.warning('job id=%s replacing incomplete folder=%s', job['id'], job_folder)
+            shutil.rmtree(job_folder)
+        os.replace(staging, job_folder)
+        _fsync_dir(self.model_folder)
+        return job_folder
+
+    def _clone(self, job, source_id):
+        # 新目录中的文件硬链接到已有模型 (metadata.json 除外), 标题和日期使用本次上传的
+        model_id = job.get('model_id') or f"{source_id}-{job['id'][:8]}"
+        self._update(job, status=EXTRACTING, model_id=model_id, cached_from=source_id)
+        source_folder = os.path.join(self.model_folder, source_id)
+        staging = self._staging(job)
+        for root, dirs, files in os.walk(source_folder):
+            target_root = os.path.join(staging, os.path.relpath(root, source_folder))
+            os.makedirs(target_root, exist_ok=True)
+            for name in files:
+                if name == 'metadata.json' or name.endswith(('.tmp', '.part', '.cas')):
+                    continue
+                target = os.path.join(target_root, name)
+                if os.path.exists(target):
+                    continue
+                try:
+                    os.link(os.path.join(root, name), target)
+                except OSError:
+                    shutil.copyfile(os.path.join(root, name), target)
+
+        metadata = {}
+        source_meta = os.path.join(source_folder, "metadata.json")
+        if os.path.exists(source_meta):
+            with open(source_meta, 'r', encoding='utf-8') as f:
+                metadata = json.load(f)
+        metadata.update(title=job['title'], date=job['date'], created_at=time.time(), cached_from=source_id)
+        with open(os.path.join(staging, "metadata.json"), 'w', encoding='utf-8') as f:
+            json.dump(metadata, f)
+        self._complete(job, self._promote(job, staging))
+
+    def _download_and_extract(self, job, model_url):
+        staging = self._staging(job)
+        zip_path = self._staged_archive(job)
+        if zip_path:
+            download = {'bytes': job.get('download_bytes'), 'seconds': job.get('download_seconds') or 0,
+                        'sha256': job['archive_sha256']}
+        else:
+            self._update(job, status=DOWNLOADING, model_url=model_url)
+            os.makedirs(staging, exist_ok=True)
+            zip_path = os.path.join(staging, "model.zip")
+            with metrics.span('job.download', job_id=job['id']):
+                # 同一任务的临时目录里残留的 .part 是重启前下载的, 续传
+                download = self.downloader(model_url, zip_path, resume=True)
+
+        self._update(job, status=EXTRACTING, download_bytes=download['bytes'],
+                     download_seconds=round(download['seconds'], 3), archive_sha256=download['sha256'])
+        with metrics.span('job.extract', job_id=job['id']):
+            extract = safe_extract(zip_path, staging)
+
+        # 保存元数据
+        with open(os.path.join(staging, "metadata.json"), 'w', encoding='utf-8') as f:
+            json.dump({
+                "title": job['title'],
+                "date": job['date'],
+                "created_at": time.time()
+            }, f)
+        dispose_archive(zip_path, download['sha256'], self.archive_dir)
+        job['extract_seconds'] = round(extract['seconds'], 3)
+        self._complete(job, self._promote(job, staging))
+
+    def _complete(self, job, job_folder):
+        self._update(job, status=CONVERTING)
+        for hook in self.hooks:
+            name = getattr(hook, '__name__', type(hook).__name__)
+            with metrics.span(f'job.hook.{name}', JOB_HOOK_SECONDS.labels(name), job_id=job['id']):
+                hook(job, job_folder)
+
+        obj_file, mtl_file = find_model_files(job_folder, self.static_root)
+        glb_path = os.path.join(job_folder, GLB_NAME)
+        glb_file = os.path.relpath(glb_path, self.static_root).replace('\\', '/')
+        self._update(job, status=DONE,
+                     obj_url=f'/static/{obj_file}' if obj_file else None,
+                     mtl_url=f'/static/{mtl_file}' if mtl_file else None,
+                     glb_url=f'/static/{glb_file}' if os.path.exists(glb_path) else None)
+        if self.assets and job.get('image_sha256') and not job.get('cached_from'):
+            self.assets.record_input(job['image_sha256'], os.path.basename(job_folder))
+
+
+def public_view(job):
+    # 对外只暴露前端需要的字段
+    keys = ('id', 'status', 'title', 'date', 'remote_job_id', 'model_id', 'cached_from', 'error', 'details',
+            'obj_url', 'mtl_url', 'glb_url', 'download_bytes', 'download_seconds',
+            'extract_seconds', 'ingest', 'created_at', 'updated_at', 'timings')
+    return {k: job.get(k) for k in keys if k in job}
+
+
+def progress_event(job):
+    # SSE 推送的内容: 公开字段 + 小写的状态名 + 已耗时
+    event = public_view(job)
+    event['state'] = job['status'].lower()
+    event['elapsed'] = round(job['updated_at'] - job['created_at'], 3)
+    return event
@@ -0,0 +1,247 @@
+import os
+import sys
+import glob
+import json
+import time
+
+import numpy as np
+
+from mesh import parse_obj, build_vertices, quantize, write_glb, read_texture_from_mtl, webp_variant
+
+try:
+    from PIL import Image
+except ImportError:  # 没有 Pillow 时跳过纹理缩放和缩略图, 只生成 LOD 网格
+    Image = None
+
+# 离线 LOD 处理: 在进程池中运行, 生成
+# - 多级简化网格 model_lod1.glb, model_lod2.glb ... (基于二次误差的顶点聚类)
+# - 纹理 mipmap material_0_1024.png / _512 / _256
+# - 画廊预览缩略图 thumbnail.png
+# 结果以文件名形式返回, 由调用方写入 metadata.json
+
+# 每级 LOD 保留的三角形比例 (level 1 最精细), 以及使用的纹理边长
+LOD_LEVELS = [
+    (1, 0.25, 1024),
+    (2, 0.06, 512),
+]
+MIPMAP_SIZES = (1024, 512, 256)
+THUMBNAIL_SIZE = 256
+THUMBNAIL_NAME = 'thumbnail.png'
+
+
+def _cluster(positions, uvs, grid):
+    lo = positions.min(axis=0)
+    extent = float((positions.max(axis=0) - lo).max()) or 1.0
+    cell = np.clip(np.floor((positions - lo) / extent * grid), 0, grid - 1).astype(np.int64)
+    key = (cell[:, 0] * grid + cell[:, 1]) * grid + cell[:, 2]
+    if uvs is not None:
+        # UV 也参与聚类, 避免接缝两侧的顶点被合并后纹理错位
+        uv_cell = np.clip(np.floor(uvs * grid), 0, grid - 1).astype(np.int64)
+        key = key * grid * grid + uv_cell[:, 0] * grid + uv_cell[:, 1]
+    _, cluster = np.unique(key, return_inverse=True)
+    return cluster.reshape(-1), extent / grid
+
+
+def _collapse(triangles, cluster):
+    t = cluster[triangles]
+    keep = (t[:, 0] != t[:, 1]) & (t[:, 1] != t[:, 2]) & (t[:, 0] != t[:, 2])
+    t = t[keep]
+    if len(t):
+        _, first = np.unique(np.sort(t, axis=1), axis=0, return_index=True)
+        t = t[np.sort(first)]
+    return t
+
+
+def _cluster_sum(cluster, values, n):
+    return np.stack([np.bincount(cluster, weights=values[:, i], minlength=n)
+                     for i in range(values.shape[1])], axis=1)
+
+
+def simplify(vertices, target_triangles):
+    positions = vertices['positions'].astype(np.float64)
+    uvs = vertices.get('uvs')
+    triangles = vertices['indices'].reshape(-1, 3)
+    if target_triangles >= len(triangles):
+        return vertices
+
+    # 二分查找网格分辨率, 使三角形数不超过目标
+    lo, hi = 4, 1024
+    best = None
+    while lo <= hi:
+        grid = (lo + hi) // 2
+        cluster, cell_size = _cluster(positions, uvs, grid)
+        collapsed = _collapse(triangles, cluster)
+        if len(collapsed) <= target_triangles:
+            best = (cluster, cell_size, collapsed)
+            lo = grid + 1
+        else:
+            hi = grid - 1
+    if best is None:
+        best = (cluster, cell_size, collapsed)
+    cluster, cell_size, new_triangles = best
+    n = int(cluster.max()) + 1
+
+    # 每个面的平面二次误差矩阵按面积加权, 累加到三个顶点所在的簇
+    p0, p1, p2 = (positions[triangles[:, i]] for i in range(3))
+    normal = np.cross(p1 - p0, p2 - p0)
+    area = np.linalg.norm(normal, axis=1)
+    unit = normal / np.where(area == 0, 1, area)[:, None]
+    plane = np.concatenate([unit, -(unit * p0).sum(axis=1, keepdims=True)], axis=1)
+    q = (area[:, None, None] * plane[:, :, None] * plane[:, None, :]).reshape(-1, 16)
+    quadric = np.zeros((n, 16))
+    for i in range(3):
+        quadric += _cluster_sum(cluster[triangles[:, i]], q, n)
+    quadric = quadric.reshape(n, 4, 4)
+
+    counts = np.bincount(cluster, minlength=n)[:, None]
+    mean = _cluster_sum(cluster, positions, n) / counts
+
+    # 求解最优位置, 矩阵奇异或结果偏离簇太远时退回均值
+    a = quadric[:, :3, :3] + np.eye(3) * 1e-12
+    b = -quadric[:, :3, 3]
+    solvable = np.abs(np.linalg.det(a)) > 1e-18
+    optimal = mean.copy()
+    if solvable.any():
+        optimal[solvable] = np.linalg.solve(a[solvable], b[solvable][:, :, None])[:, :, 0]
+    too_far = np.linalg.norm(optimal - mean, axis=1) > cell_size * 1.5
+    optimal[too_far] = mean[too_far]
+
+    # 去掉不再被引用的簇
+    used = np.zeros(n, dtype=bool)
+    used[new_triangles.reshape(-1)] = True
+    remap = np.cumsum(used) - 1
+    out = {
+        'positions': optimal[used].astype(np.float32),
+        'indices': remap[new_triangles].reshape(-1),
+    }
+    if uvs is not None:
+        out['uvs'] = (_cluster_sum(cluster, uvs.astype(np.float64), n) / counts)[used].astype(np.float32)
+    return out
+
+
+def _save_image(image, path, **options):
+    # 先写临时文件再替换: 目标可能是资源存储中的硬链接, 不能原地覆盖
+    tmp_path = path + '.tmp'
+    image.save(tmp_path, format='PNG', **options)
+    os.replace(tmp_path, path)
+
+
+def build_mipmaps(job_folder, texture_name):
+    # 依次减半生成较小的纹理, 返回 {边长: 文件名}
+    if Image is None or not texture_name:
+        return {}
+    path = os.path.join(job_folder, texture_name)
+    if not os.path.exists(path):
+        return {}
+    stem = os.path.splitext(texture_name)[0]
+    mipmaps = {}
+    with Image.open(path) as img:
+        current = img.convert('RGBA' if img.mode in ('RGBA', 'LA', 'P') else 'RGB')
+    for size in MIPMAP_SIZES:
+        if max(current.size) <= size:
+            continue
+        while max(current.size) >= size * 2:
+            current = current.reduce(2)
+        if max(current.size) > size:
+            scale = size / max(current.size)
+            current = current.resize((max(1, round(current.width * scale)),
+                                      max(1, round(current.height * scale))), Image.LANCZOS)
+        name = f'{stem}_{size}.png'
+        _save_image(current, os.path.join(job_folder, name))
+        mipmaps[size] = name
+    return mipmaps
+
+
+def render_thumbnail(vertices, texture_path, out_path, size=THUMBNAIL_SIZE, samples=6):
+    # 用 NumPy 做简单的点采样光栅化: 正视图, z-buffer, 纹理颜色 + Lambert 光照
+    if Image is None:
+        return None
+    positions = vertices['positions'].astype(np.float64)
+    triangles = vertices['indices'].reshape(-1, 3)
+    p = positions[triangles]
+
+    rng = np.random.default_rng(0)
+    bary = rng.dirichlet((1, 1, 1), size=samples)
+    bary = np.vstack([bary, [1 / 3, 1 / 3, 1 / 3]])
+    points = np.einsum('sk,fkd->fsd', bary, p).reshape(-1, 3)
+
+    normal = np.cross(p[:, 1] - p[:, 0], p[:, 2] - p[:, 0])
+    normal /= np.maximum(np.linalg.norm(normal, axis=1, keepdims=True), 1e-12)
+    light = np.array([0.3, 0.5, 0.8])
+    light /= np.linalg.norm(light)
+    shade = 0.45 + 0.55 * np.abs(normal @ light)
+    shade = np.repeat(shade, len(bary))
+
+    if 'uvs' in vertices and texture_path and os.path.exists(texture_path):
+        with Image.open(texture_path) as img:
+            tex = np.asarray(img.convert('RGB'))
+        uv = np.einsum('sk,fkd->fsd', bary, vertices['uvs'][triangles]).reshape(-1, 2)
+        tx = np.clip((uv[:, 0] % 1.0) * (tex.shape[1] - 1), 0, tex.shape[1] - 1).astype(np.int64)
+        ty = np.clip((1 - uv[:, 1] % 1.0) * (tex.shape[0] - 1), 0, tex.shape[0] - 1).astype(np.int64)
+        colors = tex[ty, tx].astype(np.float64)
+    else:
+        colors = np.full((len(points), 3), 200.0)
+    colors = np.clip(colors * shade[:, None], 0, 255).astype(np.uint8)
+
+    lo = points.min(axis=0)
+    extent = float((points.max(axis=0) - lo)[:2].max()) or 1.0
+    margin = size * 0.06
+    scale = (size - 2 * margin) / extent
+    center = (points.min(axis=0) + points.max(axis=0)) / 2
+    px = np.clip(np.round((points[:, 0] - center[0]) * scale + size / 2), 0, size - 1).astype(np.int64)
+    py = np.clip(np.round((center[1] - points[:, 1]) * scale + size / 2), 0, size - 1).astype(np.int64)
+
+    # 每个采样点画成 2x2 的方块, 填补采样间隙
+    px = np.clip(np.concatenate([px, px + 1, px, px + 1]), 0, size - 1)
+    py = np.clip(np.concatenate([py, py, py + 1, py + 1]), 0, size - 1)
+    depth = np.tile(points[:, 2], 4)
+    colors = np.tile(colors, (4, 1))
+    pixel = py * size + px
+
+    # 每个像素保留离相机最近 (z 最大) 的采样点
+    order = np.lexsort((-depth, pixel))
+    first = np.unique(pixel[order], return_index=True)[1]
+    winners = order[first]
+
+    image = np.zeros((size * size, 4), dtype=np.uint8)
+    image[pixel[winners], :3] = colors[winners]
+    image[pixel[winners], 3] = 255
+    _save_image(Image.fromarray(image.reshape(size, size, 4), 'RGBA'), out_path, optimize=True)
+    return os.path.basename(out_path)
+
+
+def process_model(job_folder):
+    start = time.perf_counter()
+    objs = glob.glob(os.path.join(job_folder, '*.obj'))
+    if not objs:
+        return None
+    mtls = [p for p in glob.glob(os.path.join(job_folder, '*.mtl')) if not p.endswith('.webp.mtl')]
+    with open(objs[0], 'rb') as f:
+        vertices = build_vertices(parse_obj(f.read()), keep_normals=False)
+    texture = read_texture_from_mtl(mtls[0] if mtls else None)
+    mipmaps = build_mipmaps(job_folder, texture)
+
+    triangle_count = len(vertices['indices']) // 3
+    lods = []
+    for level, ratio, texture_size in LOD_LEVELS:
+        simplified = simplify(vertices, int(triangle_count * ratio))
+        name = f'model_lod{level}.glb'
+        texture_uri = mipmaps.get(texture_size, texture)
+        # 纹理优化 (textures.py) 先完成时同名 WebP 已经存在; 否则由它完成后补上
+        write_glb(os.path.join(job_folder, name), quantize(simplified), texture_uri,
+                  webp_variant(job_folder, texture_uri))
+        lods.append({'level': level, 'file': name, 'triangles': len(simplified['indices']) // 3})
+
+    thumbnail = render_thumbnail(vertices, os.path.join(job_folder, texture) if texture else None,
+                                 os.path.join(job_folder, THUMBNAIL_NAME))
+    return {
+        'lods': lods,
+        'textures': {str(k): v for k, v in mipmaps.items()},
+        'thumbnail': thumbnail,
+        'seconds': round(time.perf_counter() - start, 3),
+    }
+
+
+if __name__ == '__main__':
+    # python lod.py static/models/<job_id>
+    print(json.dumps(process_model(sys.argv[1]), indent=2))
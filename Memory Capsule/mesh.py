@@ -0,0 +1,317 @@
+import os
+import re
+import sys
+import json
+import struct
+import time
+import uuid
+
+import numpy as np
+
+# OBJ -> GLB 转换 (KHR_mesh_quantization)
+# - 顶点坐标量化为 uint16, 通过节点的 translation/scale 还原
+# - UV 量化为归一化 uint16, 法线量化为归一化 int8
+# - 三角形使用索引, 顶点数小于 65536 时索引为 uint16
+# - 解析全部用 NumPy 批量完成, 不逐行循环
+# 纹理以相对路径引用 (与 OBJ/MTL 共用 material_0.png), 不嵌入 GLB;
+# 有同名 WebP (textures.py 生成) 时通过 EXT_texture_webp 优先使用, 不支持 WebP 的加载器退回 PNG
+
+GLB_NAME = 'model.glb'
+
+GLB_MAGIC = 0x46546C67
+CHUNK_JSON = 0x4E4F534A
+CHUNK_BIN = 0x004E4942
+
+FLOAT = 5126
+BYTE = 5120
+UNSIGNED_SHORT = 5123
+UNSIGNED_INT = 5125
+ARRAY_BUFFER = 34962
+ELEMENT_ARRAY_BUFFER = 34963
+WEBP_EXTENSION = 'EXT_texture_webp'
+
+
+def _numbers(lines, columns):
+    # 每行的分量个数以第一行为准, 只取前 columns 个 (忽略 v 的顶点颜色, vt 的 w)
+    if not lines:
+        return np.zeros((0, columns), dtype=np.float32)
+    width = len(lines[0].split())
+    values = np.array(b' '.join(lines).split(), dtype=np.float32)
+    if width < columns or values.size % width:
+        raise ValueError('Inconsistent vertex data in OBJ')
+    return values.reshape(-1, width)[:, :columns]
+
+
+def _resolve(indices, count):
+    # OBJ 索引从 1 开始, 负数表示倒数
+    return np.where(indices < 0, indices + count, indices - 1)
+
+
+def parse_obj(data):
+    positions = _numbers(re.findall(rb'^v[ \t]+(.*?)\s*$', data, re.M), 3)
+    uvs = _numbers(re.findall(rb'^vt[ \t]+(.*?)\s*$', data, re.M), 2)
+    normals = _numbers(re.findall(rb'^vn[ \t]+(.*?)\s*$', data, re.M), 3)
+    faces = re.findall(rb'^f[ \t]+(.*?)\s*$', data, re.M)
+    if not faces:
+        raise ValueError('OBJ has no faces')
+
+    # 只支持三角面 (混元输出均为三角面)
+    first = faces[0].split()
+    if len(first) != 3:
+        raise ValueError('Only triangulated OBJ files are supported')
+    corner = first[0]
+    if b'//' in corner:
+        layout = ('v', 'vn')
+    else:
+        layout = ('v', 'vt', 'vn')[:corner.count(b'/') + 1]
+
+    flat = b' '.join(faces).replace(b'//', b' ').replace(b'/', b' ').split()
+    indices = np.array(flat, dtype=np.int64)
+    if indices.size != len(faces) * 3 * len(layout):
+        raise ValueError('Mixed face formats are not supported')
+    indices = indices.reshape(-1, len(layout))
+
+    mesh = {'positions': positions, 'v': _resolve(indices[:, 0], len(positions))}
+    if 'vt' in layout:
+        mesh['uvs'] = uvs
+        mesh['vt'] = _resolve(indices[:, layout.index('vt')], len(uvs))
+    if 'vn' in layout:
+        mesh['normals'] = normals
+        mesh['vn'] = _resolve(indices[:, layout.index('vn')], len(normals))
+    mesh['face_count'] = len(faces)
+    return mesh
+
+
+def build_vertices(mesh, keep_normals=None):
+    # 按 (v, vt[, vn]) 组合去重, 生成索引三角形
+    # 法线几乎一面一条 (平面着色) 时丢弃法线, three.js 会自动使用 flatShading
+    if keep_normals is None:
+        keep_normals = 'vn' in mesh and len(mesh['normals']) < mesh['face_count'] * 0.9
+    keep_normals = keep_normals and 'vn' in mesh
+
+    key = mesh['v'].copy()
+    if 'vt' in mesh:
+        key = key * len(mesh['uvs']) + mesh['vt']
+    if keep_normals:
+        key = key * len(mesh['normals']) + mesh['vn']
+    unique_keys, first, inverse = np.unique(key, return_index=True, return_inverse=True)
+
+    vertices = {'positions': mesh['positions'][mesh['v'][first]]}
+    if 'vt' in mesh:
+        vertices['uvs'] = mesh['uvs'][mesh['vt'][first]]
+    if keep_normals:
+        vertices['normals'] = mesh['normals'][mesh['vn'][first]]
+    vertices['indices'] = inverse.reshape(-1)
+    return vertices
+
+
+def quantize(vertices):
+    positions = vertices['positions']
+    origin = positions.min(axis=0)
+    extent = float((positions.max(axis=0) - origin).max()) or 1.0
+    scale = extent / 65535.0
+    q_positions = np.zeros((len(positions), 4), dtype=np.uint16)  # 每个元素按 4 字节对齐
+    q_positions[:, :3] = np.round((positions - origin) / scale).astype(np.uint16)
+
+    out = {
+        'positions': q_positions,
+        'translation': origin.astype(float).tolist(),
+        'scale': [scale] * 3,
+    }
+
+    if 'uvs' in vertices:
+        uvs = vertices['uvs'].copy()
+        uvs[:, 1] = 1.0 - uvs[:, 1]  # glTF 的 UV 原点在左上角
+        if uvs.min() >= 0.0 and uvs.max() <= 1.0:
+            out['uvs'] = np.round(uvs * 65535).astype(np.uint16)
+        else:
+            out['uvs'] = uvs.astype(np.float32)
+
+    if 'normals' in vertices:
+        normals = vertices['normals']
+        lengths = np.linalg.norm(normals, axis=1, keepdims=True)
+        normals = normals / np.where(lengths == 0, 1, lengths)
+        q_normals = np.zeros((len(normals), 4), dtype=np.int8)
+        q_normals[:, :3] = np.round(normals * 127).astype(np.int8)
+        out['normals'] = q_normals
+
+    indices = vertices['indices']
+    out['indices'] = indices.astype(np.uint16 if len(positions) < 65536 else np.uint32)
+    return out
+
+
+def read_texture_from_mtl(mtl_path):
+    if not mtl_path or not os.path.exists(mtl_path):
+        return None
+    with open(mtl_path, 'r', encoding='utf-8', errors='ignore') as f:
+        for line in f:
+            parts = line.strip().split(None, 1)
+            if len(parts) == 2 and parts[0] == 'map_Kd':
+                return parts[1].strip()
+    return None
+
+
+def webp_variant(folder, texture_uri):
+    # material_0.png -> material_0.webp, material_0_1024.png -> material_0_1024.webp (存在时)
+    if not texture_uri or not texture_uri.lower().endswith('.png'):
+        return None
+    name = texture_uri[:-len('.png')] + '.webp'
+    return name if os.path.exists(os.path.join(folder, name)) else None
+
+
+def _add_webp(gltf, texture, webp_uri):
+    images = gltf.setdefault('images', [])
+    images.append({'uri': webp_uri})
+    texture.setdefault('extensions', {})[WEBP_EXTENSION] = {'source': len(images) - 1}
+    if WEBP_EXTENSION not in gltf['extensionsUsed']:
+        gltf['extensionsUsed'].append(WEBP_EXTENSION)
+
+
+def _write_chunks(path, gltf, buffer):
+    json_chunk = json.dumps(gltf, separators=(',', ':')).encode('utf-8')
+    json_chunk += b' ' * (-len(json_chunk) % 4)
+    total = 12 + 8 + len(json_chunk) + 8 + len(buffer)
+    # 先写临时文件再替换: 目标可能是资源存储中的硬链接, 不能原地覆盖;
+    # LOD 进程和纹理优化可能同时改写同一个 GLB, 临时文件名各不相同
+    tmp_path = f'{path}.{uuid.uuid4().hex[:8]}.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(struct.pack('<III', GLB_MAGIC, 2, total))
+        f.write(struct.pack('<II', len(json_chunk), CHUNK_JSON))
+        f.write(json_chunk)
+        f.write(struct.pack('<II', len(buffer), CHUNK_BIN))
+        f.write(buffer)
+    os.replace(tmp_path, path)
+    return total
+
+
+def read_glb(path):
+    # 返回 (glTF JSON, BIN chunk)
+    with open(path, 'rb') as f:
+        data = f.read()
+    magic, _, _ = struct.unpack_from('<III', data, 0)
+    json_length, chunk_type = struct.unpack_from('<II', data, 12)
+    if magic != GLB_MAGIC or chunk_type != CHUNK_JSON:
+        raise ValueError(f'Not a GLB file: {path}')
+    gltf = json.loads(data[20:20 + json_length])
+    offset = 20 + json_length
+    buffer = b''
+    if offset + 8 <= len(data):
+        bin_length, chunk_type = struct.unpack_from('<II', data, offset)
+        if chunk_type == CHUNK_BIN:
+            buffer = data[offset + 8:offset + 8 + bin_length]
+    return gltf, buffer
+
+
+def link_webp(path):
+    # 给已有 GLB 中引用 PNG 的纹理补上 WebP (文件存在时), 返回是否修改了文件
+    gltf, buffer = read_glb(path)
+    folder = os.path.dirname(path)
+    images = gltf.get('images', [])
+    changed = False
+    for texture in gltf.get('textures', []):
+        if WEBP_EXTENSION in texture.get('extensions', {}):
+            continue
+        webp_uri = webp_variant(folder, images[texture['source']].get('uri'))
+        if webp_uri:
+            _add_webp(gltf, texture, webp_uri)
+            changed = True
+    if changed:
+        _write_chunks(path, gltf, buffer)
+    return changed
+
+
+def write_glb(path, q, texture_uri=None, webp_uri=None):
+    buffer = bytearray()
+    buffer_views = []
+    accessors = []
+
+    def add_view(array, target, stride=None):
+        while len(buffer) % 4:
+            buffer.append(0)
+        view = {'buffer': 0, 'byteOffset': len(buffer), 'byteLength': array.nbytes, 'target': target}
+        if stride:
+            view['byteStride'] = stride
+        buffer.extend(array.tobytes())
+        buffer_views.append(view)
+        return len(buffer_views) - 1
+
+    def add_accessor(view, component_type, count, type_, normalized=False, **extra):
+        accessor = {'bufferView': view, 'componentType': component_type, 'count': count, 'type': type_}
+        if normalized:
+            accessor['normalized'] = True
+        accessor.update(extra)
+        accessors.append(accessor)
+        return len(accessors) - 1
+
+    positions = q['positions']
+    attributes = {
+        'POSITION': add_accessor(
+            add_view(positions, ARRAY_BUFFER, stride=8), UNSIGNED_SHORT, len(positions), 'VEC3',
+            min=positions[:, :3].min(axis=0).tolist(), max=positions[:, :3].max(axis=0).tolist()),
+    }
+    if 'normals' in q:
+        attributes['NORMAL'] = add_accessor(
+            add_view(q['normals'], ARRAY_BUFFER, stride=4), BYTE, len(q['normals']), 'VEC3', normalized=True)
+    if 'uvs' in q:
+        uvs = q['uvs']
+        if uvs.dtype == np.uint16:
+            attributes['TEXCOORD_0'] = add_accessor(
+                add_view(uvs, ARRAY_BUFFER, stride=4), UNSIGNED_SHORT, len(uvs), 'VEC2', normalized=True)
+        else:
+            attributes['TEXCOORD_0'] = add_accessor(
+                add_view(uvs, ARRAY_BUFFER, stride=8), FLOAT, len(uvs), 'VEC2')
+    indices = q['indices']
+    index_type = UNSIGNED_SHORT if indices.dtype == np.uint16 else UNSIGNED_INT
+    index_accessor = add_accessor(add_view(indices, ELEMENT_ARRAY_BUFFER), index_type, len(indices), 'SCALAR')
+
+    material = {'pbrMetallicRoughness': {'metallicFactor': 0.0, 'roughnessFactor': 1.0}}
+    gltf = {
+        'asset': {'version': '2.0', 'generator': 'Memory Capsule mesh.py'},
+        'extensionsUsed': ['KHR_mesh_quantization'],
+        'extensionsRequired': ['KHR_mesh_quantization'],
+        'scene': 0,
+        'scenes': [{'nodes': [0]}],
+        'nodes': [{'mesh': 0, 'translation': q['translation'], 'scale': q['scale']}],
+        'meshes': [{'primitives': [{'attributes': attributes, 'indices': index_accessor, 'material': 0}]}],
+        'materials': [material],
+        'accessors': accessors,
+        'bufferViews': buffer_views,
+    }
+    if texture_uri and 'uvs' in q:
+        gltf['images'] = [{'uri': texture_uri}]
+        gltf['samplers'] = [{'magFilter': 9729, 'minFilter': 9987, 'wrapS': 10497, 'wrapT': 10497}]
+        gltf['textures'] = [{'source': 0, 'sampler': 0}]
+        material['pbrMetallicRoughness']['baseColorTexture'] = {'index': 0}
+        if webp_uri:
+            _add_webp(gltf, gltf['textures'][0], webp_uri)
+
+    while len(buffer) % 4:
+        buffer.append(0)
+    gltf['buffers'] = [{'byteLength': len(buffer)}]
+    return _write_chunks(path, gltf, buffer)
+
+
+def convert_obj_to_glb(obj_path, glb_path, mtl_path=None):
+    start = time.perf_counter()
+    with open(obj_path, 'rb') as f:
+        data = f.read()
+    mesh = parse_obj(data)
+    vertices = build_vertices(mesh)
+    q = quantize(vertices)
+    texture = read_texture_from_mtl(mtl_path)
+    size = write_glb(glb_path, q, texture, webp_variant(os.path.dirname(glb_path), texture))
+    return {
+        'obj_bytes': len(data),
+        'glb_bytes': size,
+        'vertices': len(q['positions']),
+        'triangles': len(q['indices']) // 3,
+        'seconds': time.perf_counter() - start,
+    }
+
+
+if __name__ == '__main__':
+    # python mesh.py model.obj [material.mtl]
+    obj = sys.argv[1]
+    mtl = sys.argv[2] if len(sys.argv) > 2 else None
+    stats = convert_obj_to_glb(obj, os.path.join(os.path.dirname(obj), GLB_NAME), mtl)
+    print(json.dumps(stats, indent=2))
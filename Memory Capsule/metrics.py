@@ -0,0 +1,349 @@
+import os
+import time
+import bisect
+import logging
+import threading
+import contextvars
+
+try:
+    from opentelemetry import trace as otel_trace
+except ImportError:  # 没有 opentelemetry-api 时只能用 LogTracer 或自定义 tracer
+    otel_trace = None
+
+# 进程内指标和追踪
+# - Counter / Histogram 按标签值 .labels(...) 取子序列, /metrics 以 Prometheus 文本格式导出
+# - 已有的统计对象 (轮询器、图片缓存等) 通过 collector 在导出时读取, 不重复计数
+# - span(name, histogram) 记录耗时; 设置了 tracer 时同时开始/结束一个追踪 span
+# METRICS_ENABLED=0 时 labels() 返回共享的空对象, span() 在没有 tracer 时返回共享的空上下文, 开销只有一次判断
+
+ENABLED = os.environ.get('METRICS_ENABLED', '1') != '0'
+PREFIX = 'memory_capsule_'
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+logger = logging.getLogger(__name__)
+
+
+class _Noop:
+    # 关闭指标时所有记录操作都落到这里
+    def inc(self, amount=1):
+        pass
+
+    def observe(self, value):
+        pass
+
+    def time(self):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+NOOP = _Noop()
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in pairs)
+    return '{' + ','.join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _CounterChild:
+    __slots__ = ('_lock', 'value')
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.value = 0
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+
+class Counter:
+    kind = 'counter'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._lock = threading.Lock()
+
+    def labels(self, *values):
+        if not ENABLED:
+            return NOOP
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(values, _CounterChild())
+        return child
+
+    def inc(self, amount=1):
+        self.labels().inc(amount)
+
+    def samples(self):
+        with self._lock:
+            children = list(self._children.items())
+        for values, child in sorted(children):
+            yield self.name, _format_labels(self.labelnames, values), child.value
+
+
+class _HistogramChild:
+    __slots__ = ('_lock', 'buckets', 'counts', 'sum', 'count')
+
+    def __init__(self, buckets):
+        self._lock = threading.Lock()
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+    def time(self):
+        return _Timer(self)
+
+
+class _Timer:
+    __slots__ = ('child', 'start')
+
+    def __init__(self, child):
+        self.child = child
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.child.observe(time.perf_counter() - self.start)
+        return False
+
+
+class Histogram:
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._children = {}
+        self._lock = threading.Lock()
+
+    def labels(self, *values):
+        if not ENABLED:
+            return NOOP
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(values, _HistogramChild(self.buckets))
+        return child
+
+    def observe(self, value):
+        self.labels().observe(value)
+
+    def samples(self):
+        with self._lock:
+            children = list(self._children.items())
+        for values, child in sorted(children):
+            with child._lock:
+                counts, total, count = list(child.counts), child.sum, child.count
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float('inf'),), counts):
+                cumulative += n
+                yield (self.name + '_bucket',
+                       _format_labels(self.labelnames, values, [('le', _format_value(float(bound)))]), cumulative)
+            yield self.name + '_sum', _format_labels(self.labelnames, values), total
+            yield self.name + '_count', _format_labels(self.labelnames, values), count
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, cls, name, documentation, labelnames, **kwargs):
+        # 同名指标只创建一次, 多个模块可以共用 (例如外部 API 耗时)
+        name = PREFIX + name
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, documentation, labelnames, **kwargs)
+            elif not isinstance(metric, cls) or metric.labelnames != tuple(labelnames):
+                raise ValueError(f'Metric {name} already registered with a different type or labels')
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._get_or_create(Counter, name, documentation, labelnames)
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._get_or_create(Histogram, name, documentation, labelnames, buckets=buckets)
+
+    def add_collector(self, collect):
+        # collect() 返回 [(名称, 类型 gauge/counter, 说明, [(标签 dict, 值), ...]), ...], 导出时调用
+        with self._lock:
+            self._collectors.append(collect)
+
+    def render(self):
+        lines = []
+        with self._lock:
+            metrics = sorted(self._metrics.values(), key=lambda m: m.name)
+            collectors = list(self._collectors)
+        for metric in metrics:
+            lines.append(f'# HELP {metric.name} {metric.documentation}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            lines.extend(f'{name}{labels} {_format_value(value)}' for name, labels, value in metric.samples())
+        for collect in collectors:
+            try:
+                families = collect()
+            except Exception:
+                logger.exception('metrics collector failed')
+                continue
+            for name, kind, documentation, samples in families:
+                name = PREFIX + name
+                lines.append(f'# HELP {name} {documentation}')
+                lines.append(f'# TYPE {name} {kind}')
+                for labels, value in samples:
+                    lines.append(f'{name}{_format_labels(list(labels), list(labels.values()))} {_format_value(value)}')
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+counter = REGISTRY.counter
+histogram = REGISTRY.histogram
+
+# 进程内共用的指标
+EXTERNAL_API_SECONDS = histogram('external_api_seconds', 'Latency of calls to external APIs',
+                                 ('api', 'operation'))
+EXTERNAL_API_ERRORS = counter('external_api_errors_total', 'Failed calls to external APIs',
+                              ('api', 'operation'))
+
+
+# --- 追踪 ---
+# tracer 接口: start_span(name, attributes, parent) 返回带 end(error=None) 方法的对象;
+# parent 是同一线程中外层 span 的返回值 (或 None)
+
+_tracer = None
+_current_span = contextvars.ContextVar('memory_capsule_span', default=None)
+
+
+def set_tracer(tracer):
+    global _tracer
+    _tracer = tracer
+
+
+def get_tracer():
+    return _tracer
+
+
+class LogTracer:
+    # 把每个 span 的耗时写到 DEBUG 日志, 不需要额外依赖
+    def __init__(self, log=None):
+        self.log = log or logging.getLogger('memory_capsule.trace')
+
+    def start_span(self, name, attributes, parent=None):
+        return _LogSpan(self.log, name, attributes, parent)
+
+
+class _LogSpan:
+    def __init__(self, log, name, attributes, parent):
+        self.log = log
+        self.name = name if parent is None else f'{parent.name}/{name}'
+        self.attributes = attributes
+        self.start = time.perf_counter()
+
+    def end(self, error=None):
+        if self.log.isEnabledFor(logging.DEBUG):
+            fields = ' '.join(f'{k}={v}' for k, v in self.attributes.items())
+            self.log.debug('span name=%s seconds=%.4f error=%s %s', self.name,
+                           time.perf_counter() - self.start, type(error).__name__ if error else None, fields)
+
+
+class OpenTelemetryTracer:
+    # 转给 opentelemetry-api; exporter 由部署方按 OpenTelemetry 的方式配置
+    def __init__(self, name='memory-capsule'):
+        if otel_trace is None:
+            raise RuntimeError('opentelemetry-api is not installed')
+        self._tracer = otel_trace.get_tracer(name)
+
+    def start_span(self, name, attributes, parent=None):
+        context = otel_trace.set_span_in_context(parent.span) if parent is not None else None
+        return _OtelSpan(self._tracer.start_span(name, context=context, attributes=attributes))
+
+
+class _OtelSpan:
+    def __init__(self, span):
+        self.span = span
+
+    def end(self, error=None):
+        if error is not None:
+            self.span.record_exception(error)
+            self.span.set_status(otel_trace.Status(otel_trace.StatusCode.ERROR, str(error)))
+        self.span.end()
+
+
+class _Span:
+    __slots__ = ('name', 'histogram', 'errors', 'attributes', 'start', 'handle', 'token')
+
+    def __init__(self, name, histogram, errors, attributes):
+        self.name = name
+        self.histogram = histogram
+        self.errors = errors
+        self.attributes = attributes
+
+    def __enter__(self):
+        self.handle = self.token = None
+        tracer = _tracer
+        if tracer is not None:
+            try:
+                self.handle = tracer.start_span(self.name, self.attributes, _current_span.get())
+                self.token = _current_span.set(self.handle)
+            except Exception:
+                logger.exception('tracer failed to start span %s', self.name)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        seconds = time.perf_counter() - self.start
+        if self.histogram is not None:
+            self.histogram.observe(seconds)
+        if exc is not None and self.errors is not None:
+            self.errors.inc()
+        if self.handle is not None:
+            _current_span.reset(self.token)
+            try:
+                self.handle.end(exc)
+            except Exception:
+                logger.exception('tracer failed to end span %s', self.name)
+        return False
+
+
+def span(name, histogram=None, errors=None, **attributes):
+    # histogram / errors 为 .labels(...) 取得的子序列; 指标关闭且没有 tracer 时什么都不做
+    if _tracer is None:
+        if not ENABLED or histogram is None:
+            return NOOP
+    return _Span(name, histogram, errors, attributes)
+
+
+def api_call(api, operation, **attributes):
+    # 外部 API 调用的耗时和失败次数
+    return span(f'{api}.{operation}', EXTERNAL_API_SECONDS.labels(api, operation),
+                EXTERNAL_API_ERRORS.labels(api, operation), api=api, operation=operation, **attributes)
@@ -0,0 +1,279 @@
+import time
+import heapq
+import random
+import bisect
+import logging
+import threading
+
+import metrics
+
+# 共享轮询器: 所有未完成的混元任务由一个线程统一查询
+# - 同一个 JobId 不论有多少等待者, 每轮只查询一次 (合并查询)
+# - 根据历史完成耗时自适应退避, 并加入随机抖动, 避免所有任务同时打到 API
+# - 令牌桶限速, 遇到限流错误时整体暂停
+
+DONE_STATUSES = ('DONE', 'SUCCESS')
+FAILED_STATUSES = ('FAILED', 'FAIL')
+TIMEOUT = 'TIMEOUT'
+
+logger = logging.getLogger(__name__)
+
+POLLS = metrics.counter('poll_requests_total', 'QueryHunyuanTo3DJob calls, by returned status', ('status',))
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = list(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.total += value
+        self.count += 1
+
+    def snapshot(self):
+        cumulative = 0
+        buckets = {}
+        for bound, n in zip(self.buckets + ['+Inf'], self.counts):
+            cumulative += n
+            buckets[str(bound)] = cumulative
+        return {'buckets': buckets, 'count': self.count, 'sum': round(self.total, 3)}
+
+
+class TokenBucket:
+    def __init__(self, rate, burst=None, clock=time.monotonic):
+        self.rate = rate
+        self.capacity = burst or max(1.0, rate)
+        self.tokens = self.capacity
+        self.clock = clock
+        self.updated = clock()
+
+    def delay(self):
+        # 返回还需要等待多少秒才能拿到一个令牌, 0 表示已拿到
+        now = self.clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0
+        return (1 - self.tokens) / self.rate
+
+
+def is_rate_limit_error(err):
+    code = getattr(err, 'code', None) or getattr(err, 'get_code', lambda: None)()
+    return bool(code) and ('LimitExceeded' in str(code) or 'RequestLimit' in str(code))
+
+
+class _Watch:
+    def __init__(self, job_id, started_at):
+        self.job_id = job_id
+        self.started_at = started_at
+        self.callbacks = []
+        self.status_callbacks = []
+        self.status = None
+        self.polls = 0
+        self.errors = 0
+
+
+class JobPoller:
+    def __init__(self, client_factory, min_interval=2.0, max_interval=30.0, max_wait=300.0,
+                 max_rps=5.0, jitter=0.2, clock=time.monotonic, wall_clock=time.time):
+        self.client_factory = client_factory
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.max_wait = max_wait
+        self.jitter = jitter
+        self.clock = clock
+        self.wall_clock = wall_clock
+        self.bucket = TokenBucket(max_rps, clock=clock)
+
+        self._client = None
+        self._watches = {}
+        self._heap = []
+        self._cond = threading.Condition()
+        self._thread = None
+        self._stopped = False
+        self._paused_until = 0
+
+        self._durations = []
+        self.poll_count = 0
+        self.error_count = 0
+        self.rate_limited_count = 0
+        self.completed = {'DONE': 0, 'FAILED': 0, TIMEOUT: 0}
+        self.time_to_complete = Histogram([5, 10, 20, 30, 45, 60, 90, 120, 180, 300, 600])
+        self.polls_per_job = Histogram([1, 2, 3, 5, 8, 13, 21, 34, 60])
+
+    # --- public API ---
+
+    def watch(self, job_id, callback, started_at=None, on_status=None):
+        # started_at 为提交时间 (wall clock), 重启恢复时用于计算已等待时长;
+        # on_status(status) 在远端状态变化 (如 WAIT -> RUN) 但还没结束时调用
+        with self._cond:
+            w = self._watches.get(job_id)
+            if w is None:
+                elapsed = self.wall_clock() - started_at if started_at else 0
+                w = _Watch(job_id, self.clock() - max(0, elapsed))
+                self._watches[job_id] = w
+                heapq.heappush(self._heap, (self.clock() + self._next_delay(w), job_id))
+            w.callbacks.append(callback)
+            if on_status:
+                w.status_callbacks.append(on_status)
+            self._cond.notify()
+        self.start()
+
+    def wait(self, job_id, timeout=None, started_at=None):
+        # 阻塞等待某个任务结束, 返回 (status, data)
+        done = threading.Event()
+        result = {}
+
+        def on_complete(status, data):
+            result['value'] = (status, data)
+            done.set()
+
+        self.watch(job_id, on_complete, started_at=started_at)
+        if not done.wait(timeout):
+            return TIMEOUT, {}
+        return result['value']
+
+    def pending(self):
+        with self._cond:
+            return list(self._watches)
+
+    def start(self):
+        with self._cond:
+            if self._thread is None or not self._thread.is_alive():
+                self._stopped = False
+                self._thread = threading.Thread(target=self._loop, name='job-poller', daemon=True)
+                self._thread.start()
+
+    def stop(self):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify()
+        if self._thread:
+            self._thread.join()
+
+    def stats(self):
+        with self._cond:
+            return {
+                'pending': len(self._watches),
+                'polls': self.poll_count,
+                'errors': self.error_count,
+                'rate_limited': self.rate_limited_count,
+                'completed': dict(self.completed),
+                'expected_duration': self._expected_duration(),
+                'time_to_complete_seconds': self.time_to_complete.snapshot(),
+                'polls_per_job': self.polls_per_job.snapshot(),
+            }
+
+    # --- scheduling ---
+
+    def _expected_duration(self):
+        if not self._durations:
+            return None
+        ordered = sorted(self._durations)
+        return ordered[len(ordered) // 2]
+
+    def _next_delay(self, w):
+        elapsed = self.clock() - w.started_at
+        expected = self._expected_duration()
+        if expected and elapsed < expected:
+            # 还没到典型完成时间: 等到剩余时间的一半再查, 越接近越密
+            delay = max(self.min_interval, (expected - elapsed) / 2)
+        else:
+            # 没有历史数据, 或已经超过典型耗时: 指数退避
+            overdue_polls = w.polls if not expected else max(0, w.polls - 1)
+            delay = self.min_interval * (1.5 ** min(overdue_polls, 20))
+        delay = min(delay, self.max_interval)
+        return delay * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+    def _next_due(self):
+        # 调用方持有 self._cond; 返回 (到期的任务, None), 或 (None, 还要等待的秒数, None 表示等到有新任务)
+        while self._heap:
+            due, job_id = self._heap[0]
+            wake_at = max(due, self._paused_until)
+            now = self.clock()
+            if wake_at > now:
+                return None, wake_at - now
+            limit_delay = self.bucket.delay()
+            if limit_delay:
+                return None, limit_delay
+            heapq.heappop(self._heap)
+            w = self._watches.get(job_id)
+            if w is not None:
+                return w, None
+        return None, None
+
+    def _loop(self):
+        while True:
+            with self._cond:
+                if self._stopped:
+                    return
+                w, wait = self._next_due()
+                if w is None:
+                    self._cond.wait(wait)
+                    continue
+            self._poll_one(w)
+
+    def _poll_one(self, w):
+        try:
+            if self._client is None:
+                self._client = self.client_factory()
+            with metrics.api_call('hunyuan', 'QueryHunyuanTo3DJob', job_id=w.job_id):
+                response = self._client.call_json("QueryHunyuanTo3DJob", {"JobId": w.job_id})
+            data = response.get("Response", {})
+            status = data.get("Status")
+            error = None
+        except Exception as e:
+            data, status, error = {}, None, e
+
+        POLLS.labels(status or ('error' if error is not None else 'unknown')).inc()
+        if error is not None:
+            logger.warning('poll job=%s error=%r', w.job_id, error)
+        with self._cond:
+            w.polls += 1
+            self.poll_count += 1
+            elapsed = self.clock() - w.started_at
+            if error is not None:
+                self.error_count += 1
+                w.errors += 1
+                if is_rate_limit_error(error):
+                    self.rate_limited_count += 1
+                    self._paused_until = self.clock() + self.max_interval
+            status_callbacks = []
+            if status in DONE_STATUSES:
+                final = 'DONE'
+                self._durations.append(elapsed)
+                self._durations = self._durations[-100:]
+            elif status in FAILED_STATUSES:
+                final = 'FAILED'
+            elif elapsed > self.max_wait:
+                final = TIMEOUT
+            else:
+                final = None
+                heapq.heappush(self._heap, (self.clock() + self._next_delay(w), w.job_id))
+                if status is not None and status != w.status:
+                    w.status = status
+                    status_callbacks = list(w.status_callbacks)
+            if final is not None:
+                del self._watches[w.job_id]
+                self.completed[final] += 1
+                self.time_to_complete.observe(elapsed)
+                self.polls_per_job.observe(w.polls)
+                callbacks = list(w.callbacks)
+
+        # 回调在轮询线程中执行, 耗时操作应交给其他线程池
+        if final is None:
+            for callback in status_callbacks:
+                try:
+                    callback(status)
+                except Exception:
+                    logger.exception('status callback failed job=%s', w.job_id)
+            return
+        for callback in callbacks:
+            try:
+                callback(final, data)
+            except Exception:
+                logger.exception('completion callback failed job=%s', w.job_id)
@@ -0,0 +1,313 @@
+import os
+import ssl
+import json
+import glob
+import time
+import uuid
+import base64
+import random
+import zipfile
+import argparse
+import threading
+import itertools
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# 本地 stub / 模拟器, 代替腾讯云 CommonClient 和 Vector Engine, 便于离线开发、测试和压测
+# 启动方式: HUNYUAN_STUB=1 python app.py
+# 混元模拟器的参数可以用环境变量设置 (见 StubHunyuanClient.from_env)
+# Vector Engine 模拟器: python stubs.py vector-engine --port 8001 --latency 0.5, 再设置 VECTOR_ENGINE_BASE_URL
+
+SAMPLE_ZIP = os.path.join('static', 'models', '1391423262294409216', 'model.zip')
+SAMPLE_IMAGE = os.path.join('static', 'uploads', 'gen_1765683303.png')
+
+
+def build_result_zips(models_dir, dest_dir):
+    # 把示例模型打包成混元返回的结果压缩包 (OBJ + MTL + MTL 引用的贴图), 返回压缩包路径列表;
+    # 生成的 GLB/LOD/WebP 等文件不打包
+    from textures import mtl_textures, ALTERNATE_MTL_SUFFIX
+    os.makedirs(dest_dir, exist_ok=True)
+    zips = []
+    for folder in sorted(glob.glob(os.path.join(models_dir, '*'))):
+        objs = [p for p in glob.glob(os.path.join(folder, '*.obj')) if not os.path.basename(p).startswith('lod')]
+        mtls = [p for p in glob.glob(os.path.join(folder, '*.mtl')) if not p.endswith(ALTERNATE_MTL_SUFFIX)]
+        if not objs:
+            continue
+        names = [os.path.basename(objs[0])]
+        if mtls:
+            names.append(os.path.basename(mtls[0]))
+            names += [n for n in mtl_textures(mtls[0]) if os.path.isfile(os.path.join(folder, n))]
+        zip_path = os.path.join(dest_dir, os.path.basename(folder) + '.zip')
+        with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as z:
+            for name in names:
+                z.write(os.path.join(folder, name), name)
+        zips.append(os.path.abspath(zip_path))
+    return zips
+
+
+class StubHunyuanClient:
+    def __init__(self, result_zip=SAMPLE_ZIP, job_duration=3.0, fail=False, latency=0.0, fail_rate=0.0,
+                 seed=0):
+        # job_duration 可以是数字, 也可以是按提交顺序循环使用的耗时脚本, 如 [2, 10, 30]
+        # result_zip 可以是一个路径或路径列表 (按提交顺序循环使用)
+        # latency: 每次 API 调用的网络延迟, 秒数或 (最小, 最大) 区间; fail_rate: 任务以 FAILED 结束的概率
+        zips = [result_zip] if isinstance(result_zip, str) else list(result_zip)
+        self.result_zip = os.path.abspath(zips[0])
+        self._zips = itertools.cycle([os.path.abspath(z) for z in zips])
+        if isinstance(job_duration, (int, float)):
+            job_duration = [job_duration]
+        self._durations = itertools.cycle(job_duration)
+        self.default_duration = job_duration[0]
+        self.fail = fail
+        self.latency = latency
+        self.fail_rate = fail_rate
+        self._random = random.Random(seed)
+        self.calls = []
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls, environ=os.environ):
+        # HUNYUAN_STUB_DURATION=3 (逗号分隔为循环脚本), HUNYUAN_STUB_LATENCY=0.05 (或 0.02,0.2 区间),
+        # HUNYUAN_STUB_FAIL_RATE=0.1, HUNYUAN_STUB_RESULTS=<结果压缩包目录, 或 samples 表示由示例模型生成>
+        def numbers(name, default):
+            value = environ.get(name)
+            return [float(v) for v in value.split(',')] if value else default
+
+        duration = numbers('HUNYUAN_STUB_DURATION', [3.0])
+        latency = numbers('HUNYUAN_STUB_LATENCY', [0.0])
+        results = environ.get('HUNYUAN_STUB_RESULTS')
+        if results == 'samples':
+            zips = build_result_zips(os.path.join('static', 'models'), os.path.join('data', 'stub_results'))
+        elif results:
+            zips = sorted(glob.glob(os.path.join(results, '*.zip')))
+        else:
+            zips = [SAMPLE_ZIP]
+        return cls(zips or [SAMPLE_ZIP], job_duration=duration,
+                   latency=tuple(latency) if len(latency) > 1 else latency[0],
+                   fail_rate=float(environ.get('HUNYUAN_STUB_FAIL_RATE') or 0))
+
+    def _sleep(self):
+        latency = self.latency
+        if isinstance(latency, (tuple, list)):
+            with self._lock:
+                latency = self._random.uniform(*latency)
+        if latency:
+            time.sleep(latency)
+
+    def call_json(self, action, params):
+        with self._lock:
+            self.calls.append(action)
+        self._sleep()
+        if action == "SubmitHunyuanTo3DJob":
+            if not params.get("ImageBase64") and not params.get("ImageUrl"):
+                return {"Response": {"Error": {"Code": "InvalidParameter", "Message": "missing image"}}}
+            job_id = str(uuid.uuid4().int)[:19]
+            with self._lock:
+                failed = self.fail or self._random.random() < self.fail_rate
+                self._jobs[job_id] = (time.time() + next(self._durations), next(self._zips), failed)
+            return {"Response": {"JobId": job_id, "RequestId": uuid.uuid4().hex}}
+
+        if action == "QueryHunyuanTo3DJob":
+            job_id = params.get("JobId")
+            with self._lock:
+                # 重启后未知的任务视为刚刚提交
+                ready_at, result_zip, failed = self._jobs.setdefault(
+                    job_id, (time.time() + self.default_duration, self.result_zip, self.fail))
+            if time.time() < ready_at:
+                return {"Response": {"Status": "RUN", "RequestId": uuid.uuid4().hex}}
+            if failed:
+                return {"Response": {"Status": "FAILED", "ErrorMessage": "stub failure"}}
+            return {"Response": {
+                "Status": "DONE",
+                "ResultFile3Ds": [{"File3D": [
+                    {"Type": "OBJ", "Url": f"file://{result_zip}"},
+                ]}],
+                "RequestId": uuid.uuid4().hex,
+            }}
+
+        raise ValueError(f"Unknown action: {action}")
+
+
+class FileServer:
+    # 本地 HTTP 文件服务器, 支持 Range 请求;
+    # drop_after 为正数时, 前 drop_count 次响应在发送这么多字节后断开连接, 用于测试断点续传
+    def __init__(self, root, drop_after=0, drop_count=1, port=0):
+        self.root = os.path.abspath(root)
+        self.drop_after = drop_after
+        self.drop_count = drop_count
+        self.requests = []
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                server.requests.append((self.path, self.headers.get('Range')))
+                path = os.path.realpath(os.path.join(server.root, self.path.lstrip('/')))
+                if not path.startswith(server.root + os.sep) or not os.path.isfile(path):
+                    self.send_error(404)
+                    return
+                size = os.path.getsize(path)
+                start, end = 0, size - 1
+                range_header = self.headers.get('Range')
+                if range_header and range_header.startswith('bytes='):
+                    first, _, last = range_header[len('bytes='):].partition('-')
+                    start = int(first)
+                    end = int(last) if last else size - 1
+                    if start >= size:
+                        self.send_response(416)
+                        self.send_header('Content-Range', f'bytes */{size}')
+                        self.end_headers()
+                        return
+                    self.send_response(206)
+                    self.send_header('Content-Range', f'bytes {start}-{end}/{size}')
+                else:
+                    self.send_response(200)
+                self.send_header('Content-Length', str(end - start + 1))
+                self.send_header('Accept-Ranges', 'bytes')
+                self.end_headers()
+
+                limit = end - start + 1
+                if server.drop_after and server.drop_count > 0:
+                    server.drop_count -= 1
+                    limit = min(limit, server.drop_after)
+                with open(path, 'rb') as f:
+                    f.seek(start)
+                    self.wfile.write(f.read(limit))
+                if limit < end - start + 1:
+                    self.close_connection = True
+
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', port), Handler)
+        self.port = self.httpd.server_address[1]
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    def url(self, path):
+        return f'http://127.0.0.1:{self.port}/{path.lstrip("/")}'
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+class _BurstServer(ThreadingHTTPServer):
+    # 默认 listen 队列只有 5, 压测时几百个并发连接会被拒绝或延迟
+    request_queue_size = 512
+    daemon_threads = True
+
+
+class VectorEngineStub:
+    # 本地 Vector Engine 图片生成接口, 按请求的 n 返回固定图片的 b64_json;
+    # 传入 certfile 时以 HTTPS 提供服务 (证书需包含私钥), 用于测量 TLS 握手和连接复用
+    # latency 为秒数或 (最小, 最大) 区间; fail_every=k 时每第 k 个请求返回 error_status,
+    # error_status 为 200 时模拟接口在正文里返回 error 字段
+    def __init__(self, image_path, latency=0.0, certfile=None, port=0, fail_every=0, error_status=500,
+                 seed=0):
+        with open(image_path, 'rb') as f:
+            self.b64 = base64.b64encode(f.read()).decode('ascii')
+        self.latency = latency
+        self.fail_every = fail_every
+        self.error_status = error_status
+        self.requests = 0
+        self.connections = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            disable_nagle_algorithm = True  # 头和正文分两次写, 否则会叠加 40ms 的延迟 ACK
+
+            def log_message(self, *args):
+                pass
+
+            def setup(self):
+                super().setup()
+                server.connections += 1
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                request_body = self.rfile.read(length)
+                if self.path != '/v1/images/generations':
+                    self.send_error(404)
+                    return
+                with server._lock:
+                    server.requests += 1
+                    number = server.requests
+                    server.in_flight += 1
+                    server.max_in_flight = max(server.max_in_flight, server.in_flight)
+                    latency = server.latency
+                    if isinstance(latency, (tuple, list)):
+                        latency = server._random.uniform(*latency)
+                try:
+                    if latency:
+                        time.sleep(latency)
+                    status = 200
+                    if server.fail_every and number % server.fail_every == 0:
+                        status = server.error_status
+                        body = {'error': {'message': f'Injected failure for request {number}'}}
+                    else:
+                        n = json.loads(request_body or b'{}').get('n', 1)
+                        body = {'created': int(time.time()), 'data': [{'b64_json': server.b64}] * n}
+                finally:
+                    with server._lock:
+                        server.in_flight -= 1
+                body = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        self.httpd = _BurstServer(('127.0.0.1', port), Handler)
+        self.scheme = 'http'
+        if certfile:
+            context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+            context.load_cert_chain(certfile)
+            self.httpd.socket = context.wrap_socket(self.httpd.socket, server_side=True)
+            self.scheme = 'https'
+        self.port = self.httpd.server_address[1]
+        self.base_url = f'{self.scheme}://127.0.0.1:{self.port}'
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='本地 API 模拟器')
+    commands = parser.add_subparsers(dest='command', required=True)
+    ve = commands.add_parser('vector-engine', help='运行 Vector Engine 图片生成接口模拟器')
+    ve.add_argument('--port', type=int, default=8001)
+    ve.add_argument('--image', default=SAMPLE_IMAGE)
+    ve.add_argument('--latency', type=float, nargs='+', default=[0.0], help='秒数, 或最小值和最大值')
+    ve.add_argument('--fail-every', type=int, default=0)
+    ve.add_argument('--error-status', type=int, default=500)
+    zips = commands.add_parser('result-zips', help='由示例模型生成混元结果压缩包')
+    zips.add_argument('dest')
+    zips.add_argument('--models', default=os.path.join('static', 'models'))
+    args = parser.parse_args()
+
+    if args.command == 'vector-engine':
+        latency = tuple(args.latency) if len(args.latency) > 1 else args.latency[0]
+        with VectorEngineStub(args.image, latency=latency, port=args.port, fail_every=args.fail_every,
+                              error_status=args.error_status) as stub:
+            print(f"VECTOR_ENGINE_BASE_URL={stub.base_url}")
+            try:
+                stub.thread.join()
+            except KeyboardInterrupt:
+                pass
+    else:
+        for path in build_result_zips(args.models, args.dest):
+            print(path)
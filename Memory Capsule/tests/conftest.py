@@ -0,0 +1,25 @@
+import os
+import sys
+
+import pytest
+
+# 应用模块都在上一级目录 (没有打包), 与 benchmarks/ 相同的导入方式
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, APP_DIR)
+
+
+@pytest.fixture
+def app_module(tmp_path, monkeypatch):
+    # app.py 使用相对路径 (static/, data/), 在临时目录里导入并把任务相关的状态换成新的
+    monkeypatch.chdir(tmp_path)
+    import app
+    from events import JobEvents
+    from jobs import JobStore, JobManager
+
+    monkeypatch.setitem(app.app.config, 'JOB_FOLDER', str(tmp_path / 'data' / 'jobs'))
+    manager = JobManager(JobStore(app.app.config['JOB_FOLDER']), lambda: None, str(tmp_path / 'static' / 'models'),
+                         max_workers=1)
+    monkeypatch.setattr(app, '_job_events', JobEvents())
+    monkeypatch.setattr(app, '_job_manager', manager)
+    yield app
+    manager.shutdown(wait=False)
@@ -0,0 +1,117 @@
+import os
+import sys
+import json
+import time
+
+# 任务恢复测试用的 worker 进程 (test_job_recovery.py 启动并在流水线中途 SIGKILL):
+#   python job_worker.py <root> enqueue <阶段>   提交一个任务, 在该阶段停住等待被杀掉
+#   python job_worker.py <root> resume           恢复未完成的任务, 全部结束后输出结果 (JSON)
+# 混元使用 StubHunyuanClient, 结果压缩包经本地 HTTP 服务器 (支持 Range) 下载
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, APP_DIR)
+
+from fetch import stream_download  # noqa: E402
+from jobs import JobStore, JobJournal, JobManager, repair_model_folders, TERMINAL_STATES  # noqa: E402
+from poller import JobPoller  # noqa: E402
+from catalog import ModelCatalog  # noqa: E402
+from stubs import StubHunyuanClient, FileServer, SAMPLE_ZIP, SAMPLE_IMAGE  # noqa: E402
+
+RESULT_ZIP = os.path.join(APP_DIR, SAMPLE_ZIP)
+
+
+class Client:
+    # 记录每次付费提交, 下载地址换成本地 HTTP 服务器
+    def __init__(self, stub, server, log_path):
+        self.stub = stub
+        self.server = server
+        self.log_path = log_path
+
+    def call_json(self, action, params):
+        if action == 'SubmitHunyuanTo3DJob':
+            with open(self.log_path, 'a') as f:
+                f.write(f'{os.getpid()}\n')
+        response = self.stub.call_json(action, params)
+        for item in response.get('Response', {}).get('ResultFile3Ds', []):
+            for file_info in item.get('File3D', []):
+                file_info['Url'] = self.server.url(os.path.basename(RESULT_ZIP))
+        return response
+
+
+def block(marker):
+    # 写入标记文件后停住, 等测试进程 SIGKILL
+    open(marker, 'w').close()
+    while True:
+        time.sleep(1)
+
+
+def main():
+    root, command = sys.argv[1], sys.argv[2]
+    stop_at = sys.argv[3] if len(sys.argv) > 3 else None
+    os.chdir(root)
+    model_folder = os.path.join('static', 'models')
+    os.makedirs(model_folder, exist_ok=True)
+    server = FileServer(os.path.dirname(RESULT_ZIP)).__enter__()
+    # 提交阶段停住时远端任务不会结束; 恢复后 stub 把不认识的 JobId 当作刚提交, default_duration 后完成
+    stub = StubHunyuanClient(RESULT_ZIP, job_duration=3600 if stop_at == 'SUBMITTED' else 0.2)
+    client = Client(stub, server, 'submits.log')
+    hook_runs = []
+
+    def downloader(url, dest_path, resume=False):
+        if stop_at == 'DOWNLOADING':
+            with open(RESULT_ZIP, 'rb') as src, open(dest_path + '.part', 'wb') as dst:
+                dst.write(src.read(os.path.getsize(RESULT_ZIP) // 2))
+            block('stopped')
+        return stream_download(url, dest_path, resume=resume)
+
+    def hook(job, job_folder):
+        hook_runs.append(os.path.basename(job_folder))
+        if stop_at == 'CONVERTING':
+            block('stopped')
+
+    catalog = ModelCatalog(os.path.join('data', 'catalog.db'), model_folder)
+
+    def index(job, job_folder):
+        catalog.refresh(os.path.basename(job_folder))
+
+    manager = JobManager(JobStore(os.path.join('data', 'jobs')), lambda: client, model_folder,
+                         poller=JobPoller(lambda: client, min_interval=0.1), downloader=downloader,
+                         hooks=[hook, index], journal=JobJournal(os.path.join('data', 'jobs', 'journal.jsonl')))
+    if command == 'enqueue':
+        if stop_at == 'SUBMITTED':
+            manager._update = watch_submitted(manager._update)
+        with open(os.path.join(APP_DIR, SAMPLE_IMAGE), 'rb') as src, open('image.png', 'wb') as dst:
+            dst.write(src.read())
+        manager.enqueue('image.png', 'crash test', '2026-01-01')
+        block_forever()
+
+    resumed = manager.resume(
+        repair=lambda keep: repair_model_folders(model_folder, catalog, os.path.join('data', 'quarantine'), keep))
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        jobs = manager.store.all()
+        if all(job['status'] in TERMINAL_STATES for job in jobs):
+            break
+        time.sleep(0.05)
+    manager.shutdown(wait=True)
+    print(json.dumps({'resumed': resumed, 'jobs': manager.store.all(), 'hook_runs': hook_runs,
+                      'ranges': [r for _, r in server.requests], 'catalog': sorted(catalog.ids())}))
+    server.__exit__(None, None, None)
+
+
+def watch_submitted(update):
+    # 拿到 JobId 并写入日志之后停住
+    def wrapper(job, **fields):
+        update(job, **fields)
+        if fields.get('status') == 'SUBMITTED':
+            block('stopped')
+    return wrapper
+
+
+def block_forever():
+    while True:
+        time.sleep(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+import json
+import time
+import asyncio
+import threading
+
+import pytest
+
+pytest.importorskip('asgiref')
+pytest.importorskip('aiohttp')
+
+from flask import Flask, request
+
+
+@pytest.fixture
+def asgi(app_module):
+    import asgi
+    return asgi
+
+
+def slow_app(delay=0.3):
+    # 记录同时在执行的请求数
+    app = Flask('slow')
+    active = {'now': 0, 'max': 0}
+    lock = threading.Lock()
+
+    @app.route('/slow', methods=['GET', 'POST'])
+    def slow():
+        with lock:
+            active['now'] += 1
+            active['max'] = max(active['max'], active['now'])
+        time.sleep(delay)
+        with lock:
+            active['now'] -= 1
+        return {'thread': threading.get_ident(), 'body': request.get_data(as_text=True)}
+
+    return app, active
+
+
+async def call(wsgi, body=b''):
+    scope = {'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'POST',
+             'scheme': 'http', 'path': '/slow', 'raw_path': b'/slow', 'query_string': b'', 'root_path': '',
+             'headers': [(b'content-length', str(len(body)).encode())], 'client': ('127.0.0.1', 1),
+             'server': ('127.0.0.1', 5000)}
+    messages = [{'type': 'http.request', 'body': body, 'more_body': False}]
+    sent = []
+
+    async def receive():
+        if messages:
+            return messages.pop(0)
+        await asyncio.sleep(3600)
+
+    async def send(message):
+        sent.append(message)
+
+    await wsgi(scope, receive, send)
+    assert sent[0]['status'] == 200
+    return json.loads(b''.join(m.get('body', b'') for m in sent[1:]))
+
+
+def test_flask_requests_run_concurrently(asgi):
+    app, active = slow_app()
+    wsgi = asgi._Wsgi(app, max_threads=8)
+
+    async def main():
+        start = time.perf_counter()
+        results = await asyncio.gather(*(call(wsgi, f'body {i}'.encode()) for i in range(4)))
+        return results, time.perf_counter() - start
+
+    results, seconds = asyncio.run(main())
+    assert [r['body'] for r in results] == [f'body {i}' for i in range(4)]
+    assert len({r['thread'] for r in results}) == 4
+    assert active['max'] == 4
+    assert seconds < 1.0
+
+
+def test_concurrency_is_capped(asgi):
+    app, active = slow_app(delay=0.1)
+    wsgi = asgi._Wsgi(app, max_threads=2)
+
+    async def main():
+        await asyncio.gather(*(call(wsgi) for _ in range(6)))
+
+    asyncio.run(main())
+    assert active['max'] == 2
@@ -0,0 +1,145 @@
+import os
+import hashlib
+import zipfile
+
+import pytest
+import requests
+
+from fetch import stream_download, safe_extract, FetchError
+from stubs import FileServer
+
+
+@pytest.fixture
+def payload(tmp_path):
+    served = tmp_path / 'served'
+    served.mkdir()
+    data = os.urandom(3 * 1024 * 1024 + 123)
+    (served / 'model.zip').write_bytes(data)
+    return served, data
+
+
+def test_resumes_with_range_after_dropped_connection(tmp_path, payload):
+    served, data = payload
+    dest = tmp_path / 'model.zip'
+    with FileServer(str(served), drop_after=1024 * 1024, drop_count=2) as server:
+        result = stream_download(server.url('model.zip'), str(dest), session=requests.Session())
+    assert dest.read_bytes() == data
+    assert result['sha256'] == hashlib.sha256(data).hexdigest()
+    assert result['resumes'] == 2
+    assert [r for _, r in server.requests] == [None, 'bytes=1048576-', 'bytes=2097152-']
+    assert not os.path.exists(str(dest) + '.part')
+
+
+def test_gives_up_after_retries(tmp_path, payload):
+    served, _ = payload
+    dest = tmp_path / 'model.zip'
+    with FileServer(str(served), drop_after=1024, drop_count=10) as server:
+        with pytest.raises(requests.RequestException):
+            stream_download(server.url('model.zip'), str(dest), retries=2, session=requests.Session())
+    assert len(server.requests) == 3
+    assert not dest.exists()
+
+
+def test_resume_continues_leftover_part_file(tmp_path, payload):
+    # 重启恢复: 上一个进程留下的 .part 用 Range 续传
+    served, data = payload
+    dest = tmp_path / 'model.zip'
+    (tmp_path / 'model.zip.part').write_bytes(data[:1000])
+    with FileServer(str(served)) as server:
+        result = stream_download(server.url('model.zip'), str(dest), resume=True, session=requests.Session())
+    assert dest.read_bytes() == data
+    assert result['resumes'] == 1
+    assert [r for _, r in server.requests] == ['bytes=1000-']
+
+
+def test_leftover_part_is_discarded_without_resume(tmp_path, payload):
+    served, data = payload
+    dest = tmp_path / 'model.zip'
+    (tmp_path / 'model.zip.part').write_bytes(b'stale' * 100)
+    with FileServer(str(served)) as server:
+        stream_download(server.url('model.zip'), str(dest), session=requests.Session())
+    assert dest.read_bytes() == data
+    assert [r for _, r in server.requests] == [None]
+
+
+def test_oversized_leftover_part_restarts_download(tmp_path, payload):
+    # .part 不短于远端文件时服务器返回 416, 从头下载
+    served, data = payload
+    dest = tmp_path / 'model.zip'
+    (tmp_path / 'model.zip.part').write_bytes(b'x' * (len(data) + 10))
+    with FileServer(str(served)) as server:
+        stream_download(server.url('model.zip'), str(dest), resume=True, session=requests.Session())
+    assert dest.read_bytes() == data
+    assert [r for _, r in server.requests] == [f'bytes={len(data) + 10}-', None]
+
+
+def test_checksum_mismatch_is_rejected(tmp_path, payload):
+    served, _ = payload
+    dest = tmp_path / 'model.zip'
+    with FileServer(str(served)) as server:
+        with pytest.raises(FetchError, match='Checksum mismatch'):
+            stream_download(server.url('model.zip'), str(dest), expected_sha256='0' * 64,
+                            session=requests.Session())
+    assert not dest.exists()
+    assert not os.path.exists(str(dest) + '.part')
+
+
+def test_matching_checksum_is_accepted(tmp_path, payload):
+    served, data = payload
+    dest = tmp_path / 'model.zip'
+    with FileServer(str(served)) as server:
+        result = stream_download(server.url('model.zip'), str(dest),
+                                 expected_sha256=hashlib.sha256(data).hexdigest().upper(),
+                                 session=requests.Session())
+    assert result['bytes'] == len(data)
+
+
+def test_declared_size_over_limit_is_rejected(tmp_path, payload):
+    served, _ = payload
+    with FileServer(str(served)) as server:
+        with pytest.raises(FetchError, match='too large'):
+            stream_download(server.url('model.zip'), str(tmp_path / 'model.zip'), max_bytes=1024 * 1024,
+                            session=requests.Session())
+
+
+def test_local_file_over_limit_is_rejected(tmp_path, payload):
+    served, _ = payload
+    with pytest.raises(FetchError, match='too large'):
+        stream_download(f"file://{served / 'model.zip'}", str(tmp_path / 'model.zip'), max_bytes=1024)
+
+
+def make_zip(path, members):
+    with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as z:
+        for name, data in members.items():
+            z.writestr(name, data)
+
+
+@pytest.mark.parametrize('name', ['../escape.txt', 'sub/../../escape.txt', '/abs/escape.txt',
+                                  '..\\escape.txt', 'C:/escape.txt'])
+def test_zip_slip_is_rejected(tmp_path, name):
+    archive = tmp_path / 'evil.zip'
+    make_zip(archive, {'model.obj': b'v 0 0 0', name: b'owned'})
+    dest = tmp_path / 'out'
+    dest.mkdir()
+    with pytest.raises(FetchError, match='Unsafe path'):
+        safe_extract(str(archive), str(dest))
+    assert not (tmp_path / 'escape.txt').exists()
+    assert not os.path.exists('/abs/escape.txt')
+
+
+def test_extracts_nested_members(tmp_path):
+    archive = tmp_path / 'ok.zip'
+    make_zip(archive, {'model.obj': b'v 0 0 0', 'textures/material_0.png': b'png'})
+    dest = tmp_path / 'out'
+    result = safe_extract(str(archive), str(dest))
+    assert sorted(result['files']) == ['model.obj', os.path.join('textures', 'material_0.png')]
+    assert (dest / 'textures' / 'material_0.png').read_bytes() == b'png'
+
+
+def test_extracted_size_limit(tmp_path):
+    # 声明大小超过上限时在解压前拒绝 (zip bomb)
+    archive = tmp_path / 'bomb.zip'
+    make_zip(archive, {'big.bin': b'\0' * (4 * 1024 * 1024)})
+    with pytest.raises(FetchError, match='expands to'):
+        safe_extract(str(archive), str(tmp_path / 'out'), max_total_bytes=1024 * 1024)
+    assert not (tmp_path / 'out' / 'big.bin').exists()
@@ -0,0 +1,87 @@
+import json
+
+import pytest
+
+from stubs import VectorEngineStub
+
+
+@pytest.fixture
+def generate(app_module, tmp_path, monkeypatch):
+    # 每个测试用新的线程池和上传目录, 请求发往本地 Vector Engine 模拟器
+    image = tmp_path / 'sample.png'
+    image.write_bytes(b'\x89PNG\r\n\x1a\n' + b'\0' * 64)
+    uploads = tmp_path / 'static' / 'uploads'
+    uploads.mkdir(parents=True, exist_ok=True)
+    monkeypatch.setitem(app_module.app.config, 'UPLOAD_FOLDER', str(uploads))
+    monkeypatch.setitem(app_module.app.config, 'GENERATE_CONCURRENCY', 2)
+    monkeypatch.setattr(app_module, '_generate_pool', None)
+    stubs = []
+
+    def start(**kwargs):
+        stub = VectorEngineStub(str(image), **kwargs).__enter__()
+        stubs.append(stub)
+        monkeypatch.setattr(app_module, 'VECTOR_ENGINE_BASE_URL', stub.base_url)
+        return stub
+
+    yield start
+    if app_module._generate_pool is not None:
+        app_module._generate_pool.shutdown(wait=True)
+    for stub in stubs:
+        stub.__exit__(None, None, None)
+
+
+def post_batch(app_module, prompts, **params):
+    client = app_module.app.test_client()
+    response = client.post('/generate_images', json=dict(prompts=prompts, api_key='test', no_cache=True),
+                           query_string=params)
+    assert response.status_code == 200
+    return response
+
+
+def read_ndjson(response):
+    lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines() if line]
+    return lines[:-1], lines[-1]
+
+
+def test_partial_failures_are_reported_per_item(app_module, generate):
+    stub = generate(fail_every=3)
+    results, done = read_ndjson(post_batch(app_module, [f'prompt {i}' for i in range(6)] + [{'prompt': 'pair', 'n': 2}]))
+
+    assert stub.requests == 7
+    assert sorted(r['index'] for r in results) == list(range(7))
+    failed = [r for r in results if r['status'] == 'error']
+    assert len(failed) == 2
+    assert all('Injected failure' in r['error'] for r in failed)
+    for result in results:
+        if result['status'] == 'success':
+            assert len(result['images']) == (2 if result['prompt'] == 'pair' else 1)
+    assert done == {'done': True, 'total': 7, 'succeeded': 5, 'failed': 2, 'seconds': done['seconds']}
+    assert stub.max_in_flight <= 2
+
+
+def test_slow_call_times_out_without_failing_the_batch(app_module, generate, monkeypatch):
+    stub = generate(latency=1.0)
+    monkeypatch.setitem(app_module.app.config, 'GENERATE_TIMEOUT', 0.2)
+    results, done = read_ndjson(post_batch(app_module, ['slow', 'slower']))
+
+    assert [r['status'] for r in results] == ['error', 'error']
+    for result in results:
+        assert 'no response within 0.2s' in result['error']
+        assert result['seconds'] < 1.0
+    assert done['succeeded'] == 0 and done['failed'] == 2
+
+    # 超时只影响慢的调用, 上游恢复后同一进程的请求正常
+    stub.latency = 0
+    results, done = read_ndjson(post_batch(app_module, ['fast']))
+    assert results[0]['status'] == 'success'
+    assert done['succeeded'] == 1
+
+
+def test_sse_stream_ends_with_done_event(app_module, generate):
+    generate(fail_every=2)
+    body = post_batch(app_module, ['a', 'b'], format='sse').get_data(as_text=True)
+
+    events = [block.split('\n') for block in body.strip().split('\n\n')]
+    assert [lines[0] for lines in events] == ['event: result', 'event: result', 'event: done']
+    done = json.loads(events[-1][1][len('data: '):])
+    assert done['succeeded'] == 1 and done['failed'] == 1
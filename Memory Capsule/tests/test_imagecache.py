@@ -0,0 +1,115 @@
+import threading
+
+from imagecache import ImageCache
+from jobs import JobStore, JobManager, FAILED
+
+
+class FakeClock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def save(folder, name, size=100):
+    (folder / name).write_bytes(b'x' * size)
+    return {'filename': name, 'local_image_url': f'/static/uploads/{name}'}
+
+
+def make_cache(tmp_path, **kwargs):
+    folder = tmp_path / 'uploads'
+    folder.mkdir(exist_ok=True)
+    clock = FakeClock()
+    cache = ImageCache(str(tmp_path / 'cache.db'), str(folder), clock=clock, **kwargs)
+    return cache, folder, clock
+
+
+def test_ttl_counts_from_last_use(tmp_path):
+    cache, folder, clock = make_cache(tmp_path, ttl=100)
+    cache.put('a', 'prompt a', [save(folder, 'gen_a.png')])
+
+    # 每次命中都延长有效期, 创建时间早于 TTL 也不过期
+    for _ in range(3):
+        clock.now += 80
+        assert cache.get('a')
+    clock.now += 101
+    assert cache.get('a') is None
+    assert cache.stats()['expired'] == 1
+    assert not (folder / 'gen_a.png').exists()
+
+
+def test_touch_extends_ttl(tmp_path):
+    cache, folder, clock = make_cache(tmp_path, ttl=100)
+    cache.put('a', 'prompt a', [save(folder, 'gen_a.png')])
+
+    clock.now += 90
+    cache.touch('gen_a.png')
+    clock.now += 90
+    assert cache.get('a')
+
+
+def test_eviction_skips_files_of_pending_jobs(tmp_path):
+    pending = set()
+    cache, folder, clock = make_cache(tmp_path, max_bytes=250, in_use=lambda: pending)
+    cache.put('a', 'prompt a', [save(folder, 'gen_a.png')])
+    clock.now += 1
+    cache.put('b', 'prompt b', [save(folder, 'gen_b.png')])
+    pending.add('gen_a.png')
+
+    # a 最久没用, 但还在任务里, 淘汰 b
+    clock.now += 1
+    cache.put('c', 'prompt c', [save(folder, 'gen_c.png')])
+    assert (folder / 'gen_a.png').exists()
+    assert not (folder / 'gen_b.png').exists()
+    assert cache.get('a') and cache.get('b') is None
+
+    # 任务结束后正常淘汰
+    pending.clear()
+    clock.now += 1
+    cache.get('c')
+    cache.put('d', 'prompt d', [save(folder, 'gen_d.png')])
+    assert not (folder / 'gen_a.png').exists()
+
+
+def test_expired_entry_keeps_files_of_pending_jobs(tmp_path):
+    pending = {'gen_a.png'}
+    cache, folder, clock = make_cache(tmp_path, ttl=100, in_use=lambda: pending)
+    cache.put('a', 'prompt a', [save(folder, 'gen_a.png')])
+
+    clock.now += 101
+    assert cache.get('a') is None
+    assert (folder / 'gen_a.png').exists()
+
+    pending.clear()
+    assert cache.get('a') is None
+    assert not (folder / 'gen_a.png').exists()
+    assert cache.stats()['entries'] == 0
+
+
+def test_job_manager_tracks_pending_inputs(tmp_path):
+    image = tmp_path / 'gen_a.png'
+    image.write_bytes(b'x')
+    gate = threading.Event()
+    prepared = threading.Event()
+
+    def prepare(path):
+        prepared.set()
+        gate.wait(5)
+        return None
+
+    manager = JobManager(JobStore(str(tmp_path / 'jobs')), lambda: None, str(tmp_path / 'models'),
+                         max_workers=1, prepare=prepare)
+    try:
+        job = manager.enqueue(str(image), 'title', '2026-01-01')
+        assert prepared.wait(5)
+        assert manager.pending_files() == {str(image)}
+
+        # 没有混元客户端, 提交失败后不再占用
+        gate.set()
+        manager.shutdown(wait=True)
+        assert manager.get(job['id'])['status'] == FAILED
+        assert manager.pending_files() == set()
+    finally:
+        gate.set()
+        manager.shutdown(wait=False)
@@ -0,0 +1,79 @@
+import json
+import time
+import uuid
+
+import pytest
+
+from jobs import DONE, RUNNING, progress_event
+
+
+def make_job(manager, status):
+    now = time.time()
+    job = {'id': uuid.uuid4().hex, 'status': status, 'title': 't', 'date': '2026-01-01', 'remote_job_id': '1',
+           'created_at': now - 5, 'updated_at': now, 'timings': {}}
+    manager.store.save(job)
+    return job
+
+
+def read_events(response, limit=10):
+    # 逐块读取 SSE 流, 最多 limit 块; 返回 (progress 事件列表, 是否已经结束)
+    events = []
+    chunks = iter(response.response)
+    for _ in range(limit):
+        try:
+            chunk = next(chunks)
+        except StopIteration:
+            return events, True
+        chunk = chunk.decode() if isinstance(chunk, bytes) else chunk
+        for line in chunk.splitlines():
+            if line.startswith('data: '):
+                events.append(json.loads(line[len('data: '):]))
+    return events, False
+
+
+@pytest.fixture
+def client(app_module):
+    app_module.app.config['SSE_HEARTBEAT'] = 0.05
+    return app_module.app.test_client()
+
+
+def test_finished_job_with_stale_last_event_id_gets_terminal_event(app_module, client):
+    # 新进程里没有历史事件, 客户端带着上次连接的 Last-Event-ID 重连
+    job = make_job(app_module._job_manager, DONE)
+    response = client.get(f"/jobs/{job['id']}/events", headers={'Last-Event-ID': '3'}, buffered=False)
+    events, closed = read_events(response)
+    assert closed
+    assert [e['status'] for e in events] == [DONE]
+
+
+def test_reconnect_after_all_events_of_finished_job(app_module, client):
+    job = make_job(app_module._job_manager, DONE)
+    for status in ('SUBMITTED', RUNNING, DONE):
+        app_module._job_events.publish(job['id'], progress_event(dict(job, status=status)))
+    response = client.get(f"/jobs/{job['id']}/events", headers={'Last-Event-ID': '3'}, buffered=False)
+    events, closed = read_events(response)
+    assert closed
+    assert [e['status'] for e in events] == [DONE]
+
+
+def test_missed_events_are_replayed(app_module, client):
+    job = make_job(app_module._job_manager, DONE)
+    for status in ('SUBMITTED', RUNNING, DONE):
+        app_module._job_events.publish(job['id'], progress_event(dict(job, status=status)))
+    response = client.get(f"/jobs/{job['id']}/events", headers={'Last-Event-ID': '1'}, buffered=False)
+    events, closed = read_events(response)
+    assert closed
+    assert [(e['id'], e['status']) for e in events] == [(2, RUNNING), (3, DONE)]
+
+
+def test_evicted_channel_falls_back_to_stored_status(app_module, client):
+    # 任务结束的事件发到了别的频道 (被淘汰后重建), 等待中的连接靠心跳时读取保存的状态结束
+    job = make_job(app_module._job_manager, RUNNING)
+    response = client.get(f"/jobs/{job['id']}/events", buffered=False)
+    chunks = iter(response.response)
+    next(chunks)  # retry
+    assert b'RUNNING' in next(chunks)
+    app_module._job_manager.store.save(dict(job, status=DONE, updated_at=time.time()))
+    events, closed = read_events(response)
+    assert closed
+    assert events[-1]['status'] == DONE
@@ -0,0 +1,81 @@
+import os
+import sys
+import json
+import time
+import signal
+import subprocess
+
+import pytest
+
+from jobs import DONE, DOWNLOADING, CONVERTING, SUBMITTED, JobJournal
+
+WORKER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'job_worker.py')
+
+
+def run_until_killed(root, stage, timeout=60):
+    # 启动 worker, 等它在指定阶段停住后 SIGKILL
+    proc = subprocess.Popen([sys.executable, WORKER, str(root), 'enqueue', stage])
+    try:
+        deadline = time.time() + timeout
+        while not (root / 'stopped').exists():
+            assert proc.poll() is None, 'worker exited before reaching the stage'
+            assert time.time() < deadline, f'worker did not reach {stage}'
+            time.sleep(0.05)
+    finally:
+        proc.send_signal(signal.SIGKILL)
+        proc.wait()
+    (root / 'stopped').unlink()
+
+
+def resume(root):
+    out = subprocess.run([sys.executable, WORKER, str(root), 'resume'], capture_output=True, text=True, timeout=120)
+    assert out.returncode == 0, out.stderr
+    return json.loads(out.stdout.splitlines()[-1])
+
+
+def snapshot(root):
+    jobs_dir = root / 'data' / 'jobs'
+    (path,) = [p for p in jobs_dir.iterdir() if p.suffix == '.json']
+    return json.loads(path.read_text())
+
+
+@pytest.mark.parametrize('stage', [SUBMITTED, DOWNLOADING, CONVERTING])
+def test_job_survives_kill(tmp_path, stage):
+    run_until_killed(tmp_path, stage)
+    killed = snapshot(tmp_path)
+    assert killed['status'] == stage
+    assert killed['remote_job_id']
+
+    result = resume(tmp_path)
+    (job,) = result['jobs']
+    assert result['resumed'] == [job['id']]
+    assert job['status'] == DONE, job.get('error')
+    # 只提交过一次: 恢复后继续轮询原来的 JobId
+    assert len((tmp_path / 'submits.log').read_text().split()) == 1
+    assert job['remote_job_id'] == killed['remote_job_id']
+
+    models = os.listdir(tmp_path / 'static' / 'models')
+    assert models == [job['remote_job_id']]
+    assert not [name for name in models if name.startswith('.partial-')]
+    assert result['catalog'] == [job['remote_job_id']]
+    assert job['obj_url'] and os.path.exists(tmp_path / job['obj_url'].lstrip('/'))
+    assert JobJournal(str(tmp_path / 'data' / 'jobs' / 'journal.jsonl')).replay()[job['id']]['status'] == DONE
+
+    if stage == DOWNLOADING:
+        # 已下载的一半续传, 不从头下载
+        assert result['ranges'] and result['ranges'][0].startswith('bytes=')
+    if stage == CONVERTING:
+        # 目录已经发布, 只重新执行收尾 hook, 不再下载
+        assert result['ranges'] == []
+        assert result['hook_runs'] == [job['remote_job_id']]
+
+
+def test_lost_snapshot_is_restored_from_journal(tmp_path):
+    run_until_killed(tmp_path, SUBMITTED)
+    killed = snapshot(tmp_path)
+    os.remove(tmp_path / 'data' / 'jobs' / f"{killed['id']}.json")
+    result = resume(tmp_path)
+    (job,) = result['jobs']
+    assert job['id'] == killed['id'] and job['status'] == DONE
+    assert job['remote_job_id'] == killed['remote_job_id']
+    assert len((tmp_path / 'submits.log').read_text().split()) == 1
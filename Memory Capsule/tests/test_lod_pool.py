@@ -0,0 +1,36 @@
+import os
+from concurrent.futures.process import BrokenProcessPool
+
+import pytest
+
+
+@pytest.fixture
+def pool_app(app_module, monkeypatch):
+    monkeypatch.setitem(app_module.app.config, 'LOD_WORKERS', 1)
+    monkeypatch.setattr(app_module, '_lod_pool', None)
+    yield app_module
+    if app_module._lod_pool is not None:
+        app_module._lod_pool.shutdown(wait=True, cancel_futures=True)
+
+
+def test_broken_pool_is_recreated(pool_app):
+    # 子进程崩溃 (这里直接退出) 后进程池坏掉, 下一次提交换一个新的进程池
+    crashed = pool_app.submit_offline(os._exit, 1)
+    with pytest.raises(BrokenProcessPool):
+        crashed.result(timeout=60)
+    broken = pool_app._lod_pool
+    assert pool_app.submit_offline(pow, 2, 10).result(timeout=60) == 1024
+    assert pool_app._lod_pool is not broken
+
+
+def test_optional_hooks_do_not_fail_the_job(pool_app, monkeypatch, tmp_path):
+    def unavailable(*args):
+        raise RuntimeError('pool unavailable')
+
+    monkeypatch.setattr(pool_app, 'submit_offline', unavailable)
+    folder = tmp_path / 'static' / 'models' / '1'
+    folder.mkdir(parents=True)
+    (folder / 'metadata.json').write_text('{}')
+    pool_app.build_lods(None, str(folder))
+    pool_app.reencode_textures(None, str(folder))
+    assert pool_app.build_lods.__name__ == 'build_lods'
@@ -0,0 +1,176 @@
+import pytest
+
+from poller import JobPoller, TokenBucket, TIMEOUT
+
+
+class FakeClock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+class RateLimited(Exception):
+    code = 'RequestLimitExceeded'
+
+
+class FakeClient:
+    # 按脚本完成的混元任务: durations[job_id] 秒后 DONE (None 表示一直 RUN); errors 为依次抛出的异常
+    def __init__(self, clock, durations, submitted_at=None):
+        self.clock = clock
+        self.durations = durations
+        self.submitted_at = submitted_at if submitted_at is not None else clock()
+        self.calls = []
+        self.errors = []
+
+    def call_json(self, action, params):
+        assert action == 'QueryHunyuanTo3DJob'
+        self.calls.append((self.clock(), params['JobId']))
+        if self.errors:
+            raise self.errors.pop(0)
+        duration = self.durations[params['JobId']]
+        if duration is not None and self.clock() >= self.submitted_at + duration:
+            return {'Response': {'Status': 'DONE', 'ResultFile3Ds': []}}
+        return {'Response': {'Status': 'RUN'}}
+
+
+def make_poller(clock, client, **options):
+    options.setdefault('jitter', 0)
+    poller = JobPoller(lambda: client, clock=clock, wall_clock=clock, **options)
+    # 不启动轮询线程, 由测试按假时钟逐步推进
+    poller.start = lambda: None
+    return poller
+
+
+def run_for(poller, clock, seconds, step=0.05):
+    # 把假时钟推进 seconds 秒, 期间执行所有到期的查询
+    until = clock() + seconds
+    while True:
+        with poller._cond:
+            w, wait = poller._next_due()
+        if w is not None:
+            poller._poll_one(w)
+            continue
+        if clock() >= until:
+            return
+        clock.advance(min(wait if wait is not None else step, until - clock()) or step)
+
+
+def poll_times(client, job_id):
+    return [round(t - client.submitted_at, 3) for t, j in client.calls if j == job_id]
+
+
+def test_coalesces_watchers_of_the_same_job():
+    clock = FakeClock()
+    client = FakeClient(clock, {'a': 5, 'b': 5})
+    poller = make_poller(clock, client, min_interval=2)
+    results = []
+    for job_id in ('a', 'a', 'a', 'b'):
+        poller.watch(job_id, lambda status, data, job_id=job_id: results.append((job_id, status)))
+    run_for(poller, clock, 30)
+
+    # 同一个 JobId 每轮只查询一次, 三个等待者都收到结果
+    assert poll_times(client, 'a') == poll_times(client, 'b')
+    assert len(set(poll_times(client, 'a'))) == len(poll_times(client, 'a'))
+    assert sorted(results) == [('a', 'DONE')] * 3 + [('b', 'DONE')]
+    assert poller.stats()['pending'] == 0
+
+
+def test_exponential_backoff_without_history():
+    clock = FakeClock()
+    client = FakeClient(clock, {'a': None})
+    poller = make_poller(clock, client, min_interval=2, max_interval=10, max_rps=100)
+    poller.watch('a', lambda *args: None)
+    run_for(poller, clock, 40)
+    times = poll_times(client, 'a')
+    gaps = [round(b - a, 3) for a, b in zip(times, times[1:])]
+    # 2, 3, 4.5, 6.75, 然后封顶 max_interval
+    assert times[0] == 2
+    assert gaps[:3] == [3, 4.5, 6.75]
+    assert set(gaps[4:]) == {10}
+
+
+def test_backoff_adapts_to_typical_duration():
+    clock = FakeClock()
+    client = FakeClient(clock, {'first': 20, 'second': 20})
+    poller = make_poller(clock, client, min_interval=1, max_interval=60, max_rps=100)
+    poller.watch('first', lambda *args: None)
+    run_for(poller, clock, 60)
+    first_polls = len(poll_times(client, 'first'))
+    assert poller.stats()['expected_duration'] is not None
+
+    # 第二个任务知道通常要 ~20 秒: 先等剩余时间的一半, 越接近越密, 比没有历史时查询更少
+    client.submitted_at = clock()
+    poller.watch('second', lambda *args: None, started_at=clock())
+    run_for(poller, clock, 60)
+    times = poll_times(client, 'second')
+    assert times[0] >= 5
+    assert times[-1] >= 20
+    assert len(times) <= first_polls
+
+
+def test_times_out_after_max_wait():
+    clock = FakeClock()
+    client = FakeClient(clock, {'a': None})
+    poller = make_poller(clock, client, min_interval=1, max_interval=5, max_wait=30)
+    results = []
+    poller.watch('a', lambda status, data: results.append(status))
+    run_for(poller, clock, 60)
+    assert results == [TIMEOUT]
+
+
+def test_token_bucket_limits_query_rate():
+    clock = FakeClock()
+    client = FakeClient(clock, {f'job{i}': None for i in range(10)})
+    poller = make_poller(clock, client, min_interval=2, max_interval=2, max_rps=2)
+    for i in range(10):
+        poller.watch(f'job{i}', lambda *args: None)
+    run_for(poller, clock, 20)
+    times = sorted(t for t, _ in client.calls)
+    # 令牌桶: 任意时间窗口 [t_i, t_j] 内的查询数不超过 容量 (2) + max_rps * 窗口长度
+    for i in range(len(times)):
+        for j in range(i, len(times)):
+            assert j - i + 1 <= 2 + 2 * (times[j] - times[i]) + 1e-9
+    # 10 个任务每 2 秒都到期, 实际查询速度被限制在 max_rps 附近
+    assert 2 * 16 <= len(times) <= 2 + 2 * 18
+
+
+def test_token_bucket_delay():
+    clock = FakeClock()
+    bucket = TokenBucket(2, clock=clock)
+    assert [bucket.delay(), bucket.delay()] == [0, 0]
+    assert bucket.delay() == pytest.approx(0.5)
+    clock.advance(0.5)
+    assert bucket.delay() == 0
+
+
+def test_pauses_after_rate_limit_error():
+    clock = FakeClock()
+    client = FakeClient(clock, {'a': 12, 'b': 12})
+    client.errors = [RateLimited('RequestLimitExceeded')]
+    poller = make_poller(clock, client, min_interval=2, max_interval=10, max_rps=100)
+    done = []
+    poller.watch('a', lambda status, data: done.append(status))
+    poller.watch('b', lambda status, data: done.append(status))
+    run_for(poller, clock, 60)
+
+    # 第一次查询被限流: 所有任务暂停 max_interval 秒后再查询
+    first_error_at = poll_times(client, 'a')[0]
+    later = [t for t, _ in client.calls if t - client.submitted_at > first_error_at]
+    assert later and min(later) - client.submitted_at >= first_error_at + 10
+    assert poller.stats()['rate_limited'] == 1
+    assert done == ['DONE', 'DONE']
+
+
+def test_status_callback_on_remote_progress():
+    clock = FakeClock()
+    client = FakeClient(clock, {'a': 5})
+    poller = make_poller(clock, client, min_interval=1)
+    statuses = []
+    poller.watch('a', lambda *args: None, on_status=statuses.append)
+    run_for(poller, clock, 10)
+    assert statuses == ['RUN']
@@ -0,0 +1,71 @@
+import os
+
+import pytest
+
+from mesh import convert_obj_to_glb, read_glb, GLB_NAME, WEBP_EXTENSION
+
+Image = pytest.importorskip('PIL.Image')
+
+from lod import process_model  # noqa: E402
+from textures import optimize_textures  # noqa: E402
+
+
+def make_model(folder, size=2048):
+    # 一个带 UV 的网格 (8x8 的方格), MTL 引用 size x size 的 PNG 贴图
+    lines = ['mtllib material.mtl']
+    n = 9
+    for y in range(n):
+        for x in range(n):
+            lines.append(f'v {x} {y} {(x * y) % 3 * 0.1}')
+            lines.append(f'vt {x / (n - 1)} {y / (n - 1)}')
+    for y in range(n - 1):
+        for x in range(n - 1):
+            a = y * n + x + 1
+            b, c, d = a + 1, a + n, a + n + 1
+            lines.append(f'f {a}/{a} {b}/{b} {d}/{d}')
+            lines.append(f'f {a}/{a} {d}/{d} {c}/{c}')
+    (folder / 'model.obj').write_text('\n'.join(lines))
+    (folder / 'material.mtl').write_text('newmtl material_0\nKd 1 1 1\nmap_Kd material_0.png\n')
+    Image.linear_gradient('L').resize((size, size)).convert('RGB').save(folder / 'material_0.png')
+    convert_obj_to_glb(str(folder / 'model.obj'), str(folder / GLB_NAME), str(folder / 'material.mtl'))
+
+
+def webp_images(path):
+    # 返回 [(PNG, WebP)], 每个纹理一项
+    gltf, _ = read_glb(str(path))
+    images = gltf['images']
+    pairs = []
+    for texture in gltf['textures']:
+        webp = texture.get('extensions', {}).get(WEBP_EXTENSION)
+        pairs.append((images[texture['source']]['uri'], images[webp['source']]['uri'] if webp else None))
+    assert (WEBP_EXTENSION in gltf['extensionsUsed']) == any(w for _, w in pairs)
+    assert WEBP_EXTENSION not in gltf.get('extensionsRequired', [])
+    return pairs
+
+
+@pytest.mark.parametrize('textures_first', [False, True])
+def test_glbs_reference_webp_textures(tmp_path, textures_first):
+    make_model(tmp_path)
+    if textures_first:
+        optimize_textures(str(tmp_path))
+        lods = process_model(str(tmp_path))['lods']
+    else:
+        lods = process_model(str(tmp_path))['lods']
+        result = optimize_textures(str(tmp_path))
+        assert set(result['webp_glbs']) == {GLB_NAME} | {lod['file'] for lod in lods}
+
+    expected = {GLB_NAME: ('material_0.png', 'material_0.webp'),
+                'model_lod1.glb': ('material_0_1024.png', 'material_0_1024.webp'),
+                'model_lod2.glb': ('material_0_512.png', 'material_0_512.webp')}
+    assert {lod['file'] for lod in lods} | {GLB_NAME} == set(expected)
+    for name, (png, webp) in expected.items():
+        assert webp_images(tmp_path / name) == [(png, webp)]
+        assert (tmp_path / png).exists() and (tmp_path / webp).exists()
+    assert not [p for p in os.listdir(tmp_path) if p.endswith('.tmp')]
+
+
+def test_link_is_idempotent(tmp_path):
+    make_model(tmp_path, size=256)
+    optimize_textures(str(tmp_path))
+    assert webp_images(tmp_path / GLB_NAME) == [('material_0.png', 'material_0.webp')]
+    assert optimize_textures(str(tmp_path))['webp_glbs'] == []
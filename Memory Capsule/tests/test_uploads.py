@@ -0,0 +1,132 @@
+import io
+import os
+
+import pytest
+
+import uploads
+
+Image = pytest.importorskip('PIL.Image')
+
+RED = (255, 0, 0)
+ORIENTATION = 0x0112
+
+
+def photo(path, size, orientation=None, marker=RED, quality=95):
+    # 合成照片: 灰底, 存储方向的左上角有一块红色标记, 带 EXIF 机型字段, 可选方向标记
+    img = Image.new('RGB', size, (128, 128, 128))
+    img.paste(marker, (0, 0, size[0] // 4, size[1] // 4))
+    exif = Image.Exif()
+    exif[0x010F] = 'TestCam'  # Make
+    if orientation:
+        exif[ORIENTATION] = orientation
+    img.save(path, format='JPEG', quality=quality, exif=exif.tobytes())
+    return path
+
+
+def corner(img, x, y):
+    # 标记区域里 (远离边缘) 的一个像素, JPEG 有损, 按通道比较大小
+    w, h = img.size
+    return img.convert('RGB').getpixel((int(w * x), int(h * y)))
+
+
+def is_red(pixel):
+    r, g, b = pixel
+    return r > 200 and g < 60 and b < 60
+
+
+def test_large_jpeg_is_downscaled_to_max_edge(tmp_path):
+    source = photo(str(tmp_path / 'big.jpg'), (4000, 3000))
+    result = uploads.prepare(source, str(tmp_path / 'out'))
+
+    assert result['source_size'] == [4000, 3000]
+    assert result['size'] == [1024, 768]
+    assert result['format'] == 'JPEG'
+    assert result['bytes'] < result['source_bytes']
+    with Image.open(result['path']) as out:
+        assert out.format == 'JPEG'
+        assert out.size == (1024, 768)
+        assert is_red(corner(out, 0.1, 0.1))
+        # 不带 EXIF (机型、GPS 等)
+        assert not out.getexif()
+        assert 'exif' not in out.info
+
+
+@pytest.mark.parametrize('orientation, size, red_at', [
+    # 6: 显示时顺时针转 90°, 存储的左上角到右上角
+    (6, [768, 1024], (0.9, 0.1)),
+    # 8: 逆时针转 90°, 左上角到左下角
+    (8, [768, 1024], (0.1, 0.9)),
+    # 3: 转 180°, 左上角到右下角
+    (3, [1024, 768], (0.9, 0.9)),
+])
+def test_exif_orientation_is_applied(tmp_path, orientation, size, red_at):
+    source = photo(str(tmp_path / 'rotated.jpg'), (4000, 3000), orientation=orientation)
+    result = uploads.prepare(source, str(tmp_path / 'out'))
+
+    assert result['size'] == size
+    with Image.open(result['path']) as out:
+        assert list(out.size) == size
+        # 方向已经应用到像素上, 输出不再带方向标记
+        assert ORIENTATION not in out.getexif()
+        assert is_red(corner(out, *red_at))
+        assert not is_red(corner(out, 1 - red_at[0], 1 - red_at[1]))
+
+
+def test_transparent_png_stays_png(tmp_path):
+    source = str(tmp_path / 'cutout.png')
+    img = Image.new('RGBA', (2048, 1536), (0, 0, 0, 0))
+    img.paste((255, 0, 0, 255), (512, 384, 1536, 1152))
+    img.save(source)
+    result = uploads.prepare(source, str(tmp_path / 'out'))
+
+    assert result['format'] == 'PNG'
+    assert result['size'] == [1024, 768]
+    assert result['path'].endswith('.png')
+    with Image.open(result['path']) as out:
+        assert out.mode == 'RGBA'
+        assert out.getpixel((0, 0))[3] == 0
+        assert out.getpixel((512, 384)) == (255, 0, 0, 255)
+
+
+def test_opaque_png_becomes_jpeg_without_upscaling(tmp_path):
+    source = str(tmp_path / 'small.png')
+    Image.new('RGBA', (640, 480), (10, 200, 10, 255)).save(source)
+    result = uploads.prepare(source, str(tmp_path / 'out'))
+
+    assert result['format'] == 'JPEG'
+    assert result['size'] == [640, 480]
+    assert result['path'].endswith('.jpg')
+
+
+def test_output_name_is_content_hash(tmp_path):
+    source = photo(str(tmp_path / 'a.jpg'), (1600, 1200), orientation=6)
+    first = uploads.prepare(source, str(tmp_path / 'out'))
+    second = uploads.prepare(source, str(tmp_path / 'out'))
+
+    assert first['path'] == second['path']
+    name = os.path.basename(first['path'])
+    assert name == f"{uploads.PREPARED_PREFIX}{first['sha256'][:16]}.jpg"
+    assert [p.name for p in (tmp_path / 'out').iterdir()] == [name]
+
+
+def test_probe_rejects_small_and_extreme_images(tmp_path):
+    small = photo(str(tmp_path / 'small.jpg'), (100, 400))
+    wide = photo(str(tmp_path / 'wide.jpg'), (2000, 400))
+    text = tmp_path / 'notes.jpg'
+    text.write_text('not an image')
+
+    assert 'at least' in uploads.probe(small)
+    assert 'aspect ratio' in uploads.probe(wide)
+    assert uploads.probe(str(text)) == 'Unsupported image file'
+    assert uploads.probe(photo(str(tmp_path / 'ok.jpg'), (4000, 3000), orientation=6)) is None
+
+
+def test_receive_stops_at_limit(tmp_path):
+    with pytest.raises(uploads.UploadTooLarge):
+        uploads.receive(io.BytesIO(b'x' * 1000), str(tmp_path / 'incoming'), '.jpg', max_bytes=999,
+                        chunk_size=256)
+    assert list((tmp_path / 'incoming').iterdir()) == []
+
+    result = uploads.receive(io.BytesIO(b'x' * 1000), str(tmp_path / 'incoming'), '.JPG', max_bytes=1000)
+    assert result['bytes'] == 1000
+    assert result['path'].endswith('.jpg')
@@ -0,0 +1,149 @@
+import os
+import sys
+import glob
+import json
+import time
+
+from mesh import link_webp
+
+try:
+    from PIL import Image
+except ImportError:  # 没有 Pillow 时跳过纹理重新编码
+    Image = None
+
+# 纹理重新编码: 在进程池中运行 (与 LOD 共用), 模型完成后异步处理, 任务不等待
+# - MTL 引用的 PNG 无损优化 (去掉全不透明的 alpha 通道, zlib 最高压缩 + 滤波选择), 只在变小时替换
+# - WebP 有损变体: 原尺寸和 1024/512, 约为 PNG 的 1/15~1/30
+# - 生成 material.webp.mtl, 贴图指向原尺寸 WebP; 原 MTL 不变, 不支持 WebP 的客户端继续用 PNG
+# - 目录里已有的 GLB (model.glb、LOD) 通过 EXT_texture_webp 引用同名 WebP, 前端优先加载的是 GLB
+# 结果由调用方写入 metadata.json (texture_variants)
+# KTX2/Basis 需要外部编码器 (toktx/basisu), 这里不生成
+
+WEBP_SIZES = (None, 1024, 512)  # None 为原尺寸
+WEBP_QUALITY = 85
+WEBP_METHOD = 4  # 0~6, 越大越慢越小; 6 只再小约 10%
+ALTERNATE_MTL_SUFFIX = '.webp.mtl'
+TEXTURE_KEYS = ('map_Ka', 'map_Kd', 'map_Ks', 'map_Ke', 'map_d', 'map_bump', 'map_Bump', 'bump', 'norm')
+
+
+def _save(image, path, **options):
+    # 先写临时文件再替换: 目标可能是资源存储中的硬链接, 不能原地覆盖
+    tmp_path = path + '.tmp'
+    image.save(tmp_path, **options)
+    os.replace(tmp_path, path)
+
+
+def mtl_textures(mtl_path):
+    # 返回 MTL 中引用的贴图文件名 (按出现顺序, 去重)
+    names = []
+    with open(mtl_path, 'r', encoding='utf-8', errors='ignore') as f:
+        for line in f:
+            parts = line.strip().split(None, 1)
+            if len(parts) == 2 and parts[0] in TEXTURE_KEYS:
+                # 贴图选项 (-bm 1.0 等) 在文件名之前, 文件名是最后一项
+                name = parts[1].split()[-1]
+                if name not in names:
+                    names.append(name)
+    return names
+
+
+def optimize_png(path):
+    # 无损重新压缩, 返回 (原大小, 新大小)
+    before = os.path.getsize(path)
+    with Image.open(path) as img:
+        img.load()
+        image = img
+        if img.mode == 'RGBA' and img.getchannel('A').getextrema() == (255, 255):
+            image = img.convert('RGB')
+        elif img.mode not in ('RGB', 'RGBA', 'L', 'LA', 'P'):
+            return before, before
+        tmp_path = path + '.opt.tmp'
+        image.save(tmp_path, format='PNG', optimize=True)
+    after = os.path.getsize(tmp_path)
+    if after < before:
+        os.replace(tmp_path, path)
+        return before, after
+    os.remove(tmp_path)
+    return before, before
+
+
+def build_webp(job_folder, texture_name):
+    # 返回 {'full' | 边长: 文件名}
+    stem = os.path.splitext(texture_name)[0]
+    variants = {}
+    with Image.open(os.path.join(job_folder, texture_name)) as img:
+        image = img.convert('RGBA' if img.mode in ('RGBA', 'LA', 'P') else 'RGB')
+    for size in WEBP_SIZES:
+        if size is None:
+            current, name, key = image, f'{stem}.webp', 'full'
+        elif max(image.size) > size:
+            scale = size / max(image.size)
+            current = image.resize((max(1, round(image.width * scale)), max(1, round(image.height * scale))),
+                                   Image.LANCZOS)
+            name, key = f'{stem}_{size}.webp', str(size)
+        else:
+            continue
+        _save(current, os.path.join(job_folder, name), format='WEBP', quality=WEBP_QUALITY, method=WEBP_METHOD)
+        variants[key] = name
+    return variants
+
+
+def write_alternate_mtl(mtl_path, replacements):
+    # 复制 MTL, 把贴图文件名换成 WebP 版本
+    out_path = mtl_path[:-len('.mtl')] + ALTERNATE_MTL_SUFFIX
+    lines = []
+    with open(mtl_path, 'r', encoding='utf-8', errors='ignore') as f:
+        for line in f:
+            parts = line.strip().split(None, 1)
+            if len(parts) == 2 and parts[0] in TEXTURE_KEYS:
+                name = parts[1].split()[-1]
+                if name in replacements:
+                    line = line[:line.rindex(name)] + replacements[name] + line[line.rindex(name) + len(name):]
+            lines.append(line)
+    tmp_path = out_path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.writelines(lines)
+    os.replace(tmp_path, out_path)
+    return os.path.basename(out_path)
+
+
+def link_glb_textures(job_folder):
+    # 与 LOD 并行生成, 两边完成时各调用一次, 返回修改过的 GLB 文件名
+    return [os.path.basename(p) for p in sorted(glob.glob(os.path.join(job_folder, '*.glb'))) if link_webp(p)]
+
+
+def optimize_textures(job_folder):
+    start = time.perf_counter()
+    if Image is None:
+        return None
+    mtls = [p for p in glob.glob(os.path.join(job_folder, '*.mtl')) if not p.endswith(ALTERNATE_MTL_SUFFIX)]
+    if not mtls:
+        return None
+    textures = {}
+    webp = {}
+    for name in mtl_textures(mtls[0]):
+        path = os.path.join(job_folder, name)
+        if not os.path.isfile(path) or not name.lower().endswith('.png'):
+            continue
+        texture_start = time.perf_counter()
+        variants = build_webp(job_folder, name)
+        before, after = optimize_png(path)
+        textures[name] = {
+            'png_bytes': before,
+            'optimized_bytes': after,
+            'webp': variants,
+            'webp_bytes': {k: os.path.getsize(os.path.join(job_folder, v)) for k, v in variants.items()},
+            'seconds': round(time.perf_counter() - texture_start, 3),
+        }
+        webp[name] = variants['full']
+    return {
+        'textures': textures,
+        'webp_mtl': write_alternate_mtl(mtls[0], webp) if webp else None,
+        'webp_glbs': link_glb_textures(job_folder) if webp else [],
+        'seconds': round(time.perf_counter() - start, 3),
+    }
+
+
+if __name__ == '__main__':
+    # python textures.py static/models/<job_id>
+    print(json.dumps(optimize_textures(sys.argv[1]), indent=2))
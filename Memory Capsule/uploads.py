@@ -0,0 +1,193 @@
+import os
+import sys
+import json
+import time
+import hashlib
+import threading
+
+import metrics
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # 没有 Pillow 时跳过预处理, 直接提交原图
+    Image = ImageOps = None
+
+# 上传图片的预处理
+# - 接收: 分块写入 .part, 同时计算 sha256, 超过上限立即中止; 原图放在不对外的目录
+# - 预处理 (任务 worker 线程中执行, Pillow 解码/缩放/编码时释放 GIL):
+#   JPEG 先用 draft 在解码阶段按 1/2~1/8 缩小, 按 EXIF 方向旋转, 长边缩到 MAX_EDGE,
+#   不透明的图片编码为 JPEG, 有透明通道的编码为 PNG; 不写 EXIF / ICC, 文件名为内容哈希
+# 混元 3D 输入单边 128~5000 像素, 模型内部按 ~1024 处理, 更大的图片只会增加 base64 请求体和提交耗时
+
+CHUNK_SIZE = 64 * 1024
+MAX_UPLOAD_BYTES = 32 * 1024 * 1024
+MAX_EDGE = 1024
+MIN_EDGE = 128
+MAX_ASPECT = 4
+JPEG_QUALITY = 90
+PREPARED_PREFIX = 'upload_'
+
+
+class UploadError(Exception):
+    pass
+
+
+class UploadTooLarge(UploadError):
+    pass
+
+
+class UploadStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.uploads = 0
+        self.upload_bytes = 0
+        self.upload_seconds = 0.0
+        self.rejected = 0
+        self.prepared = 0
+        self.prepared_bytes = 0
+        self.decode_seconds = 0.0
+        self.resize_seconds = 0.0
+        self.encode_seconds = 0.0
+        self.hash_seconds = 0.0
+
+    def add(self, **values):
+        with self._lock:
+            for key, value in values.items():
+                setattr(self, key, getattr(self, key) + value)
+
+    def snapshot(self):
+        with self._lock:
+            return {k: v for k, v in vars(self).items() if not k.startswith('_')}
+
+
+STATS = UploadStats()
+
+UPLOAD_SECONDS = metrics.histogram('upload_receive_seconds', 'Streaming an upload to disk')
+UPLOAD_BYTES = metrics.counter('upload_bytes_total', 'Image bytes received and after preparation', ('stage',))
+PREPARE_SECONDS = metrics.histogram('upload_prepare_seconds', 'Upload preparation time by step', ('step',))
+
+
+def receive(stream, folder, extension, max_bytes=MAX_UPLOAD_BYTES, chunk_size=CHUNK_SIZE):
+    # 把上传流写入 folder/<sha256 前 16 位>-<序号><extension>, 返回 {'path', 'bytes', 'sha256', 'seconds'}
+    # 同一张图片同时上传两次时各自有一份原图, 预处理后各自删除
+    start = time.perf_counter()
+    os.makedirs(folder, exist_ok=True)
+    digest = hashlib.sha256()
+    total = 0
+    token = f'{threading.get_ident():x}{time.time_ns():x}'
+    part_path = os.path.join(folder, token + '.part')
+    try:
+        with open(part_path, 'wb') as f:
+            while True:
+                chunk = stream.read(chunk_size)
+                if not chunk:
+                    break
+                total += len(chunk)
+                if total > max_bytes:
+                    raise UploadTooLarge(f'Upload exceeds {max_bytes} bytes')
+                digest.update(chunk)
+                f.write(chunk)
+    except BaseException:
+        os.remove(part_path)
+        STATS.add(rejected=1)
+        raise
+    sha256 = digest.hexdigest()
+    path = os.path.join(folder, f'{sha256[:16]}-{token}{extension.lower()}')
+    os.replace(part_path, path)
+    seconds = time.perf_counter() - start
+    STATS.add(uploads=1, upload_bytes=total, upload_seconds=seconds)
+    UPLOAD_SECONDS.observe(seconds)
+    UPLOAD_BYTES.labels('received').inc(total)
+    return {'path': path, 'bytes': total, 'sha256': sha256, 'seconds': round(seconds, 3)}
+
+
+def probe(path):
+    # 只读文件头, 返回错误信息或 None; 上传接口用它在排队前拒绝非图片文件
+    if Image is None:
+        return None
+    try:
+        with Image.open(path) as img:
+            width, height = img.size
+    except (OSError, Image.DecompressionBombError):
+        return 'Unsupported image file'
+    if min(width, height) < MIN_EDGE:
+        return f'Image must be at least {MIN_EDGE}px on each side'
+    if max(width, height) > MAX_ASPECT * min(width, height):
+        return f'Image aspect ratio must be at most 1:{MAX_ASPECT}'
+    return None
+
+
+def _has_alpha(img):
+    if img.mode in ('RGBA', 'LA'):
+        return img.getchannel('A').getextrema()[0] < 255
+    return img.mode == 'P' and 'transparency' in img.info
+
+
+def prepare(path, out_folder, max_edge=MAX_EDGE, quality=JPEG_QUALITY):
+    # 返回 {'path', 'sha256', 'bytes', 'source_bytes', 'size', 'source_size', 'format', 'seconds': {...}}
+    if Image is None:
+        return None
+    seconds = {}
+    start = time.perf_counter()
+    with Image.open(path) as img:
+        source_size = img.size
+        scale = min(1.0, max_edge / max(source_size))
+        if img.format == 'JPEG' and scale < 1.0:
+            # 让 libjpeg 直接解码出不小于目标尺寸的缩小图, 12MP 照片只解码约 1/4 的像素
+            img.draft('RGB', (round(source_size[0] * scale), round(source_size[1] * scale)))
+        img.load()
+        seconds['decode'] = time.perf_counter() - start
+
+        step = time.perf_counter()
+        image = ImageOps.exif_transpose(img)
+        if max(image.size) > max_edge:
+            scale = max_edge / max(image.size)
+            image = image.resize((max(1, round(image.width * scale)), max(1, round(image.height * scale))),
+                                 Image.LANCZOS, reducing_gap=3.0)
+        seconds['resize'] = time.perf_counter() - step
+
+    step = time.perf_counter()
+    alpha = _has_alpha(image)
+    image = image.convert('RGBA' if alpha else 'RGB')
+    extension = '.png' if alpha else '.jpg'
+    os.makedirs(out_folder, exist_ok=True)
+    tmp_path = os.path.join(out_folder, f'{threading.get_ident()}-{time.time_ns()}{extension}.tmp')
+    # 不传 exif / icc_profile, 输出不带任何元数据 (GPS、机型等)
+    if alpha:
+        image.save(tmp_path, format='PNG', compress_level=6)
+    else:
+        image.save(tmp_path, format='JPEG', quality=quality, optimize=True)
+    seconds['encode'] = time.perf_counter() - step
+
+    step = time.perf_counter()
+    digest = hashlib.sha256()
+    with open(tmp_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+    sha256 = digest.hexdigest()
+    out_path = os.path.join(out_folder, f'{PREPARED_PREFIX}{sha256[:16]}{extension}')
+    os.replace(tmp_path, out_path)
+    seconds['hash'] = time.perf_counter() - step
+    seconds['total'] = time.perf_counter() - start
+
+    size = os.path.getsize(out_path)
+    STATS.add(prepared=1, prepared_bytes=size, decode_seconds=seconds['decode'],
+              resize_seconds=seconds['resize'], encode_seconds=seconds['encode'], hash_seconds=seconds['hash'])
+    for step, value in seconds.items():
+        PREPARE_SECONDS.labels(step).observe(value)
+    UPLOAD_BYTES.labels('prepared').inc(size)
+    return {
+        'path': out_path,
+        'sha256': sha256,
+        'bytes': size,
+        'source_bytes': os.path.getsize(path),
+        'size': list(image.size),
+        'source_size': list(source_size),
+        'format': 'PNG' if alpha else 'JPEG',
+        'seconds': {k: round(v, 3) for k, v in seconds.items()},
+    }
+
+
+if __name__ == '__main__':
+    # python uploads.py <图片> [输出目录]
+    print(json.dumps(prepare(sys.argv[1], sys.argv[2] if len(sys.argv) > 2 else '.'), indent=2))